@@ -1,8 +1,20 @@
 import argparse
+import dataclasses
+import itertools
 import logging
+import sys
+from datetime import date
 
-from app.app_operations import generate, list_ids
-from utils.definitions import DEFAULT_CSV_PATH, DEFAULT_TEMPLATE_PATH, DEFAULT_STORE_PATH
+from app.app_operations import iter_reports, list_ids, convert, snapshot
+from app.language_statistics import LanguageStatistics, DEFAULT_SUMMARY_LIMIT
+from app.report_cache import ReportCache
+from app.report_server import ReportService, serve, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_MAX_CONCURRENT
+from data.connection_pool import ConnectionManager
+from data.lookup_cache import LookupCache
+from data.subject_storage import SubjectStorage, SourceOptions, DEFAULT_STREAM_BATCH_SIZE
+from utils.id_utils import parse_ids
+from utils.profiling import PROFILER
+from utils.definitions import DEFAULT_CSV_PATH, DEFAULT_TEMPLATE_PATH, DEFAULT_STORE_PATH, DEFAULT_REPORT_CACHE_PATH
 
 
 def main():
@@ -10,22 +22,57 @@ def main():
     csv_file = DEFAULT_CSV_PATH
     app_language = 'en_US'
     subject_id = None
+    subject_ids = None
     definition_template_path = DEFAULT_TEMPLATE_PATH
     store_to_file = False
     store_path = DEFAULT_STORE_PATH
+    workers = 1
+    stream_batch_size = None
+    columnar_file = None
+    snapshot_file = None
+    language_statistics = None
+    report_cache = None
 
     parser = argparse.ArgumentParser()
     parser.add_argument("-c", "--csv", help="Specify whether to load data from CSV instead of the database. The value "
                                             "supplied with this option specifies the CSV file. When omitted, "
                                             "default CSV is used",
                         required=False, nargs="?", const=DEFAULT_CSV_PATH)
+    parser.add_argument("--copy", help="Specify whether to extract all the rows from the database at once with COPY "
+                                       "as CSV, parsed by the typed CSV loader, instead of fetching them through the "
+                                       "cursor. Used when generating for all subjects",
+                        required=False, action="store_true")
+    parser.add_argument("--columnar", help="Specify the parquet or feather file to load data from instead of the "
+                                           "database or CSV, the format is chosen by the file extension. Only the "
+                                           "required columns and the rows of the requested subjects are read",
+                        required=False, default=None)
+    parser.add_argument("--discharged-from", help="Specify the first discharge date, in the YYYY-MM-DD format, of the "
+                                                  "subjects loaded from the columnar file",
+                        required=False, default=None, type=date.fromisoformat)
+    parser.add_argument("--discharged-to", help="Specify the last discharge date, in the YYYY-MM-DD format, of the "
+                                                "subjects loaded from the columnar file",
+                        required=False, default=None, type=date.fromisoformat)
+    parser.add_argument("--convert", help="Converts the database, or the CSV when used with --csv, into the parquet "
+                                          "or feather file supplied with this option and exits",
+                        required=False, default=None)
+    parser.add_argument("--sqlite", help="Specify the SQLite snapshot to load data from instead of the database or "
+                                         "CSV, so no database server is needed",
+                        required=False, default=None)
+    parser.add_argument("--snapshot", help="Copies the database, or the CSV when used with --csv, into the SQLite "
+                                           "snapshot supplied with this option and exits",
+                        required=False, default=None)
     parser.add_argument("-l", "--language", help="Specify the language which to use for the generation "
                                                  "process. en_US by default",
                         required=False, default="en_US")
-    parser.add_argument("-i", "--subject_id", help="Specify the id of the subject for which to generate the "
-                                                   "report. None by default, resulting in generation for every "
-                                                   "subject",
-                        required=False, default=None, type=int)
+    subjects = parser.add_mutually_exclusive_group()
+    subjects.add_argument("-i", "--subject_id", help="Specify the id of the subject for which to generate the "
+                                                     "report. None by default, resulting in generation for every "
+                                                     "subject",
+                          required=False, default=None, type=int)
+    subjects.add_argument("--ids", help="Specify the ids of the subjects for which to generate the reports, as a "
+                                        "comma separated list of ids and ranges, such as 1,4,10-20. The subjects are "
+                                        "fetched with a single query",
+                          required=False, default=None, type=parse_ids)
     parser.add_argument("-t", "--template", help="Specify the path to report definition template for use",
                         required=False, default=DEFAULT_TEMPLATE_PATH)
     parser.add_argument("--list", help="Lists the available subject ids and exits",
@@ -35,16 +82,91 @@ def main():
                                               "option specifies the file path. When omitted, the result is stored in "
                                               "the project root",
                         required=False, nargs="?", const=DEFAULT_STORE_PATH)
+    parser.add_argument("-w", "--workers", help="Specify the number of processes generating the reports in "
+                                                "parallel. 1 by default, resulting in serial generation",
+                        required=False, default=1, type=int)
+    parser.add_argument("--stream", help="Specify whether to stream the data from the database through a server-side "
+                                         "cursor, or from the CSV in chunks, instead of loading all the rows at once. "
+                                         "The value supplied with this option specifies the number of rows fetched "
+                                         f"at once. When omitted, {DEFAULT_STREAM_BATCH_SIZE} rows are fetched at "
+                                         "once",
+                        required=False, nargs="?", const=DEFAULT_STREAM_BATCH_SIZE, type=int)
+    parser.add_argument("--lookup-cache", help="Specify whether to load the lookup tables once into memory and query "
+                                               "only the fact table from the database, resolving the ids "
+                                               "client-side instead of joining the tables",
+                        required=False, action="store_true")
+    parser.add_argument("--profile", help="Specify whether to measure the durations of the stages of the generation "
+                                          "and print their totals, means and percentiles at the end of the run",
+                        required=False, action="store_true")
+    parser.add_argument("--profile-json", help="Specify the JSON file the durations of the stages of the generation "
+                                               "are written to at the end of the run",
+                        required=False, default=None)
+    parser.add_argument("--language-stats", help="Specify whether to count the evaluations and hits of the variants "
+                                                 "and conditions of the language and print the variants evaluating "
+                                                 "the most conditions and the variants never used at the end of the "
+                                                 "run. Optionally the number of the variants printed, "
+                                                 f"{DEFAULT_SUMMARY_LIMIT} by default",
+                        required=False, nargs="?", const=DEFAULT_SUMMARY_LIMIT, type=int)
+    parser.add_argument("--language-stats-json", help="Specify the JSON file the counters of the variants and "
+                                                      "conditions of the language are written to at the end of the run",
+                        required=False, default=None)
+    parser.add_argument("--cache", help="Specify whether to reuse the reports stored by the previous runs with this "
+                                        "option for the unchanged subjects, language, template and code. A stored "
+                                        "report is not used when any of them changed. The value supplied with this "
+                                        "option specifies the SQLite file of the stored reports. When omitted, "
+                                        f"{DEFAULT_REPORT_CACHE_PATH} is used. The cache is not used with --profile, "
+                                        "--profile-json, --language-stats or --language-stats-json, which measure the "
+                                        "generation of every report",
+                        required=False, nargs="?", const=DEFAULT_REPORT_CACHE_PATH)
+    parser.add_argument("--serve", help="Serves the reports over HTTP until interrupted, keeping the languages and "
+                                        "the template loaded. The reports are requested by GET /reports/ID?lang=LANG "
+                                        "and POST /reports:batch. The value supplied with this option specifies the "
+                                        f"port. When omitted, port {DEFAULT_PORT} is used",
+                        required=False, nargs="?", const=DEFAULT_PORT, type=int)
+    parser.add_argument("--host", help=f"Specify the address the server listens on, {DEFAULT_HOST} by default",
+                        required=False, default=DEFAULT_HOST)
+    parser.add_argument("--max-concurrent", help="Specify the number of the requests of the server generating the "
+                                                 f"reports at once, {DEFAULT_MAX_CONCURRENT} by default",
+                        required=False, default=DEFAULT_MAX_CONCURRENT, type=int)
 
     argument = parser.parse_args()
 
+    if (argument.discharged_from or argument.discharged_to) and not argument.columnar:
+        parser.error("--discharged-from and --discharged-to require --columnar")
+
     if argument.csv:
         load_csv = True
         csv_file = argument.csv
         print(f"Using csv file: {csv_file}")
+    if argument.columnar:
+        columnar_file = argument.columnar
+        print(f"Using columnar file: {columnar_file}")
+    if argument.sqlite:
+        snapshot_file = argument.sqlite
+        print(f"Using SQLite snapshot: {snapshot_file}")
+    if argument.stream:
+        stream_batch_size = argument.stream
+        print(f"Streaming data in batches of {stream_batch_size} rows")
+    source = SourceOptions(from_csv=load_csv, csv_file=csv_file, columnar_file=columnar_file,
+                           snapshot_file=snapshot_file, bulk_copy=argument.copy, stream_batch_size=stream_batch_size,
+                           discharge_from=argument.discharged_from, discharge_to=argument.discharged_to)
+    if argument.convert:
+        print(f"Converting data into file: {argument.convert}")
+        try:
+            print(f"Converted {convert(load_csv, csv_file, argument.convert)} rows")
+        except Exception as error:
+            logging.error(f"Conversion failed: {error}")
+        return
+    if argument.snapshot:
+        print(f"Storing snapshot into file: {argument.snapshot}")
+        try:
+            print(f"Stored {snapshot(load_csv, csv_file, argument.snapshot)} rows")
+        except Exception as error:
+            logging.error(f"Snapshot failed: {error}")
+        return
     if argument.list:
         print(f"Listing all available subject ids: ")
-        print(list_ids(load_csv, csv_file))
+        print(list_ids(source))
         return
     if argument.language:
         app_language = argument.language
@@ -55,26 +177,105 @@ def main():
             print(f"Generating for subject id: {subject_id}")
         else:
             print(f"Generating for all subjects")
+    if argument.ids:
+        subject_ids = argument.ids
+        print(f"Generating for {len(subject_ids)} subject ids")
     if argument.template:
         definition_template_path = argument.template
         print(f"Generating with template from file: {definition_template_path}")
     if argument.store:
         store_to_file = True
         store_path = argument.store
+    if argument.workers and argument.workers > 1:
+        workers = argument.workers
+        print(f"Generating with {workers} workers")
+    if argument.lookup_cache and not load_csv:
+        source = dataclasses.replace(source, lookup_cache=LookupCache())
+        print(f"Resolving lookup tables client-side")
+
+    if argument.profile or argument.profile_json:
+        PROFILER.enable()
+
+    if argument.serve is not None:
+        from_database = not (load_csv or columnar_file or snapshot_file)
+        connection_manager = ConnectionManager(max_connections=argument.max_concurrent) if from_database else None
+        subject_storage = SubjectStorage(source, connection_manager)
+        service = ReportService(subject_storage, definition_template_path, app_language, argument.max_concurrent)
+        try:
+            serve(service, argument.host, argument.serve)
+        finally:
+            if connection_manager is not None:
+                connection_manager.close()
+        return
+    if argument.language_stats is not None or argument.language_stats_json:
+        language_statistics = LanguageStatistics()
+    # The cached reports are not generated, so they would be missing from the durations and the counters
+    if argument.cache and (PROFILER.enabled or language_statistics is not None):
+        print(f"Report cache not used while measuring the generation")
+    elif argument.cache:
+        report_cache = ReportCache(argument.cache)
+        print(f"Using report cache: {argument.cache}")
+
+    reports = iter_reports(app_language, subject_id, source, definition_template_path, workers,
+                           subject_ids=subject_ids, language_statistics=language_statistics,
+                           report_cache=report_cache)
 
     try:
-        report = generate(app_language, subject_id, load_csv, csv_file, definition_template_path)
+        # Generate the first report before opening the output, so a failing setup does not leave an empty file
+        first = next(reports, None)
     except Exception as error:
         logging.error(f"Generation failed: {error}")
         return
 
-    if store_to_file:
-        print(f"Storing results to file: {store_path}")
-        with open(store_path, "w") as file:
-            file.write(report)
-    else:
-        print(f"Printing results to console:")
-        print(report)
+    reports = itertools.chain([first], reports) if first is not None else iter(())
+
+    try:
+        if store_to_file:
+            print(f"Storing results to file: {store_path}")
+            with open(store_path, "w") as file:
+                write_reports(reports, file)
+        else:
+            print(f"Printing results to console:")
+            write_reports(reports, sys.stdout)
+    except Exception as error:
+        logging.error(f"Generation failed: {error}")
+
+    if report_cache is not None:
+        report_cache.close()
+    if report_cache is not None and report_cache.disabled:
+        print(f"Report cache disabled, see the warning above")
+    elif report_cache is not None:
+        statistics = report_cache.statistics()
+        print(f"Report cache: {statistics['hits']} hits, {statistics['misses']} misses "
+              f"({statistics['hit_rate']:.1%} hit rate), {statistics['evictions']} evicted")
+    if argument.profile:
+        print(f"Durations of the stages in milliseconds:")
+        print(PROFILER.format_summary())
+    if argument.profile_json:
+        print(f"Storing durations of the stages to file: {argument.profile_json}")
+        PROFILER.write_json(argument.profile_json, {"language": app_language, "workers": workers,
+                                                    "stream_batch_size": stream_batch_size})
+    if argument.language_stats is not None:
+        print(f"Counters of the variants of the language:")
+        print(language_statistics.format_summary(argument.language_stats))
+    if argument.language_stats_json:
+        print(f"Storing counters of the variants to file: {argument.language_stats_json}")
+        language_statistics.write_json(argument.language_stats_json, {"language": app_language})
+
+
+def write_reports(reports, output):
+    """Writes each report to the output as soon as it is generated
+
+    Parameters
+    ----------
+    reports : Iterator[Tuple[int, str]]
+        Pairs of the subject id and the generated report
+    output : TextIO
+        File or stream the reports are written to
+    """
+
+    for _, report in reports:
+        output.write(f"{report}\n")
 
 
 if __name__ == '__main__':
@@ -1,17 +1,35 @@
 import logging
+import sqlite3
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain, islice
 from pathlib import Path
 
 from app.generator import MedicalReportsGenerator
 from app.language import Language
-from data.subject_storage import SubjectStorage
-from utils.definitions import DEFAULT_CSV_PATH, DEFAULT_TEMPLATE_PATH
-from utils.load_language_utils import load_language
-from typing import Optional, List
+from app.language_statistics import LanguageStatistics
+from app.report_cache import ReportCache, get_context_key, get_row_key
+from data.connection_pool import ConnectionManager
+from data.subject_storage import SubjectStorage, SourceOptions, CSV_COLUMN_DTYPES
+from data.sqlite_snapshot import create_snapshot_from_db, create_snapshot_from_csv
+from utils.columnar_utils import table_from_csv_file, table_from_records, write_columnar_file, \
+    DEFAULT_ROW_GROUP_SIZE
+from utils.definitions import DEFAULT_TEMPLATE_PATH
+from utils.load_language_utils import load_language, get_language_path
+from utils.profiling import PROFILER
+from typing import Deque, Optional, List, Iterator, Tuple, Iterable, Union
 
+DEFAULT_CHUNK_SIZE = 64
 
-def generate(app_language: str, subject_id: Optional[int], load_csv: Optional[bool] = False,
-             csv_file: Optional[str] = DEFAULT_CSV_PATH,
-             definition_template_path: Optional[Path] = DEFAULT_TEMPLATE_PATH) -> str:
+# Generator of the worker process, created once by the pool initializer and reused for every chunk
+_worker_generator: Optional[MedicalReportsGenerator] = None
+
+# Cache of the reports of the worker process and the key of its language, template and code
+_worker_cache: Optional[ReportCache] = None
+_worker_context_key: Optional[str] = None
+
+
+def generate(app_language: str, subject_id: Optional[int], *args, **kwargs) -> str:
     """Generates all medical records for each row in the postgres database if the subject_id is None.
     Otherwise, generates only one medical record for the specified subject.
 
@@ -21,57 +39,381 @@ def generate(app_language: str, subject_id: Optional[int], load_csv: Optional[bo
         The language of the medical record to be generated in
     subject_id : Optional[int]
         The id of subject for which the medical record should be generated. If none, all subjects are generated.
-    load_csv : Optional[bool]
-        Boolean value deciding whether we load the data from csv or not
-    csv_file : Optional[str]
-        Path to csv file
-    definition_template_path : Optional[Path]
-        Path to file with the template
+    *args, **kwargs
+        The other arguments of iter_reports
 
     Returns
     -------
     str
         Returns the generated reports
     """
-    report = ""
 
-    subject_storage = SubjectStorage(load_csv, csv_file)
-    data = subject_storage.get_data(subject_id)
+    return "".join(f"{report}\n" for _, report in iter_reports(app_language, subject_id, *args, **kwargs))
 
-    if data and len(data) > 0:
-        # load language
-        language_dict = load_language(app_language)
-        if not language_dict:
-            return ""
 
-        try:
-            language = Language(**language_dict)
-        except (KeyError, TypeError, AttributeError) as e:
-            logging.error(repr(e))
-            return ""
+def iter_reports(app_language: str, subject_id: Optional[int], source: Optional[SourceOptions] = None,
+                 definition_template_path: Path = DEFAULT_TEMPLATE_PATH, workers: int = 1,
+                 connection_manager: Optional[ConnectionManager] = None, subject_ids: Optional[List[int]] = None,
+                 language_statistics: Optional[LanguageStatistics] = None,
+                 report_cache: Optional[ReportCache] = None) -> Iterator[Tuple[int, str]]:
+    """Lazily generates the medical records one by one, so only a single report is held in memory at a time.
+    Generates for each row in the postgres database if the subject_id is None, otherwise only for the specified
+    subject. With more than one worker, the reports are generated in a process pool and yielded in the same order
+    as in the serial generation.
 
-        # create generator with language structure and definition template
-        generator = MedicalReportsGenerator(language, definition_template_path)
+    Parameters
+    ----------
+    app_language : str
+        The language of the medical record to be generated in
+    subject_id : Optional[int]
+        The id of subject for which the medical record should be generated. If none, all subjects are generated.
+    source : Optional[SourceOptions]
+        The source of the data and the way they are loaded. When omitted, all the rows are loaded from the database
+        at once
+    definition_template_path : Path
+        Path to file with the template
+    workers : int
+        Number of processes generating the reports in parallel
+    connection_manager : Optional[ConnectionManager]
+        Pool of connections to the database. When omitted, a new connection is created
+    subject_ids : Optional[List[int]]
+        The ids of subjects for which the medical records should be generated. Takes precedence over subject_id
+    language_statistics : Optional[LanguageStatistics]
+        Counters of the evaluations and hits of the variants and conditions of the language, collected from all the
+        workers. When omitted, nothing is counted
+    report_cache : Optional[ReportCache]
+        Cache of the generated reports consulted before each report is generated. When omitted, every report is
+        generated
 
-        # generate records
-        for idx, row in enumerate(data):
-            report += generator.generate_medical_report(row) + "\n"
-    else:
+    Returns
+    -------
+    Iterator[Tuple[int, str]]
+        Pairs of the subject id and the generated report
+
+    Raises
+    ------
+    ValueError
+        If the generator of the language could not be created
+    IndexError
+        If no data were found for the subject
+    """
+
+    # The generator is created first, so no connection or file of the source is opened for a language failing to load
+    generator = create_generator(app_language, definition_template_path, language_statistics)
+    if generator is None:
+        raise ValueError(f"Could not create the generator of the language {app_language}")
+
+    subject_storage = SubjectStorage(source, connection_manager)
+    with PROFILER.stage("get_data"):
+        if subject_ids:
+            source_rows = iter(subject_storage.get_data_many(subject_ids))
+        else:
+            source_rows = iter(subject_storage.get_data(subject_id) or ())
+
+    try:
+        yield from _iter_source_reports(source_rows, generator, app_language, definition_template_path, workers,
+                                        language_statistics, report_cache)
+    finally:
+        # The measuring wrapper does not close the rows, so the streamed source is closed here
+        close_source = getattr(source_rows, "close", None)
+        if close_source is not None:
+            close_source()
+
+
+def _iter_source_reports(source_rows: Iterator[dict], generator: MedicalReportsGenerator, app_language: str,
+                         definition_template_path: Path, workers: int,
+                         language_statistics: Optional[LanguageStatistics] = None,
+                         report_cache: Optional[ReportCache] = None) -> Iterator[Tuple[int, str]]:
+    """Generates the medical records for the rows of the opened source, see iter_reports
+
+    Raises
+    ------
+    IndexError
+        If the source has no rows
+    """
+
+    # The rows may be fetched lazily, so getting each row is measured as well
+    rows = PROFILER.iterate("next_row", source_rows)
+
+    # The data may be streamed, so the first row is fetched to find out whether there are any
+    first = next(rows, None)
+    if first is None:
         logging.info("No data found")
         raise IndexError("Invalid subject id, try running with option --list to list available ids")
 
+    data = chain([first], rows)
+
+    context_key = None
+    if report_cache is not None:
+        context_key = get_context_key(get_language_path(app_language), definition_template_path)
+
+    if workers > 1:
+        yield from iter_reports_parallel(data, app_language, definition_template_path, workers,
+                                         language_statistics=language_statistics, report_cache=report_cache,
+                                         context_key=context_key)
+        return
+
+    try:
+        for row in data:
+            with PROFILER.stage("generate_report"):
+                report = generate_report(generator, row, report_cache, context_key)
+
+            yield row["subject_id"], report
+    finally:
+        if report_cache is not None:
+            report_cache.flush()
+
+
+def generate_report(generator: MedicalReportsGenerator, row: dict, report_cache: Optional[ReportCache] = None,
+                    context_key: Optional[str] = None) -> str:
+    """Generates the medical record for the row, unless the cache holds the report generated for the same data,
+    language, template and code
+
+    Parameters
+    ----------
+    generator : MedicalReportsGenerator
+        The generator of the reports
+    row : dict
+        Data of the patient
+    report_cache : Optional[ReportCache]
+        Cache of the generated reports. When omitted, the report is always generated
+    context_key : Optional[str]
+        The hash of the language, the template and the code the generator uses, see get_context_key. When omitted,
+        the report is always generated
+
+    Returns
+    -------
+    str
+        The generated or cached report
+    """
+
+    if report_cache is None or context_key is None:
+        return generator.generate_medical_report(row)
+
+    with PROFILER.stage("report_cache"):
+        key = get_row_key(row, context_key)
+        try:
+            report = report_cache.get(key)
+        except (sqlite3.Error, OSError) as error:
+            # The cache is best-effort, so a broken file only costs the generation
+            report_cache.disable(error)
+            report = None
+
+    if report is None:
+        report = generator.generate_medical_report(row)
+        report_cache.put(key, report)
+
     return report
 
 
-def list_ids(load_csv: bool, csv_file: str) -> List[int]:
+def iter_reports_parallel(data: Iterable[dict], app_language: str, definition_template_path: Path, workers: int,
+                          chunk_size: int = DEFAULT_CHUNK_SIZE,
+                          language_statistics: Optional[LanguageStatistics] = None,
+                          report_cache: Optional[ReportCache] = None,
+                          context_key: Optional[str] = None) -> Iterator[Tuple[int, str]]:
+    """Generates the medical records in a pool of processes. Each process builds its own generator once, the rows
+    are submitted in chunks and the results are yielded in the order of the rows.
+
+    Parameters
+    ----------
+    data : Iterable[dict]
+        Rows with the data of the patients
+    app_language : str
+        The language of the medical record to be generated in
+    definition_template_path : Path
+        Path to file with the template
+    workers : int
+        Number of processes generating the reports
+    chunk_size : int
+        Number of rows sent to a process at once
+    language_statistics : Optional[LanguageStatistics]
+        Counters of the variants and conditions of the language the counters of the worker processes are merged into.
+        When omitted, the workers count nothing
+    report_cache : Optional[ReportCache]
+        Cache of the generated reports. Each worker opens the same file and its counters are merged into this cache.
+        When omitted, every report is generated
+    context_key : Optional[str]
+        The hash of the language, the template and the code, see get_context_key
+
+    Returns
+    -------
+    Iterator[Tuple[int, str]]
+        Pairs of the subject id and the generated report
+    """
+
+    rows = iter(data)
+    # Bound the number of submitted chunks, so the rows are not all read into memory at once
+    max_pending = workers * 2
+
+    # The workers open the file of the cache themselves, the connection is not to be shared with the forked processes
+    cache_settings = (report_cache.path, report_cache.max_size, context_key) if report_cache is not None else None
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(app_language, definition_template_path, PROFILER.enabled,
+                                       language_statistics is not None, cache_settings)) as executor:
+        pending: Deque[Future] = deque()
+
+        while chunk := list(islice(rows, chunk_size)):
+            pending.append(executor.submit(_generate_chunk, chunk))
+
+            if len(pending) >= max_pending:
+                yield from _collect_chunk(pending.popleft().result(), language_statistics, report_cache)
+
+        while pending:
+            yield from _collect_chunk(pending.popleft().result(), language_statistics, report_cache)
+
+
+def _collect_chunk(result: Tuple[List[Tuple[int, str]], dict, dict, Optional[Tuple[int, int, int]]],
+                   language_statistics: Optional[LanguageStatistics] = None,
+                   report_cache: Optional[ReportCache] = None) -> List[Tuple[int, str]]:
+    """Merges the stage durations measured by the worker process into the profiler of this process, and its counters
+    of the language and the cache into the given counters
+
+    Parameters
+    ----------
+    result : Tuple[List[Tuple[int, str]], dict, dict, Optional[Tuple[int, int, int]]]
+        The reports generated by the worker process, its stage durations, its counters of the language and its
+        counters of the cache
+    language_statistics : Optional[LanguageStatistics]
+        Counters of the variants and conditions of the language the counters of the worker are merged into
+    report_cache : Optional[ReportCache]
+        Cache the counters of the cache of the worker are merged into
+
+    Returns
+    -------
+    List[Tuple[int, str]]
+        Pairs of the subject id and the generated report
+    """
+
+    reports, stages, counts, cache_counters = result
+    if stages:
+        PROFILER.merge(stages)
+    if counts and language_statistics is not None:
+        language_statistics.merge(counts)
+    if cache_counters and report_cache is not None:
+        report_cache.merge(cache_counters)
+
+    return reports
+
+
+def _init_worker(app_language: str, definition_template_path: Path, profile: bool = False,
+                 count_language: bool = False, cache_settings: Optional[Tuple[str, int, str]] = None):
+    """Creates the generator of the worker process
+
+    Parameters
+    ----------
+    app_language : str
+        The language of the medical record to be generated in
+    definition_template_path : Path
+        Path to file with the template
+    profile : bool
+        Boolean deciding whether to measure the durations of the stages in the worker process
+    count_language : bool
+        Boolean deciding whether to count the evaluations and hits of the variants in the worker process
+    cache_settings : Optional[Tuple[str, int, str]]
+        The path and maximum size of the cache of the reports and the hash of the language, the template and the
+        code. When omitted, the worker does not use the cache
+    """
+
+    global _worker_generator, _worker_cache, _worker_context_key
+    if profile:
+        # The forked process inherits the durations measured by the parent, which are not to be reported twice
+        PROFILER.drain()
+        PROFILER.enable()
+    _worker_generator = create_generator(app_language, definition_template_path,
+                                         LanguageStatistics() if count_language else None)
+    if cache_settings is not None:
+        path, max_size, _worker_context_key = cache_settings
+        _worker_cache = ReportCache(path, max_size)
+
+
+def _generate_chunk(rows: List[dict]) -> Tuple[List[Tuple[int, str]], dict, dict, Optional[Tuple[int, int, int]]]:
+    """Generates the medical records for a chunk of rows inside the worker process
+
+    Parameters
+    ----------
+    rows : List[dict]
+        Rows with the data of the patients
+
+    Returns
+    -------
+    Tuple[List[Tuple[int, str]], dict, dict, Optional[Tuple[int, int, int]]]
+        Pairs of the subject id and the generated report, and the stage durations, the counters of the language and
+        the counters of the cache collected since the previous chunk
+
+    Raises
+    ------
+    ValueError
+        If the generator of the worker could not be created
+    """
+
+    if _worker_generator is None:
+        raise ValueError("The generator of the worker could not be created")
+
+    reports = []
+    for row in rows:
+        with PROFILER.stage("generate_report"):
+            reports.append((row["subject_id"],
+                            generate_report(_worker_generator, row, _worker_cache, _worker_context_key)))
+
+    language_statistics = _worker_generator.language_statistics
+    cache_counters = None
+    if _worker_cache is not None:
+        _worker_cache.flush()
+        cache_counters = _worker_cache.drain()
+
+    return reports, PROFILER.drain() if PROFILER.enabled else {}, \
+        language_statistics.drain() if language_statistics is not None else {}, cache_counters
+
+
+def create_generator(app_language: str,
+                     definition_template_path: Path = DEFAULT_TEMPLATE_PATH,
+                     language_statistics: Optional[LanguageStatistics] = None) -> Optional[MedicalReportsGenerator]:
+    """Loads the language and creates the generator with language structure and definition template
+
+    Parameters
+    ----------
+    app_language : str
+        The language of the medical record to be generated in
+    definition_template_path : Path
+        Path to file with the template
+    language_statistics : Optional[LanguageStatistics]
+        Counters of the evaluations and hits of the variants and conditions the language is compiled with. When
+        omitted, nothing is counted
+
+    Returns
+    -------
+    Optional[MedicalReportsGenerator]
+        The generator ready to generate reports. None if the language could not be loaded
+    """
+
+    with PROFILER.stage("load_language"):
+        language_dict = load_language(app_language)
+    if not language_dict:
+        return None
+
+    try:
+        with PROFILER.stage("create_language"):
+            language = Language(**language_dict)
+        generator = MedicalReportsGenerator(language, definition_template_path,
+                                            language_statistics=language_statistics)
+    except (KeyError, TypeError, AttributeError, ValueError) as e:
+        logging.error(repr(e))
+        return None
+
+    return generator
+
+
+def list_ids(source: Optional[SourceOptions] = None,
+             connection_manager: Optional[ConnectionManager] = None) -> List[int]:
     """ Return the list of all available ids of patients in the database or csv
 
     Parameters
     ----------
-    load_csv : bool
-        Boolean value deciding whether to load from csv or not
-    csv_file : str
-        Path to csv file
+    source : Optional[SourceOptions]
+        The source of the ids. When omitted, the ids are loaded from the database
+    connection_manager : Optional[ConnectionManager]
+        Pool of connections to the database. When omitted, a new connection is created
 
     Returns
     -------
@@ -80,7 +422,75 @@ def list_ids(load_csv: bool, csv_file: str) -> List[int]:
 
     """
 
-    subject_storage = SubjectStorage(load_csv, csv_file)
+    subject_storage = SubjectStorage(source, connection_manager)
     data = subject_storage.get_subject_ids()
 
     return data
+
+
+def convert(load_csv: bool, csv_file: Union[str, Path], output: str,
+            connection_manager: Optional[ConnectionManager] = None,
+            row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> int:
+    """ Converts all the data of the csv or the database into parquet or feather file, keeping the types of the
+    values, so they do not have to be converted again when the file is loaded
+
+    Parameters
+    ----------
+    load_csv : bool
+        Boolean value deciding whether to convert the csv or the database
+    csv_file : Union[str, Path]
+        Path to csv file
+    output : str
+        Path to parquet or feather file, the format is chosen by its extension
+    connection_manager : Optional[ConnectionManager]
+        Pool of connections to the database. When omitted, a new connection is created
+    row_group_size : int
+        Number of rows of each row group of the file
+
+    Returns
+    -------
+    int
+        Number of converted rows
+
+    """
+
+    if load_csv:
+        table = table_from_csv_file(csv_file, CSV_COLUMN_DTYPES)
+    else:
+        subject_storage = SubjectStorage(SourceOptions(project_columns=False), connection_manager)
+        table = table_from_records(subject_storage.get_data())
+
+    write_columnar_file(table, output, row_group_size)
+    logging.info("Converted %d rows into %s", table.num_rows, output)
+
+    return table.num_rows
+
+
+def snapshot(load_csv: bool, csv_file: Union[str, Path], output: str,
+             connection_manager: Optional[ConnectionManager] = None) -> int:
+    """ Copies the fact table and the lookup tables of the database, or the csv export, into SQLite file indexed by
+    the subject id, which can be used instead of the database
+
+    Parameters
+    ----------
+    load_csv : bool
+        Boolean value deciding whether to copy the csv or the database
+    csv_file : Union[str, Path]
+        Path to csv file
+    output : str
+        Path to SQLite file
+    connection_manager : Optional[ConnectionManager]
+        Pool of connections to the database. When omitted, a new connection is created
+
+    Returns
+    -------
+    int
+        Number of copied rows
+
+    """
+
+    if load_csv:
+        return create_snapshot_from_csv(csv_file, output, CSV_COLUMN_DTYPES)
+
+    with SubjectStorage(connection_manager=connection_manager).connection() as conn:
+        return create_snapshot_from_db(conn, output)
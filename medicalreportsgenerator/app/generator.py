@@ -1,26 +1,49 @@
 import logging
-import copy
-from string import Template
-from typing import Any, Optional
+from typing import Any, Callable, Optional, Tuple, Type, TypeVar, Dict
 
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-
-from app.language import Language, MedicalReportBlock
+from app.language import Language, CompiledBlock
+from app.language_statistics import LanguageStatistics
+from app.phrase_builder import PhraseBuilder
+from app.placeholder_template import substitute_templates
+from app.template_cache import TemplateCache, SHARED_TEMPLATE_CACHE
 from data.data_objects import DiagnosisData, OnsetData, AdmissionData, TreatmentData, \
     PostAcuteCareData, PostStrokeComplicationsData, EtiologyData, DischargeData, MedicationData, \
     DiagnosisOcclusionsData, ImagingTreatmentData, RiskFactorsData, PriorTreatmentData, PatientData, ImagingData
+from data.row_decoder import RowDecoder, ROW_DECODER
 from data.models import Diagnosis, Onset, Admission, Thrombolysis, Thrombectomy, Treatment, \
     PostAcuteCare, PostStrokeComplications, Etiology, Discharge, MedicalReport, Patient, FollowUpImaging
+from utils.profiling import PROFILER
 from pathlib import Path
 
+T = TypeVar("T")
 
-class TemplateWithPeriods(Template):
-    """
-    Class representing a Template with custom pattern.
-    The pattern accepts periods in the values which should be replaced.
 
-    """
-    idpattern = r'(?-i:[._a-zA-Z][._a-zA-Z0-9]*)'
+# Variables of each section of the medical report translated with the 'variables' sub dictionaries of the language,
+# mapped to the key of the sub dictionary
+TRANSLATED_VARIABLES = {
+    "diagnosis": {"imaging_type": "imaging_type"},
+    "patient": {"sex": "sex"},
+    "admission": {"admission_type": "admission_type",
+                  "arrival_mode": "arrival_mode",
+                  "department_type": "department_type"},
+    "treatment": {"ivt_treatment": "ivt_treatment",
+                  "no_thrombolysis_reasons": "no_thrombolysis_reason",
+                  "no_thrombectomy_reasons": "no_thrombectomy_reason",
+                  "tici_score_meaning": "tici_score_meaning"},
+    "post_acute_care": {"swallowing_screening_type": "swallowing_screening_type"},
+    "discharge": {"discharge_destination": "discharge_destination"},
+}
+
+# Keys of the 'variables' sub dictionaries used to build list phrases from groups of flags
+PHRASE_VARIABLES = ["occlusion_position", "risk_factors", "prior_treatment", "post_treatment_findings", "therapies",
+                    "post_stroke_complications", "medications"]
+
+# Keys of the 'variables' sub dictionaries the language has to define
+REQUIRED_VARIABLES = PHRASE_VARIABLES + \
+                     [key for variables in TRANSLATED_VARIABLES.values() for key in variables.values()]
+
+# Keys of the settings the language has to define
+REQUIRED_SETTINGS = ["date_format", "time_format"]
 
 
 class MedicalReportsGenerator:
@@ -32,10 +55,16 @@ class MedicalReportsGenerator:
     Methods
     -------
     generate_medical_report(data)
-        Loads the jinja2 template and renders the template with generated structure
+        Gets the compiled jinja2 template and renders the template with generated structure
+    get_phrase_statistics()
+        Gets the cache counters of the phrase builders
+    get_language_statistics()
+        Gets the counters of the variants and conditions of the language
     """
 
-    def __init__(self, language: Language, template_filepath: Path):
+    def __init__(self, language: Language, template_filepath: Path, template_cache: Optional[TemplateCache] = None,
+                 row_decoder: Optional[RowDecoder] = None,
+                 language_statistics: Optional[LanguageStatistics] = None):
         """
 
         Parameters
@@ -44,15 +73,77 @@ class MedicalReportsGenerator:
             Loaded language variant of the dictionary
         template_filepath : Path
             File path towards the template
+        template_cache : Optional[TemplateCache]
+            Cache of the compiled templates. When omitted, the cache shared by all generators is used
+        row_decoder : Optional[RowDecoder]
+            Decoder of the rows into the data objects. When omitted, the decoder shared by all generators is used
+        language_statistics : Optional[LanguageStatistics]
+            Counters of the evaluations and hits of the variants and conditions of the language. When omitted, the
+            language is compiled without the counters
+
+        Raises
+        ------
+        KeyError
+            If the language is missing any of the required variables or settings
         """
 
         self.language = language
+        with PROFILER.stage("compile_language"):
+            self.compiled_language = language.compile(language_statistics)
+        self.language_statistics = language_statistics
         self.filepath = template_filepath
+        self.template_cache = template_cache if template_cache is not None else SHARED_TEMPLATE_CACHE
+        self.row_decoder = row_decoder if row_decoder is not None else ROW_DECODER
+        self.variables = self.__resolve_variables()
+        self.settings = self.__resolve_settings()
+        self.phrase_builders = {key: PhraseBuilder(self.variables[key]) for key in PHRASE_VARIABLES}
+        # The parts are created in order, the treatment decides whether the follow-up parts are created
+        self.creators: Tuple[Tuple[str, Callable[[], Any]], ...] = (
+            ("create_diagnosis", self.__create_diagnosis),
+            ("create_patient", self.__create_patient),
+            ("create_onset", self.__create_onset),
+            ("create_admission", self.__create_admission),
+            ("create_treatment", self.__create_treatment),
+            ("create_follow_up_imaging", self.__create_follow_up_imaging),
+            ("create_post_acute_care", self.__create_post_acute_care),
+            ("create_post_stroke_complications", self.__create_post_stroke_complications),
+            ("create_etiology", self.__create_etiology),
+            ("create_discharge", self.__create_discharge))
         self.data = {}
         self.transported = False
 
+    @property
+    def data(self) -> dict:
+        """Data of the patient the report is generated for"""
+        return self.__data
+
+    @data.setter
+    def data(self, data: dict):
+        self.__data = data
+        self.__sections: Optional[Dict[type, Any]] = None
+
+    def __get_section(self, data_class: Type[T]) -> T:
+        """Gets the data object of given type decoded from the data of the patient. The whole row is decoded at
+        once, on the first access
+
+        Parameters
+        ----------
+        data_class : Type[T]
+            The type of the data object
+
+        Returns
+        -------
+        T
+            The data object filled with the data of the patient
+        """
+
+        if self.__sections is None:
+            self.__sections = self.row_decoder.decode(self.__data)
+
+        return self.__sections[data_class]
+
     def generate_medical_report(self, data: dict) -> str:
-        """Loads the jinja2 template and renders the template with generated structure
+        """Gets the compiled jinja2 template and renders the template with generated structure
 
         Parameters
         ----------
@@ -65,16 +156,41 @@ class MedicalReportsGenerator:
             Generated medical report with all the values substituted
         """
 
-        path = self.filepath.parent
-        file = self.filepath.name
-
-        env = Environment(loader=FileSystemLoader(path), autoescape=select_autoescape())
-        template = env.get_template(file)
+        template = self.template_cache.get_template(self.filepath)
 
         self.data = data
         report = self.__generate_structure()
+        if self.language_statistics is not None:
+            self.language_statistics.count_report()
+
+        with PROFILER.stage("render"):
+            return template.render(report=report)
+
+    def get_phrase_statistics(self) -> Dict[str, Dict[str, float]]:
+        """Gets the cache counters of the phrase builders
+
+        Returns
+        -------
+        Dict[str, Dict[str, float]]
+            The hits, misses, size and hit rate of the cache mapped by the key of the 'variables' sub dictionary
+        """
+
+        return {key: builder.statistics() for key, builder in self.phrase_builders.items()}
 
-        return template.render(report=report)
+    def get_language_statistics(self) -> Optional[dict]:
+        """Gets the counters of the variants and conditions of the language
+
+        Returns
+        -------
+        Optional[dict]
+            The number of reports, the conditions evaluated per report and the counters mapped by the paths of the
+            variants. None if the generator was created without the counters
+        """
+
+        if self.language_statistics is None:
+            return None
+
+        return self.language_statistics.summary()
 
     def __generate_structure(self) -> dict:
         """Generates the whole structure of a medical report with replaced string template values
@@ -87,66 +203,65 @@ class MedicalReportsGenerator:
 
         medical_report = self.__create_medical_report()
 
-        # We create a deep copy of dictionary with variables from medical report for the purpose of condition evaluation
-        # while parsing, these variables are then translated and used for substitution
-        variables = copy.deepcopy(medical_report.to_dict())
-        translations = self.__translate_variables(medical_report)
-        scoped_values = self.__prepare_scoped_values(translations)
+        # The variables from medical report are used for the purpose of condition evaluation while parsing, their
+        # translated copy is used for substitution
+        variables = medical_report.to_dict()
+        with PROFILER.stage("translate_variables"):
+            scoped_values = self.__prepare_scoped_values(self.__translate_variables(variables))
 
         report = {
-            "diagnosis": self.__get_substituted_block(self.language.diagnosis, medical_report.diagnosis,
+            "diagnosis": self.__get_substituted_block(self.compiled_language.diagnosis, medical_report.diagnosis,
                                                       variables, scoped_values),
 
-            "patient": self.__get_substituted_block(self.language.patient, medical_report.patient,
+            "patient": self.__get_substituted_block(self.compiled_language.patient, medical_report.patient,
                                                     variables, scoped_values),
 
-            "onset": self.__get_substituted_block(self.language.onset, medical_report.onset,
+            "onset": self.__get_substituted_block(self.compiled_language.onset, medical_report.onset,
                                                   variables, scoped_values),
 
 
-            "admission": self.__get_substituted_block(self.language.admission, medical_report.admission,
+            "admission": self.__get_substituted_block(self.compiled_language.admission, medical_report.admission,
                                                       variables, scoped_values),
 
 
-            "treatment": self.__get_substituted_block(self.language.treatment, medical_report.treatment,
+            "treatment": self.__get_substituted_block(self.compiled_language.treatment, medical_report.treatment,
                                                       variables, scoped_values),
 
 
-            "follow_up_imaging": self.__get_substituted_block(self.language.follow_up_imaging,
+            "follow_up_imaging": self.__get_substituted_block(self.compiled_language.follow_up_imaging,
                                                               medical_report.follow_up_imaging,
                                                               variables, scoped_values),
 
 
-            "post_acute_care": self.__get_substituted_block(self.language.post_acute_care,
+            "post_acute_care": self.__get_substituted_block(self.compiled_language.post_acute_care,
                                                             medical_report.post_acute_care,
                                                             variables, scoped_values),
 
-            "post_stroke_complications": self.__get_substituted_block(self.language.post_stroke_complications,
+            "post_stroke_complications": self.__get_substituted_block(self.compiled_language.post_stroke_complications,
                                                                       medical_report.post_stroke_complications,
                                                                       variables, scoped_values),
 
 
-            "etiology": self.__get_substituted_block(self.language.etiology, medical_report.etiology,
+            "etiology": self.__get_substituted_block(self.compiled_language.etiology, medical_report.etiology,
                                                      variables, scoped_values),
 
 
-            "discharge": self.__get_substituted_block(self.language.discharge, medical_report.discharge,
+            "discharge": self.__get_substituted_block(self.compiled_language.discharge, medical_report.discharge,
                                                       variables, scoped_values),
 
         }
 
         return report
 
-    @staticmethod
-    def __get_substituted_block(language_block: MedicalReportBlock, generated_block: Any,
+    def __get_substituted_block(self, language_block: CompiledBlock, generated_block: Any,
                                 variables: dict, scoped_values: dict) -> str:
         """Gets the block result and substitutes it with values
 
 
         Parameters
         ----------
-        language_block : MedicalReportBlock
-            A block from the language class defining the structure
+        language_block : CompiledBlock
+            A compiled block from the language class defining the structure
         generated_block : Any
             Generated block by the generator
         variables : dict
@@ -160,8 +275,14 @@ class MedicalReportsGenerator:
             block result with substitutions
 
         """
-        return TemplateWithPeriods(language_block.get_block_result(variables) if generated_block else "")\
-            .safe_substitute(scoped_values)
+        if not generated_block:
+            return ""
+
+        with PROFILER.stage("evaluate_conditions"):
+            templates = language_block(variables)
+
+        with PROFILER.stage("substitute"):
+            return substitute_templates(templates, scoped_values)
 
     def __create_medical_report(self) -> MedicalReport:
         """Creates the whole MedicalReport from all of its parts
@@ -172,16 +293,12 @@ class MedicalReportsGenerator:
             The whole medical report with all the template values yet to be replaced
         """
 
-        return MedicalReport(self.__create_diagnosis(),
-                             self.__create_patient(),
-                             self.__create_onset(),
-                             self.__create_admission(),
-                             self.__create_treatment(),
-                             self.__create_follow_up_imaging(),
-                             self.__create_post_acute_care(),
-                             self.__create_post_stroke_complications(),
-                             self.__create_etiology(),
-                             self.__create_discharge())
+        parts = []
+        for stage, create in self.creators:
+            with PROFILER.stage(stage):
+                parts.append(create())
+
+        return MedicalReport(*parts)
 
     def __create_diagnosis(self) -> Diagnosis:
         """Creates the Diagnosis part of MedicalReport
@@ -192,16 +309,16 @@ class MedicalReportsGenerator:
             The diagnosis part medical report with all the template values yet to be replaced
         """
 
-        diagnosis_data = DiagnosisData.from_dict(self.data)
-        diagnosis_occlusions = DiagnosisOcclusionsData.from_dict(self.data)
+        diagnosis_data = self.__get_section(DiagnosisData)
+        diagnosis_occlusions = self.__get_section(DiagnosisOcclusionsData)
 
         diagnosis = Diagnosis(diagnosis_data.stroke_type,
                               diagnosis_data.aspects_score,
                               diagnosis_data.imaging_type,
-                              self.__parse_data(self.__get_variables("occlusion_position"), vars(diagnosis_occlusions)),
+                              self.phrase_builders["occlusion_position"].build(vars(diagnosis_occlusions)),
                               diagnosis_data.imaging_timestamp,
                               diagnosis_data.imaging_within_hour,
-                              self.__get_setting("time_format"))
+                              self.settings["time_format"])
 
         return diagnosis
 
@@ -214,17 +331,17 @@ class MedicalReportsGenerator:
             The patient part medical report with all the template values yet to be replaced
         """
 
-        patient_data = PatientData.from_dict(self.data)
-        risk_factors_data = RiskFactorsData.from_dict(self.data)
-        prior_treatment_data = PriorTreatmentData.from_dict(self.data)
+        patient_data = self.__get_section(PatientData)
+        risk_factors_data = self.__get_section(RiskFactorsData)
+        prior_treatment_data = self.__get_section(PriorTreatmentData)
         risk_atrial_fib = {"risk_atrial_fibrilation": patient_data.risk_atrial_fibrilation}
 
         patient = Patient(patient_data.patient_id,
                           patient_data.age,
                           patient_data.sex,
-                          self.__parse_data(self.__get_variables("risk_factors"), vars(risk_factors_data)),
-                          self.__parse_data(self.__get_variables("prior_treatment"), vars(prior_treatment_data)),
-                          self.__parse_data(self.__get_variables("risk_factors"), risk_atrial_fib))
+                          self.phrase_builders["risk_factors"].build(vars(risk_factors_data)),
+                          self.phrase_builders["prior_treatment"].build(vars(prior_treatment_data)),
+                          self.phrase_builders["risk_factors"].build(risk_atrial_fib))
 
         return patient
 
@@ -237,12 +354,12 @@ class MedicalReportsGenerator:
             The onset part medical report with all the template values yet to be replaced
         """
 
-        onset_data = OnsetData.from_dict(self.data)
+        onset_data = self.__get_section(OnsetData)
 
         onset = Onset(onset_data.onset_timestamp,
                       onset_data.wake_up_stroke,
-                      self.__get_setting("date_format"),
-                      self.__get_setting("time_format"))
+                      self.settings["date_format"],
+                      self.settings["time_format"])
 
         return onset
 
@@ -255,7 +372,7 @@ class MedicalReportsGenerator:
             The admission part medical report with all the template values yet to be replaced
         """
 
-        admission_data = AdmissionData.from_dict(self.data)
+        admission_data = self.__get_section(AdmissionData)
 
         admission = Admission(admission_data.nihss_score, admission_data.aspects_score,
                               admission_data.hospitalized_in,
@@ -266,7 +383,7 @@ class MedicalReportsGenerator:
                               admission_data.arrival_mode,
                               admission_data.department_type,
                               admission_data.prenotification,
-                              self.__get_setting("time_format"))
+                              self.settings["time_format"])
 
         return admission
 
@@ -279,7 +396,7 @@ class MedicalReportsGenerator:
             The treatment part medical report with all the template values yet to be replaced
         """
 
-        treatment_data = TreatmentData.from_dict(self.data)
+        treatment_data = self.__get_section(TreatmentData)
         thrombolysis = Thrombolysis(treatment_data.dtn,
                                     treatment_data.ivt_treatment,
                                     treatment_data.ivt_dose)
@@ -315,12 +432,11 @@ class MedicalReportsGenerator:
         if self.transported:
             return None
 
-        imaging_data = ImagingData.from_dict(self.data)
-        imaging_treatment_data = ImagingTreatmentData.from_dict(self.data)
+        imaging_data = self.__get_section(ImagingData)
+        imaging_treatment_data = self.__get_section(ImagingTreatmentData)
 
-        imaging = FollowUpImaging(self.__parse_data(
-            self.__get_variables("post_treatment_findings"), vars(imaging_treatment_data)),
-            imaging_data.imaging_type)
+        imaging = FollowUpImaging(self.phrase_builders["post_treatment_findings"].build(vars(imaging_treatment_data)),
+                                  imaging_data.imaging_type)
 
         return imaging
 
@@ -338,7 +454,7 @@ class MedicalReportsGenerator:
         if self.transported:
             return None
 
-        post_acute_care_data = PostAcuteCareData.from_dict(self.data)
+        post_acute_care_data = self.__get_section(PostAcuteCareData)
 
         post_acute_care = PostAcuteCare(post_acute_care_data.afib_flutter,
                                         post_acute_care_data.swallowing_screening,
@@ -352,7 +468,7 @@ class MedicalReportsGenerator:
                                      "ergotherapy": post_acute_care.ergotherapy,
                                      "speechtherapy": post_acute_care.speechtherapy}
 
-        post_acute_care.therapies = self.__parse_data(self.__get_variables("therapies"), post_acute_care_therapies)
+        post_acute_care.therapies = self.phrase_builders["therapies"].build(post_acute_care_therapies)
 
         return post_acute_care
 
@@ -366,10 +482,10 @@ class MedicalReportsGenerator:
 
         """
 
-        post_stroke_complications_data = PostStrokeComplicationsData.from_dict(self.data)
+        post_stroke_complications_data = self.__get_section(PostStrokeComplicationsData)
 
-        post_stroke_complications = PostStrokeComplications(self.__parse_data(
-            self.__get_variables("post_stroke_complications"), vars(post_stroke_complications_data)))
+        post_stroke_complications = PostStrokeComplications(
+            self.phrase_builders["post_stroke_complications"].build(vars(post_stroke_complications_data)))
 
         return post_stroke_complications
 
@@ -387,7 +503,7 @@ class MedicalReportsGenerator:
         if self.transported:
             return None
 
-        etiology_data = EtiologyData.from_dict(self.data)
+        etiology_data = self.__get_section(EtiologyData)
 
         etiology = Etiology(etiology_data.etiology_large_artery, etiology_data.etiology_cardioembolism,
                             etiology_data.etiology_other, etiology_data.etiology_cryptogenic_stroke,
@@ -405,8 +521,8 @@ class MedicalReportsGenerator:
             The discharge part medical report with all the template values yet to be replaced.
 
         """
-        discharge_data = DischargeData.from_dict(self.data)
-        medication_data = MedicationData.from_dict(self.data)
+        discharge_data = self.__get_section(DischargeData)
+        medication_data = self.__get_section(MedicationData)
 
         discharge = Discharge(discharge_data.discharge_date,
                               discharge_data.discharge_destination,
@@ -414,65 +530,51 @@ class MedicalReportsGenerator:
                               discharge_data.discharge_mrs,
                               discharge_data.contact_date,
                               discharge_data.mode_contact,
-                              self.__parse_data(self.__get_variables("medications"), vars(medication_data)),
-                              self.__get_setting("date_format"))
+                              self.phrase_builders["medications"].build(vars(medication_data)),
+                              self.settings["date_format"])
 
         return discharge
 
-    def __get_variables(self, key: str) -> Optional[dict]:
-        """Gets the 'variables' sub dictionary from the dictionary
-
-        Parameters
-        ----------
-        key : str
-            Key of the sub dictionary to be returned
+    def __resolve_variables(self) -> Dict[str, dict]:
+        """Resolves all the required 'variables' sub dictionaries of the language once, so they are not looked up
+        for every report
 
         Returns
         -------
-        dict
-            The sub dictionary specified by the key. None if the key is incorrect
+        Dict[str, dict]
+            The sub dictionaries specified by their keys
 
         Raises
         ------
         KeyError
-            If the dictionary is missing given key
-
+            If the language is missing any of the required keys
         """
 
-        try:
-            variable = self.language.variables[key]
-        except KeyError:
-            logging.error("Variables are missing key %s", key)
-            return None
-
-        return variable
+        missing = [key for key in REQUIRED_VARIABLES if key not in self.language.variables]
+        if missing:
+            raise KeyError(f"Variables are missing keys {', '.join(missing)}")
 
-    def __get_setting(self, key: str) -> Optional[str]:
-        """Gets the specified setting from the dictionary
+        return {key: self.language.variables[key] for key in REQUIRED_VARIABLES}
 
-        Parameters
-        ----------
-        key :
-            Key of the setting to be returned.
+    def __resolve_settings(self) -> Dict[str, Optional[str]]:
+        """Resolves all the required settings of the language once, so they are not looked up for every report
 
         Returns
         -------
-            The setting specified by the key. None if the key is incorrect
+        Dict[str, Optional[str]]
+            The settings specified by their keys
 
         Raises
         ------
         KeyError
-            If the dictionary is missing given key
-
+            If the language is missing any of the required keys
         """
 
-        try:
-            setting = self.language.settings[key]
-        except KeyError:
-            logging.error("Settings are missing key %s", key)
-            return None
+        missing = [key for key in REQUIRED_SETTINGS if key not in self.language.settings]
+        if missing:
+            raise KeyError(f"Settings are missing keys {', '.join(missing)}")
 
-        return setting
+        return {key: self.language.settings[key] for key in REQUIRED_SETTINGS}
 
     @staticmethod
     def __prepare_scoped_values(values: dict) -> dict:
@@ -531,106 +633,35 @@ class MedicalReportsGenerator:
 
         return ""
 
-    def __parse_data(self, dictionary: dict, data: dict) -> str:
-        """Parses the variables from dictionary specified by the data
+    def __translate_variables(self, variables: dict) -> dict:
+        """Translates the variables in the discharge report. Only the translated sections are copied, the variables
+        themselves are left untouched
 
         Parameters
         ----------
-        dictionary : dict
-            A dictionary from which the text versions are taken from
-        data : dict
-            A dictionary with the data to be parsed
+        variables : dict
+            Dictionary of the medical discharge report, as returned by MedicalReport.to_dict
 
         Returns
         -------
-        str
-            The resulting parsed text from json dictionary based on the data
+        dict
+            Dictionary of the medical discharge report with translated values
         """
 
-        result = ""
-        if dictionary is None:
-            return result
-
-        for key, value in data.items():
-            if value:
-                variable = ""
-
-                try:
-                    variable = dictionary[key]
-                except KeyError:
-                    logging.error("Invalid key %s", key)
-
-                if variable != "":
-                    result += variable if result == "" else f", {variable}"
-
-        result = self.replace_last(result, ",", ", and")
-
-        return result
-
-    @staticmethod
-    def replace_last(string: str, old: str, new: str) -> str:
-        """Replaces the last substring with new substring of given string
-
-        Parameters
-        ----------
-        string : str
-            The string in which we are replacing substrings
-        old : str
-            The last occurrence of the string to be replaced
-        new : str
-            The replacement string
+        translations = dict(variables)
 
-        Returns
-        -------
-        str
-            The replaced string
-        """
+        for section_name, translated_variables in TRANSLATED_VARIABLES.items():
+            section = variables[section_name]
 
-        return new.join(string.rsplit(old, 1))
+            # Sections which were not generated, e.g. post acute care of transported patient, stay empty
+            if not section:
+                continue
 
-    def __translate_variables(self, mr: MedicalReport) -> dict:
-        """Translates the variables in the discharge report
+            translated_section = dict(section)
+            for variable, dictionary_key in translated_variables.items():
+                translated_section[variable] = self.__translate_data(self.variables[dictionary_key],
+                                                                     section[variable])
 
-        Returns
-        -------
-        dict
-            Dictionary of the medical discharge report with translated values
-        """
+            translations[section_name] = translated_section
 
-        # Diagnosis
-        mr.diagnosis.imaging_type = self.__translate_data(self.__get_variables("imaging_type"),
-                                                          mr.diagnosis.imaging_type)
-
-        # Patient
-        mr.patient.sex = self.__translate_data(self.__get_variables("sex"), mr.patient.sex)
-
-        # Admission
-        mr.admission.admission_type = self.__translate_data(self.__get_variables("admission_type"),
-                                                            mr.admission.admission_type)
-        mr.admission.arrival_mode = self.__translate_data(self.__get_variables("arrival_mode"),
-                                                          mr.admission.arrival_mode)
-        mr.admission.department_type = self.__translate_data(self.__get_variables("department_type"),
-                                                             mr.admission.department_type)
-
-        # Treatment
-        mr.treatment.thrombolysis.ivt_treatment = self.__translate_data(self.__get_variables("ivt_treatment"),
-                                                                        mr.treatment.thrombolysis.ivt_treatment)
-        mr.treatment.no_thrombolysis_reasons = self.__translate_data(self.__get_variables("no_thrombolysis_reason"),
-                                                                     mr.treatment.no_thrombolysis_reasons)
-        mr.treatment.no_thrombectomy_reasons = self.__translate_data(self.__get_variables("no_thrombectomy_reason"),
-                                                                     mr.treatment.no_thrombectomy_reasons)
-        mr.treatment.thrombectomy.tici_score_meaning = self.__translate_data(self.__get_variables("tici_score_meaning"),
-                                                                             mr.treatment.thrombectomy.
-                                                                             tici_score_meaning)
-
-        # Post acute care
-        if not self.transported:
-            mr.post_acute_care.swallowing_screening_type = \
-                self.__translate_data(self.__get_variables("swallowing_screening_type"),
-                                      mr.post_acute_care.swallowing_screening_type)
-
-        # Discharge
-        mr.discharge.discharge_destination = self.__translate_data(self.__get_variables("discharge_destination"),
-                                                                   mr.discharge.discharge_destination)
-
-        return mr.to_dict()
+        return translations
@@ -1,6 +1,48 @@
 import logging
 from datetime import time
-from typing import List, Union, Any
+from typing import List, Union, Any, Callable, Optional, Tuple, TYPE_CHECKING
+
+from app.placeholder_template import PlaceholderTemplate
+
+if TYPE_CHECKING:
+    from app.language_statistics import LanguageStatistics, VariantCounter
+
+# A compiled condition, returns the truthiness of the condition for the given data
+CompiledCondition = Callable[[dict], Any]
+# A compiled block, returns the parsed texts of the variants which apply to the given data, in order
+CompiledBlock = Callable[[dict], List[PlaceholderTemplate]]
+# A compiled variant, pair of the condition (None if always true) and either the parsed text or the compiled nested
+# block
+CompiledVariant = Tuple[Optional[CompiledCondition], Union[PlaceholderTemplate, CompiledBlock]]
+
+
+def count_conditions(condition: CompiledCondition, counter: Optional["VariantCounter"]) -> CompiledCondition:
+    """Wraps the compiled VALUE or EXISTENCE condition to count its evaluations for the variant it belongs to
+
+    Parameters
+    ----------
+    condition : CompiledCondition
+        The compiled condition
+    counter : Optional[VariantCounter]
+        The counter of the variant. When None, the condition is returned as it is
+
+    Returns
+    -------
+    CompiledCondition
+        The condition counting its evaluations
+    """
+
+    if counter is None:
+        return condition
+
+    variant_counter: "VariantCounter" = counter
+
+    def counted_condition(data: dict) -> Any:
+        variant_counter.conditions += 1
+
+        return condition(data)
+
+    return counted_condition
 
 
 class Condition:
@@ -13,6 +55,8 @@ class Condition:
         Parses the condition loaded from json file to the correct condition type
     parse_conditions(conditions)
         Parses the list of conditions loaded from json file to the correct list of condition types
+    compile(counter)
+        Compiles the condition into a closure
     """
 
     def __init__(self, condition: dict = None):
@@ -84,6 +128,55 @@ class Condition:
 
         return result
 
+    def compile(self, counter: Optional["VariantCounter"] = None) -> Optional[CompiledCondition]:
+        """Compiles the condition into a closure
+
+        Parameters
+        ----------
+        counter : Optional[VariantCounter]
+            The counter of the evaluations of the VALUE and EXISTENCE conditions. When omitted, nothing is counted
+
+        Returns
+        -------
+        Optional[CompiledCondition]
+            Function evaluating the condition for given data. None if the condition is always true
+        """
+
+        if self.condition is None:
+            return None
+
+        return self.condition.compile(counter)
+
+    @staticmethod
+    def split_scope(scope: str) -> Tuple[str, str]:
+        """Splits the scope of the condition into the block and the variable
+
+        Parameters
+        ----------
+        scope : str
+            Scope of the variable in format 'block.variable'
+
+        Returns
+        -------
+        Tuple[str, str]
+            The block and the variable of the scope
+
+        Raises
+        ------
+        AttributeError
+            If the scope is not defined in the condition
+        ValueError
+            If the scope defined is in incorrect format and cannot be split
+        """
+
+        try:
+            block, variable = scope.split(".")
+        except (AttributeError, ValueError):
+            logging.error("Invalid 'scope' key inside condition block")
+            raise
+
+        return block, variable
+
 
 class ConditionEmpty(Condition):
     """
@@ -113,6 +206,21 @@ class ConditionEmpty(Condition):
         """
         return True
 
+    def compile(self, counter: Optional["VariantCounter"] = None) -> Optional[CompiledCondition]:
+        """Compiles the condition into a closure
+
+        Parameters
+        ----------
+        counter : Optional[VariantCounter]
+            The counter of the evaluations of the VALUE and EXISTENCE conditions. When omitted, nothing is counted
+
+        Returns
+        -------
+        Optional[CompiledCondition]
+            Always None as the condition is always true
+        """
+        return None
+
 
 class ConditionValue(Condition):
     """
@@ -183,6 +291,41 @@ class ConditionValue(Condition):
 
         return var == self.value
 
+    def compile(self, counter: Optional["VariantCounter"] = None) -> Optional[CompiledCondition]:
+        """Compiles the condition into a closure with the scope split in advance
+
+        Parameters
+        ----------
+        counter : Optional[VariantCounter]
+            The counter of the evaluations of the VALUE and EXISTENCE conditions. When omitted, nothing is counted
+
+        Returns
+        -------
+        Optional[CompiledCondition]
+            Function evaluating the VALUE condition for given data
+
+        Raises
+        ------
+        AttributeError
+            If the 'scope' key is not defined in the condition
+        ValueError
+            If the scope defined is in incorrect format and cannot be split
+        """
+
+        scope, variable = self.split_scope(self.scope)
+        value = self.value
+
+        def condition_value(data: dict) -> bool:
+            try:
+                var = data[scope][variable]
+            except KeyError:
+                logging.error(f"Invalid key {scope}.{variable} inside condition block")
+                raise
+
+            return var == value
+
+        return count_conditions(condition_value, counter)
+
 
 class ConditionExistence(Condition):
     """
@@ -263,6 +406,53 @@ class ConditionExistence(Condition):
 
         return self.value is False
 
+    def compile(self, counter: Optional["VariantCounter"] = None) -> Optional[CompiledCondition]:
+        """Compiles the condition into a closure with the scope split and the results for the value resolved in
+        advance
+
+        Parameters
+        ----------
+        counter : Optional[VariantCounter]
+            The counter of the evaluations of the VALUE and EXISTENCE conditions. When omitted, nothing is counted
+
+        Returns
+        -------
+        Optional[CompiledCondition]
+            Function evaluating the EXISTENCE condition for given data
+
+        Raises
+        ------
+        AttributeError
+            If the 'scope' key is not defined in the condition
+        ValueError
+            If the scope defined is in incorrect format and cannot be split
+        """
+
+        scope, variable = self.split_scope(self.scope)
+        value = self.value
+        exists = value == True  # noqa: E712, the value is compared the same way as in get_condition_result
+        not_exists = value is False
+
+        def condition_existence(data: dict) -> Any:
+            try:
+                var = data[scope][variable]
+            except KeyError:
+                logging.error(f"Invalid key {scope}.{variable} inside condition block")
+                raise
+
+            if var:
+                var_type = type(var)
+                if var_type is int or var_type is float:
+                    return value
+                if var_type is bool or var_type is str:
+                    return exists
+                if var_type is time:
+                    return value == (var > time.min)
+
+            return not_exists
+
+        return count_conditions(condition_existence, counter)
+
 
 class ConditionAnd(Condition):
     """
@@ -309,6 +499,40 @@ class ConditionAnd(Condition):
 
         return is_true
 
+    def compile(self, counter: Optional["VariantCounter"] = None) -> Optional[CompiledCondition]:
+        """Compiles the condition into a closure, leaving out the conditions which are always true
+
+        Parameters
+        ----------
+        counter : Optional[VariantCounter]
+            The counter of the evaluations of the VALUE and EXISTENCE conditions. When omitted, nothing is counted
+
+        Returns
+        -------
+        Optional[CompiledCondition]
+            Function evaluating the AND condition for given data. None if the condition is always true
+        """
+
+        conditions = tuple(compiled for compiled in (condition.compile(counter) for condition in self.conditions)
+                           if compiled is not None)
+
+        if not conditions:
+            return None
+        if len(conditions) == 1:
+            return conditions[0]
+        if len(conditions) == 2:
+            first, second = conditions
+            return lambda data: bool(first(data) and second(data))
+
+        def condition_and(data: dict) -> bool:
+            for condition in conditions:
+                if not condition(data):
+                    return False
+
+            return True
+
+        return condition_and
+
 
 class ConditionOr(Condition):
     """
@@ -354,6 +578,48 @@ class ConditionOr(Condition):
 
         return is_true
 
+    def compile(self, counter: Optional["VariantCounter"] = None) -> Optional[CompiledCondition]:
+        """Compiles the condition into a closure. Conditions following a condition that is always true are left out,
+        as they would never be evaluated
+
+        Parameters
+        ----------
+        counter : Optional[VariantCounter]
+            The counter of the evaluations of the VALUE and EXISTENCE conditions. When omitted, nothing is counted
+
+        Returns
+        -------
+        Optional[CompiledCondition]
+            Function evaluating the OR condition for given data
+        """
+
+        compiled_conditions = []
+        always_true = False
+
+        for condition in self.conditions:
+            compiled = condition.compile(counter)
+            if compiled is None:
+                always_true = True
+                break
+            compiled_conditions.append(compiled)
+
+        conditions = tuple(compiled_conditions)
+
+        if always_true and not conditions:
+            return None
+        if len(conditions) == 2 and not always_true:
+            first, second = conditions
+            return lambda data: bool(first(data) or second(data))
+
+        def condition_or(data: dict) -> bool:
+            for condition in conditions:
+                if condition(data):
+                    return True
+
+            return always_true
+
+        return condition_or
+
 
 class ConditionNot(Condition):
     """
@@ -394,6 +660,27 @@ class ConditionNot(Condition):
 
         return not self.condition.get_condition_result(data)
 
+    def compile(self, counter: Optional["VariantCounter"] = None) -> Optional[CompiledCondition]:
+        """Compiles the condition into a closure
+
+        Parameters
+        ----------
+        counter : Optional[VariantCounter]
+            The counter of the evaluations of the VALUE and EXISTENCE conditions. When omitted, nothing is counted
+
+        Returns
+        -------
+        Optional[CompiledCondition]
+            Function evaluating the NOT condition for given data
+        """
+
+        condition = self.condition.compile(counter)
+
+        if condition is None:
+            return lambda data: False
+
+        return lambda data: not condition(data)
+
 
 class Variant:
     """
@@ -405,6 +692,8 @@ class Variant:
         Parses the kwargs as either a str or MedicalReportBlock
     get_variant_result(data)
         Gets the final result of the parsed variant
+    compile(statistics, path)
+        Compiles the variant into a list of pairs of a condition and a result
     """
 
     def __init__(self, condition: dict, **kwargs: dict):
@@ -463,6 +752,39 @@ class Variant:
 
         return ""
 
+    def compile(self, statistics: Optional["LanguageStatistics"] = None,
+                path: str = "") -> List[CompiledVariant]:
+        """Compiles the variant into a list of pairs of a condition and a result. A nested block without a condition
+        is flattened into the pairs of its variants
+
+        Parameters
+        ----------
+        statistics : Optional[LanguageStatistics]
+            The counters of the evaluations and hits of the variants. When omitted, nothing is counted
+        path : str
+            Path of the variant the counters are keyed by, such as 'treatment[2]'
+
+        Returns
+        -------
+        List[CompiledVariant]
+            Pairs of the compiled condition, None if always true, and either the text parsed into the placeholder
+            segments or the compiled nested block
+        """
+
+        counter = statistics.create_counter() if statistics is not None else None
+        condition = self.condition.compile(counter)
+
+        if not isinstance(self.rest, str) and condition is None:
+            return self.rest.compile_variants(statistics, f"{path}.{self.rest.name}")
+
+        if statistics is not None and counter is not None:
+            condition = statistics.count_variant(condition, path, counter)
+
+        if isinstance(self.rest, str):
+            return [(condition, PlaceholderTemplate(self.rest))]
+
+        return [(condition, self.rest.compile(statistics, f"{path}.{self.rest.name}"))]
+
 
 class MedicalReportBlock:
     """
@@ -474,6 +796,10 @@ class MedicalReportBlock:
         Parses the list of variants loaded from json to list of Variant types
     get_block_result(data)
         Gets the final result of the parsed block
+    compile_variants(statistics, path)
+        Compiles all variants of the block into a flat list of pairs of a condition and a result
+    compile(statistics, path)
+        Compiles the block into a closure
     """
 
     def __init__(self, name: str, variants: List[dict]):
@@ -543,10 +869,74 @@ class MedicalReportBlock:
 
         return text
 
+    def compile_variants(self, statistics: Optional["LanguageStatistics"] = None,
+                         path: Optional[str] = None) -> List[CompiledVariant]:
+        """Compiles all variants of the block into a flat list of pairs of a condition and a result
+
+        Parameters
+        ----------
+        statistics : Optional[LanguageStatistics]
+            The counters of the evaluations and hits of the variants. When omitted, nothing is counted
+        path : Optional[str]
+            Path of the block the paths of its variants start with. When omitted, the name of the block is used
+
+        Returns
+        -------
+        List[CompiledVariant]
+            Pairs of the compiled condition, None if always true, and either the parsed text or the compiled nested
+            block
+        """
+
+        path = path or self.name
+
+        variants: List[CompiledVariant] = []
+        for index, variant in enumerate(self.variants):
+            variants.extend(variant.compile(statistics, f"{path}[{index}]"))
+
+        return variants
+
+    def compile(self, statistics: Optional["LanguageStatistics"] = None, path: Optional[str] = None) -> CompiledBlock:
+        """Compiles the block into a closure. The texts of the variants are parsed into the placeholder segments once,
+        here, so the generator only substitutes the values
+
+        Parameters
+        ----------
+        statistics : Optional[LanguageStatistics]
+            The counters of the evaluations and hits of the variants. When omitted, nothing is counted
+        path : Optional[str]
+            Path of the block the paths of its variants start with. When omitted, the name of the block is used
+
+        Returns
+        -------
+        CompiledBlock
+            Function returning the parsed texts of the block for given data, which joined give the final text
+        """
+
+        variants = tuple(self.compile_variants(statistics, path))
+
+        def block_result(data: dict) -> List[PlaceholderTemplate]:
+            templates = []
+
+            for condition, result in variants:
+                if condition is None or condition(data):
+                    if isinstance(result, PlaceholderTemplate):
+                        templates.append(result)
+                    else:
+                        templates.extend(result(data))
+
+            return templates
+
+        return block_result
+
 
 class Language:
     """
     A class representing the language loaded from the json file
+
+    Methods
+    -------
+    compile(statistics)
+        Compiles the blocks of the language into closures
     """
 
     def __init__(self, diagnosis: dict, patient: dict, onset: dict, admission: dict, treatment: dict,
@@ -568,3 +958,39 @@ class Language:
             self.variables = variables
         except (KeyError, TypeError, AttributeError):
             raise
+
+    def compile(self, statistics: Optional["LanguageStatistics"] = None):
+        """Compiles the blocks of the language into closures
+
+        Parameters
+        ----------
+        statistics : Optional[LanguageStatistics]
+            The counters of the evaluations and hits of the variants. When omitted, the closures count nothing and
+            are not slowed down
+
+        Returns
+        -------
+        CompiledLanguage
+            The language with the blocks compiled
+        """
+
+        return CompiledLanguage(self, statistics)
+
+
+class CompiledLanguage:
+    """
+    A class representing the language with every block compiled into a closure. The texts of the templates returned
+    by the closures joined give the same results as the get_block_result method of the corresponding blocks.
+    """
+
+    def __init__(self, language: Language, statistics: Optional["LanguageStatistics"] = None):
+        self.diagnosis = language.diagnosis.compile(statistics)
+        self.patient = language.patient.compile(statistics)
+        self.onset = language.onset.compile(statistics)
+        self.admission = language.admission.compile(statistics)
+        self.treatment = language.treatment.compile(statistics)
+        self.follow_up_imaging = language.follow_up_imaging.compile(statistics)
+        self.post_acute_care = language.post_acute_care.compile(statistics)
+        self.post_stroke_complications = language.post_stroke_complications.compile(statistics)
+        self.etiology = language.etiology.compile(statistics)
+        self.discharge = language.discharge.compile(statistics)
@@ -0,0 +1,252 @@
+import json
+import threading
+from typing import Dict, List, Optional
+
+from app.language import CompiledCondition
+
+# Number of the variants evaluating the most conditions printed in the summary
+DEFAULT_SUMMARY_LIMIT = 20
+
+
+class VariantCounter:
+    """
+    A class representing the counters of a single variant of the language.
+    """
+
+    __slots__ = ("evaluated", "hits", "conditions")
+
+    def __init__(self):
+        self.evaluated = 0
+        self.hits = 0
+        self.conditions = 0
+
+
+class LanguageStatistics:
+    """
+    A class representing the counters of the variants and conditions of the language, keyed by the path of the
+    variant, such as 'treatment[2].thrombolysis[0]' for the first variant of the nested block of the third variant of
+    the treatment block.
+
+    The counters are attached to the closures when the language is compiled with the statistics, so the language
+    compiled without them is not slowed down. The counters are not locked, so the counts of the reports generated by
+    several threads at once may be slightly lower.
+
+    Methods
+    -------
+    variant(path)
+        Gets the counter of the variant
+    count_report()
+        Counts the generated report
+    create_counter()
+        Creates the counter of the variant being compiled
+    count_variant(condition, path, counter)
+        Wraps the condition of the variant to count its evaluations and hits
+    summary()
+        Gets the counters of all variants
+    dead_variants()
+        Gets the paths of the variants which were never used
+    drain()
+        Gets the counts collected so far and starts over
+    merge(counts)
+        Adds the counts collected by another process
+    format_summary(limit)
+        Formats the counters as a table of the most expensive variants and the dead variants
+    write_json(path, metadata)
+        Writes the counters of all variants and the dead variants into the JSON file
+    """
+
+    def __init__(self):
+        self.variants: Dict[str, VariantCounter] = {}
+        self.reports = 0
+        self.lock = threading.Lock()
+
+    def variant(self, path: str) -> VariantCounter:
+        """Gets the counter of the variant, creating it when the variant was not compiled yet
+
+        Parameters
+        ----------
+        path : str
+            Path of the variant
+
+        Returns
+        -------
+        VariantCounter
+            The counter of the variant
+        """
+
+        with self.lock:
+            counter = self.variants.get(path)
+            if counter is None:
+                counter = self.variants[path] = VariantCounter()
+
+        return counter
+
+    @staticmethod
+    def create_counter() -> VariantCounter:
+        """Creates the counter of the variant being compiled. The counter is kept only if the variant is not
+        flattened into the variants of its nested block, see count_variant
+
+        Returns
+        -------
+        VariantCounter
+            The new counter
+        """
+
+        return VariantCounter()
+
+    def count_report(self):
+        """Counts the generated report"""
+
+        self.reports += 1
+
+    def count_variant(self, condition: Optional[CompiledCondition], path: str,
+                      counter: VariantCounter) -> CompiledCondition:
+        """Wraps the condition of the variant to count its evaluations and hits, and keeps the counter of the variant
+
+        Parameters
+        ----------
+        condition : Optional[CompiledCondition]
+            The compiled condition of the variant, None if always true
+        path : str
+            Path of the variant
+        counter : VariantCounter
+            The counter the VALUE and EXISTENCE conditions of the variant were compiled with
+
+        Returns
+        -------
+        CompiledCondition
+            The condition counting its evaluations and hits
+        """
+
+        with self.lock:
+            self.variants[path] = counter
+
+        def counted_variant(data: dict) -> bool:
+            counter.evaluated += 1
+            result = condition is None or condition(data)
+            if result:
+                counter.hits += 1
+
+            return result
+
+        return counted_variant
+
+    def summary(self) -> dict:
+        """Gets the counters of all variants, in the order of the language file
+
+        Returns
+        -------
+        dict
+            The number of reports, the mean number of conditions evaluated per report and the evaluations, hits, hit
+            rate and condition evaluations mapped by the paths of the variants
+        """
+
+        with self.lock:
+            variants = dict(self.variants)
+
+        conditions = sum(counter.conditions for counter in variants.values())
+
+        return {"reports": self.reports,
+                "conditions_per_report": conditions / self.reports if self.reports else 0.0,
+                "variants": {path: {"evaluated": counter.evaluated,
+                                    "hits": counter.hits,
+                                    "hit_rate": counter.hits / counter.evaluated if counter.evaluated else 0.0,
+                                    "conditions": counter.conditions}
+                             for path, counter in variants.items()}}
+
+    def dead_variants(self) -> List[str]:
+        """Gets the paths of the variants which were never used, either their condition was never true or they were
+        never evaluated
+
+        Returns
+        -------
+        List[str]
+            The paths of the dead variants
+        """
+
+        with self.lock:
+            return [path for path, counter in self.variants.items() if not counter.hits]
+
+    def drain(self) -> dict:
+        """Gets the counts collected so far and starts over. The counters stay attached to the compiled language
+
+        Returns
+        -------
+        dict
+            The number of reports and the evaluations, hits and condition evaluations mapped by the paths
+        """
+
+        with self.lock:
+            counts = {"reports": self.reports,
+                      "variants": {path: (counter.evaluated, counter.hits, counter.conditions)
+                                   for path, counter in self.variants.items()}}
+
+            self.reports = 0
+            for counter in self.variants.values():
+                counter.evaluated = counter.hits = counter.conditions = 0
+
+        return counts
+
+    def merge(self, counts: dict):
+        """Adds the counts collected by another process
+
+        Parameters
+        ----------
+        counts : dict
+            The counts returned by drain
+        """
+
+        self.reports += counts["reports"]
+
+        for path, (evaluated, hits, conditions) in counts["variants"].items():
+            counter = self.variant(path)
+            counter.evaluated += evaluated
+            counter.hits += hits
+            counter.conditions += conditions
+
+    def format_summary(self, limit: int = DEFAULT_SUMMARY_LIMIT) -> str:
+        """Formats the counters as a table of the variants evaluating the most conditions, followed by the dead
+        variants
+
+        Parameters
+        ----------
+        limit : int
+            Maximum number of the variants in the table
+
+        Returns
+        -------
+        str
+            The formatted counters
+        """
+
+        summary = self.summary()
+        variants = sorted(summary["variants"].items(), key=lambda item: item[1]["conditions"], reverse=True)
+
+        lines = [f"Reports: {summary['reports']}, conditions evaluated per report: "
+                 f"{summary['conditions_per_report']:.1f}",
+                 f"{'variant':<48}{'evaluated':>12}{'hits':>12}{'hit rate':>12}{'conditions':>12}"]
+
+        for path, counter in variants[:limit]:
+            lines.append(f"{path:<48}{counter['evaluated']:>12d}{counter['hits']:>12d}{counter['hit_rate']:>12.2%}"
+                         f"{counter['conditions']:>12d}")
+
+        dead = self.dead_variants()
+        lines.append(f"Variants never used ({len(dead)} of {len(summary['variants'])}):")
+        lines.extend(f"  {path}" for path in dead)
+
+        return "\n".join(lines)
+
+    def write_json(self, path: str, metadata: Optional[dict] = None):
+        """Writes the counters of all variants and the dead variants into the JSON file
+
+        Parameters
+        ----------
+        path : str
+            Path to the JSON file
+        metadata : Optional[dict]
+            Description of the run stored along the counters
+        """
+
+        with open(path, "w") as file:
+            json.dump({"metadata": metadata or {}, **self.summary(), "dead_variants": self.dead_variants()}, file,
+                      indent=2)
@@ -0,0 +1,162 @@
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+# Maximum number of phrases kept by a single phrase builder
+DEFAULT_CACHE_SIZE = 1024
+
+
+class PhraseBuilder:
+    """
+    A class representing a builder of list phrases, such as "left M1 MCA, right ACA, and BA", from a group of flags.
+
+    The flags which are set are encoded as a bitmask over the names of the flags, so the phrase of every combination
+    of a group is built only once. The phrases are kept in an LRU cache per builder, one builder is meant to be created
+    for each 'variables' sub dictionary of the language.
+
+    Methods
+    -------
+    build(data)
+        Builds the phrase from the flags of the data which are set
+    statistics()
+        Gets the hit and miss counters of the cache
+    clear()
+        Removes all the built phrases from the cache and resets the counters
+    """
+
+    def __init__(self, dictionary: Optional[dict], cache_size: int = DEFAULT_CACHE_SIZE):
+        """
+
+        Parameters
+        ----------
+        dictionary : Optional[dict]
+            A dictionary from which the text versions of the flags are taken from
+        cache_size : int
+            Maximum number of phrases kept in the cache
+        """
+
+        self.dictionary = dictionary
+        self.__build_cached = lru_cache(maxsize=cache_size)(self.__build_phrase)
+
+    def build(self, data: Mapping[str, Any]) -> str:
+        """Builds the phrase from the flags of the data which are set
+
+        Parameters
+        ----------
+        data : Mapping[str, Any]
+            A mapping with the flags, in the order in which they are listed in the phrase
+
+        Returns
+        -------
+        str
+            The phrase listing the text versions of the flags which are set
+        """
+
+        mask = 0
+        bit = 1
+        for value in data.values():
+            if value:
+                mask |= bit
+            bit <<= 1
+
+        if not mask:
+            return ""
+
+        return self.__build_cached(tuple(data), mask)
+
+    def __build_phrase(self, keys: Tuple[str, ...], mask: int) -> str:
+        """Builds the phrase from the keys selected by the bitmask
+
+        Parameters
+        ----------
+        keys : Tuple[str, ...]
+            Names of all the flags of the group
+        mask : int
+            Bitmask with a bit set for each of the keys which is listed in the phrase
+
+        Returns
+        -------
+        str
+            The built phrase
+        """
+
+        return build_phrase(self.dictionary, (key for index, key in enumerate(keys) if mask >> index & 1))
+
+    @property
+    def hit_rate(self) -> float:
+        """Ratio of the phrases taken from the cache to all the built phrases"""
+        info = self.__build_cached.cache_info()
+        total = info.hits + info.misses
+        return info.hits / total if total else 0.0
+
+    def statistics(self) -> Dict[str, float]:
+        """Gets the hit and miss counters of the cache
+
+        Returns
+        -------
+        Dict[str, float]
+            The number of hits, misses and phrases in the cache and the hit rate
+        """
+
+        info = self.__build_cached.cache_info()
+        return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "hit_rate": self.hit_rate}
+
+    def clear(self):
+        """Removes all the built phrases from the cache and resets the counters"""
+
+        self.__build_cached.cache_clear()
+
+
+def build_phrase(dictionary: Optional[dict], keys: Iterable[str]) -> str:
+    """Builds the phrase listing the text versions of the keys, the last one is joined with 'and'
+
+    Parameters
+    ----------
+    dictionary : Optional[dict]
+        A dictionary from which the text versions are taken from
+    keys : Iterable[str]
+        The keys to be listed in the phrase
+
+    Returns
+    -------
+    str
+        The resulting phrase
+    """
+
+    result = ""
+    if dictionary is None:
+        return result
+
+    for key in keys:
+        variable = ""
+
+        try:
+            variable = dictionary[key]
+        except KeyError:
+            logging.error("Invalid key %s", key)
+
+        if variable != "":
+            result += variable if result == "" else f", {variable}"
+
+    return replace_last(result, ",", ", and")
+
+
+def replace_last(string: str, old: str, new: str) -> str:
+    """Replaces the last substring with new substring of given string
+
+    Parameters
+    ----------
+    string : str
+        The string in which we are replacing substrings
+    old : str
+        The last occurrence of the string to be replaced
+    new : str
+        The replacement string
+
+    Returns
+    -------
+    str
+        The replaced string
+    """
+
+    return new.join(string.rsplit(old, 1))
@@ -0,0 +1,106 @@
+from string import Template
+from typing import Iterable, List, Tuple
+
+
+class TemplateWithPeriods(Template):
+    """
+    Class representing a Template with custom pattern.
+    The pattern accepts periods in the values which should be replaced.
+
+    """
+    idpattern = r'(?-i:[._a-zA-Z][._a-zA-Z0-9]*)'
+
+
+class PlaceholderTemplate:
+    """
+    A class representing a text pre-parsed into literal and placeholder segments.
+
+    The text is parsed with the pattern of TemplateWithPeriods only once, the substitution then only looks up the
+    values of the placeholders. The result is the same as of TemplateWithPeriods.safe_substitute.
+
+    Methods
+    -------
+    safe_substitute(mapping)
+        Substitutes the placeholders with the values of the mapping, leaving the unknown placeholders untouched
+    """
+
+    def __init__(self, text: str):
+        """
+
+        Parameters
+        ----------
+        text : str
+            The text with the placeholders
+        """
+
+        self.text = text
+        # Pairs of the literal text preceding a placeholder and the placeholder, which is a pair of the name and the
+        # original text of the placeholder. The literal text following the last placeholder is kept separately
+        self.segments: List[Tuple[str, Tuple[str, str]]] = []
+        self.tail = ""
+        self.__parse()
+
+    def __parse(self):
+        """Parses the text into the literal and placeholder segments"""
+
+        literal = ""
+        position = 0
+
+        for match in TemplateWithPeriods.pattern.finditer(self.text):
+            literal += self.text[position:match.start()]
+            position = match.end()
+
+            named = match.group("named") or match.group("braced")
+            if named is not None:
+                self.segments.append((literal, (named, match.group())))
+                literal = ""
+            elif match.group("escaped") is not None:
+                literal += TemplateWithPeriods.delimiter
+            else:
+                literal += match.group()
+
+        self.tail = literal + self.text[position:]
+
+    def safe_substitute(self, mapping: dict) -> str:
+        """Substitutes the placeholders with the values of the mapping, leaving the unknown placeholders untouched
+
+        Parameters
+        ----------
+        mapping : dict
+            Values of the placeholders mapped by their names
+
+        Returns
+        -------
+        str
+            The text with the substituted values
+        """
+
+        if not self.segments:
+            return self.tail
+
+        parts = []
+        for literal, (name, original) in self.segments:
+            parts.append(literal)
+            parts.append(str(mapping[name]) if name in mapping else original)
+        parts.append(self.tail)
+
+        return "".join(parts)
+
+
+def substitute_templates(templates: Iterable[PlaceholderTemplate], mapping: dict) -> str:
+    """Substitutes the placeholders of the parsed texts with the values of the mapping and joins the texts
+
+    Parameters
+    ----------
+    templates : Iterable[PlaceholderTemplate]
+        The parsed texts, in order
+    mapping : dict
+        Values of the placeholders mapped by their names
+
+    Returns
+    -------
+    str
+        The joined texts with the substituted values
+    """
+
+    return "".join(template.safe_substitute(mapping) for template in templates)
@@ -0,0 +1,364 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+from utils.definitions import DEFAULT_REPORT_CACHE_PATH
+
+# Maximum size of the stored reports in bytes, the least recently used reports are evicted above it
+DEFAULT_MAX_CACHE_SIZE = 512 * 2 ** 20
+
+# Number of the stored or used reports written to the file at once, in a single transaction
+DEFAULT_FLUSH_SIZE = 256
+
+# Share of the maximum size the cache is evicted down to, so the eviction does not run after every flush
+EVICTION_TARGET = 0.9
+
+# Directories of the package whose code shapes the reports
+CODE_DIRECTORIES = ("app", "data", "utils")
+
+PACKAGE_PATH = Path(__file__).resolve().parent.parent
+
+
+@lru_cache(maxsize=None)
+def get_code_version() -> str:
+    """Gets the hash of the source code of the package, so the reports generated by another version are not used
+
+    Returns
+    -------
+    str
+        The hexadecimal hash of the source files
+    """
+
+    digest = hashlib.sha256()
+    for directory in CODE_DIRECTORIES:
+        for source in sorted((PACKAGE_PATH / directory).glob("*.py")):
+            digest.update(source.name.encode())
+            digest.update(source.read_bytes())
+
+    return digest.hexdigest()
+
+
+def get_context_key(language_path: Path, template_path: Path) -> str:
+    """Gets the hash of everything the reports depend on except the data of the subject
+
+    Parameters
+    ----------
+    language_path : Path
+        Path to the json file of the language
+    template_path : Path
+        Path to file with the template
+
+    Returns
+    -------
+    str
+        The hexadecimal hash of the language file, the template file and the source code
+    """
+
+    digest = hashlib.sha256()
+    digest.update(Path(language_path).read_bytes())
+    digest.update(b"\0")
+    digest.update(Path(template_path).read_bytes())
+    digest.update(b"\0")
+    digest.update(get_code_version().encode())
+
+    return digest.hexdigest()
+
+
+def get_row_key(row: dict, context_key: str) -> str:
+    """Gets the key of the report of the subject. The values are serialized with their types, so 1, 1.0 and True,
+    or a date and its string, give different keys
+
+    Parameters
+    ----------
+    row : dict
+        The data of the subject
+    context_key : str
+        The hash of the language, the template and the source code
+
+    Returns
+    -------
+    str
+        The hexadecimal hash of the row and the context
+    """
+
+    data = json.dumps(row, sort_keys=True, default=repr, separators=(",", ":"))
+
+    return hashlib.sha256(f"{context_key}\0{data}".encode()).hexdigest()
+
+
+class ReportCache:
+    """
+    A class representing the reports stored in SQLite file, keyed by the hash of the data of the subject, the
+    language, the template and the source code, so a report is generated again only when any of them changes.
+
+    The used and stored reports are written in batches, each in a single transaction, so a hit costs a single read.
+    The size of the stored reports is bounded by evicting the least recently used reports. The file may be shared
+    by several processes, each with its own cache. The cache is best-effort, when the file cannot be read or written,
+    such as when it is corrupt, read-only or locked, the cache is disabled and the reports are generated.
+
+    Methods
+    -------
+    get(key)
+        Gets the stored report
+    put(key, report)
+        Stores the report
+    flush()
+        Writes the used and stored reports to the file and evicts the least recently used reports above the size
+    evict()
+        Evicts the least recently used reports above the size
+    statistics()
+        Gets the hit and miss counters of the cache
+    drain()
+        Gets the counters collected so far and starts over
+    merge(counters)
+        Adds the counters collected by another process
+    disable(error)
+        Stops using the file after the error, the reports are then generated
+    close()
+        Writes the pending reports and closes the file
+    """
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_REPORT_CACHE_PATH, max_size: int = DEFAULT_MAX_CACHE_SIZE,
+                 flush_size: int = DEFAULT_FLUSH_SIZE):
+        """
+
+        Parameters
+        ----------
+        path : Union[str, Path]
+            Path to SQLite file of the cache, created when it does not exist
+        max_size : int
+            Maximum size of the stored reports in bytes
+        flush_size : int
+            Number of the used or stored reports written to the file at once
+        """
+
+        self.path = str(path)
+        self.max_size = max_size
+        self.flush_size = flush_size
+        self.connection: Optional[sqlite3.Connection] = None
+        self.size = 0
+        self.pending: Dict[str, str] = {}
+        self.used: List[str] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.last_used = 0
+        self.disabled = False
+
+    def __connect(self) -> sqlite3.Connection:
+        """Opens the file of the cache on the first use, so the cache can be created before the worker processes
+        are forked
+
+        Returns
+        -------
+        sqlite3.Connection
+            The connection to the file
+        """
+
+        if self.connection is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, timeout=30)
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            with self.connection:
+                self.connection.execute("CREATE TABLE IF NOT EXISTS reports "
+                                        "(key TEXT PRIMARY KEY, report TEXT NOT NULL, size INTEGER NOT NULL, "
+                                        "last_used INTEGER NOT NULL)")
+                self.connection.execute("CREATE INDEX IF NOT EXISTS reports_last_used ON reports (last_used)")
+            self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM reports").fetchone()[0]
+
+        return self.connection
+
+    def get(self, key: str) -> Optional[str]:
+        """Gets the stored report
+
+        Parameters
+        ----------
+        key : str
+            The key of the report, see get_row_key
+
+        Returns
+        -------
+        Optional[str]
+            The stored report, None if there is no such report or the cache is disabled
+
+        Raises
+        ------
+        sqlite3.Error
+            If the file cannot be read
+        """
+
+        if self.disabled:
+            self.misses += 1
+            return None
+
+        report = self.pending.get(key)
+        if report is None:
+            row = self.__connect().execute("SELECT report FROM reports WHERE key = ?", (key,)).fetchone()
+            report = row[0] if row is not None else None
+
+        if report is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.used.append(key)
+        if len(self.used) >= self.flush_size:
+            self.flush()
+
+        return report
+
+    def put(self, key: str, report: str):
+        """Stores the report, the report is written to the file with the next flush
+
+        Parameters
+        ----------
+        key : str
+            The key of the report, see get_row_key
+        report : str
+            The generated report
+        """
+
+        if self.disabled:
+            return
+
+        self.pending[key] = report
+        if len(self.pending) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the used and stored reports to the file and evicts the least recently used reports above the
+        size. The cache is disabled when the file cannot be written"""
+
+        if self.disabled or (not self.pending and not self.used):
+            return
+
+        try:
+            connection = self.__connect()
+            # The times only order the uses, so they are kept increasing even if the clock is coarse
+            now = self.last_used = max(time.time_ns(), self.last_used + 1)
+
+            with connection:
+                connection.executemany("INSERT OR REPLACE INTO reports (key, report, size, last_used) "
+                                       "VALUES (?, ?, ?, ?)",
+                                       [(key, report, len(report.encode()), now)
+                                        for key, report in self.pending.items()])
+                connection.executemany("UPDATE reports SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in self.used])
+
+            self.size += sum(len(report.encode()) for report in self.pending.values())
+            self.pending.clear()
+            self.used.clear()
+
+            if self.size > self.max_size:
+                self.evict()
+        except (sqlite3.Error, OSError) as error:
+            self.disable(error)
+
+    def evict(self):
+        """Evicts the least recently used reports until the stored reports take less than EVICTION_TARGET of the
+        maximum size"""
+
+        connection = self.__connect()
+
+        with connection:
+            size = connection.execute("SELECT COALESCE(SUM(size), 0) FROM reports").fetchone()[0]
+            target = self.max_size * EVICTION_TARGET
+            evicted = []
+
+            if size > self.max_size:
+                for key, report_size in connection.execute("SELECT key, size FROM reports ORDER BY last_used"):
+                    if size <= target:
+                        break
+                    evicted.append((key,))
+                    size -= report_size
+
+            connection.executemany("DELETE FROM reports WHERE key = ?", evicted)
+
+        self.size = size
+        self.evictions += len(evicted)
+
+    def statistics(self) -> Dict[str, float]:
+        """Gets the hit and miss counters of the cache
+
+        Returns
+        -------
+        Dict[str, float]
+            The hits, misses, hit rate and number of the evicted reports
+        """
+
+        requests = self.hits + self.misses
+
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions}
+
+    def drain(self) -> Tuple[int, int, int]:
+        """Gets the counters collected so far and starts over
+
+        Returns
+        -------
+        Tuple[int, int, int]
+            The hits, misses and number of the evicted reports
+        """
+
+        counters = (self.hits, self.misses, self.evictions)
+        self.hits = self.misses = self.evictions = 0
+
+        return counters
+
+    def merge(self, counters: Tuple[int, int, int]):
+        """Adds the counters collected by another process
+
+        Parameters
+        ----------
+        counters : Tuple[int, int, int]
+            The counters returned by drain
+        """
+
+        hits, misses, evictions = counters
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+
+    def disable(self, error: Exception):
+        """Stops using the file after the error, the pending reports are dropped and the reports are then generated
+
+        Parameters
+        ----------
+        error : Exception
+            The error of the file
+        """
+
+        logging.warning(f"Report cache {self.path} disabled, the reports are generated: {error}")
+        self.disabled = True
+        self.pending.clear()
+        self.used.clear()
+        self.__close_connection()
+
+    def close(self):
+        """Writes the pending reports and closes the file"""
+
+        self.flush()
+        self.__close_connection()
+
+    def __close_connection(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except sqlite3.Error as error:
+                logging.warning(f"Report cache {self.path} not closed: {error}")
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,517 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from app.generator import MedicalReportsGenerator
+from app.language import Language
+from data.subject_storage import SubjectStorage
+from utils.definitions import DEFAULT_TEMPLATE_PATH
+from utils.load_language_utils import list_languages, load_language
+from utils.profiling import StageProfiler
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+# Number of the requests generating the reports at once, the other requests wait for a free slot
+DEFAULT_MAX_CONCURRENT = 4
+
+# Seconds a request waits for a free slot before it is refused with 503
+DEFAULT_QUEUE_TIMEOUT = 30.0
+
+# Maximum number of the subjects of a single batch request
+DEFAULT_MAX_BATCH_SIZE = 1000
+
+REPORTS_PATH = "/reports/"
+BATCH_PATH = "/reports:batch"
+LATENCY_PATH = "/metrics/latency"
+HEALTH_PATH = "/health"
+
+# Status, body, content type and additional headers of the response
+Response = Tuple[HTTPStatus, bytes, str, Optional[Dict[str, str]]]
+
+
+class InvalidRequestError(Exception):
+    """Raised when the parameters of the request are not valid, which is answered with 400. The errors of the
+    generation itself are answered with 500"""
+
+
+class ReportService:
+    """
+    A class representing the generation of the reports for the requests of the server.
+
+    The languages are loaded and compiled once and the template is compiled before the first request. The generators
+    keep the data of the report being generated, so each request borrows a generator of its language which is not
+    used by another request. The number of the requests generating at once is limited, so are the generators.
+
+    Methods
+    -------
+    has_language(language)
+        Checks whether the language can be used for the reports
+    get_language(language)
+        Gets the loaded language, loading it on the first use
+    generator(language)
+        Context manager borrowing a generator of the language
+    slot()
+        Context manager waiting for a free slot of the generation
+    warm_up()
+        Loads the default language and compiles the template
+    generate_report(subject_id, language)
+        Generates the medical record of the subject
+    generate_reports(subject_ids, language)
+        Generates the medical records of the subjects
+    record_latency(name, seconds)
+        Adds the duration of the request
+    get_latencies()
+        Gets the statistics and the histogram of the durations of the requests
+    """
+
+    def __init__(self, subject_storage: SubjectStorage,
+                 definition_template_path: Path = DEFAULT_TEMPLATE_PATH, default_language: str = "en_US",
+                 max_concurrent: int = DEFAULT_MAX_CONCURRENT, queue_timeout: float = DEFAULT_QUEUE_TIMEOUT):
+        """
+
+        Parameters
+        ----------
+        subject_storage : SubjectStorage
+            The storage the data of the subjects are loaded from
+        definition_template_path : Path
+            Path to file with the template
+        default_language : str
+            The language of the reports of the requests not specifying any
+        max_concurrent : int
+            Number of the requests generating the reports at once
+        queue_timeout : float
+            Seconds a request waits for a free slot before it is refused
+        """
+
+        self.subject_storage = subject_storage
+        self.definition_template_path = definition_template_path
+        self.default_language = default_language
+        self.queue_timeout = queue_timeout
+        self.semaphore = threading.BoundedSemaphore(max_concurrent)
+        self.languages: Dict[str, Language] = {}
+        self.generators: Dict[str, List[MedicalReportsGenerator]] = {}
+        self.lock = threading.Lock()
+        self.latencies = StageProfiler(enabled=True)
+
+    def has_language(self, language: str) -> bool:
+        """Checks whether the language can be used for the reports
+
+        Parameters
+        ----------
+        language : str
+            The code of the language, such as en_US
+
+        Returns
+        -------
+        bool
+            True if the language is loaded or can be loaded, False otherwise
+        """
+
+        return language in self.languages or language in list_languages()
+
+    def get_language(self, language: str) -> Language:
+        """Gets the loaded language, loading it on the first use
+
+        Parameters
+        ----------
+        language : str
+            The code of the language, such as en_US
+
+        Returns
+        -------
+        Language
+            The loaded language
+
+        Raises
+        ------
+        ValueError
+            If there is no such language
+        """
+
+        loaded = self.languages.get(language)
+        if loaded is not None:
+            return loaded
+
+        if not self.has_language(language):
+            raise ValueError(f"Unknown language {language}, expected one of {', '.join(list_languages())}")
+
+        with self.lock:
+            if language not in self.languages:
+                self.languages[language] = Language(**load_language(language))
+
+            return self.languages[language]
+
+    @contextmanager
+    def generator(self, language: str) -> Iterator[MedicalReportsGenerator]:
+        """Context manager borrowing a generator of the language, the generator is created when all the generators
+        of the language are borrowed
+
+        Parameters
+        ----------
+        language : str
+            The code of the language
+
+        Returns
+        -------
+        Iterator[MedicalReportsGenerator]
+            The borrowed generator
+        """
+
+        with self.lock:
+            idle = self.generators.setdefault(language, [])
+            generator = idle.pop() if idle else None
+
+        if generator is None:
+            generator = MedicalReportsGenerator(self.get_language(language), self.definition_template_path)
+
+        try:
+            yield generator
+        finally:
+            with self.lock:
+                self.generators[language].append(generator)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Context manager waiting for a free slot of the generation
+
+        Raises
+        ------
+        TimeoutError
+            If no slot was freed in time
+        """
+
+        if not self.semaphore.acquire(timeout=self.queue_timeout):
+            raise TimeoutError("Too many reports are being generated, try again later")
+
+        try:
+            yield
+        finally:
+            self.semaphore.release()
+
+    def warm_up(self):
+        """Loads the default language and compiles the template, so the first request does not wait for them"""
+
+        with self.generator(self.default_language) as generator:
+            generator.template_cache.get_template(self.definition_template_path)
+
+    def generate_report(self, subject_id: int, language: Optional[str] = None) -> Optional[str]:
+        """Generates the medical record of the subject
+
+        Parameters
+        ----------
+        subject_id : int
+            The id of the subject
+        language : Optional[str]
+            The code of the language. When omitted, the default language is used
+
+        Returns
+        -------
+        Optional[str]
+            The generated report, None if there are no data of the subject
+
+        Raises
+        ------
+        ValueError
+            If there is no such language
+        TimeoutError
+            If no slot of the generation was freed in time
+        """
+
+        reports = self.generate_reports([subject_id], language)
+
+        return reports[0][1] if reports else None
+
+    def generate_reports(self, subject_ids: Sequence[int], language: Optional[str] = None) -> List[Tuple[int, str]]:
+        """Generates the medical records of the subjects
+
+        Parameters
+        ----------
+        subject_ids : Sequence[int]
+            The ids of the subjects
+        language : Optional[str]
+            The code of the language. When omitted, the default language is used
+
+        Returns
+        -------
+        List[Tuple[int, str]]
+            Pairs of the subject id and the generated report, ordered by the subject id. The subjects without any
+            data are skipped
+
+        Raises
+        ------
+        ValueError
+            If there is no such language
+        TimeoutError
+            If no slot of the generation was freed in time
+        """
+
+        language = language or self.default_language
+        self.get_language(language)
+
+        with self.slot(), self.generator(language) as generator:
+            return [(row["subject_id"], generator.generate_medical_report(row))
+                    for row in self.subject_storage.get_data_many(sorted(set(subject_ids)))]
+
+    def record_latency(self, name: str, seconds: float):
+        """Adds the duration of the request
+
+        Parameters
+        ----------
+        name : str
+            The name of the endpoint
+        seconds : float
+            The duration in seconds
+        """
+
+        self.latencies.record(name, seconds)
+
+    def get_latencies(self) -> dict:
+        """Gets the statistics and the histogram of the durations of the requests
+
+        Returns
+        -------
+        dict
+            The count, total, mean, minimum, maximum, percentiles and pairs of the upper bound of the bucket and the
+            number of the durations, mapped by the names of the endpoints. The durations are in seconds
+        """
+
+        with self.latencies.lock:
+            stages = dict(self.latencies.stages)
+
+        return {name: {**statistics.summary(), "histogram": statistics.histogram()}
+                for name, statistics in stages.items()}
+
+
+class ReportRequestHandler(BaseHTTPRequestHandler):
+    """
+    A class representing the handler of the requests of the report server.
+
+    Methods
+    -------
+    do_GET()
+        Handles the report, latency and health requests
+    do_POST()
+        Handles the batch requests
+    """
+
+    server: "ReportServer"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+
+        if url.path.startswith(REPORTS_PATH):
+            self.__handle("GET /reports/{subject_id}", lambda: self.__get_report(url.path[len(REPORTS_PATH):],
+                                                                                  query))
+        elif url.path == LATENCY_PATH:
+            self.__send_json(HTTPStatus.OK, self.server.service.get_latencies())
+        elif url.path == HEALTH_PATH:
+            self.__send_json(HTTPStatus.OK, {"status": "ok", "languages": sorted(self.server.service.languages)})
+        else:
+            self.__send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+
+        if url.path == BATCH_PATH:
+            self.__handle("POST /reports:batch", lambda: self.__post_batch(parse_qs(url.query)))
+        else:
+            self.__send_json(HTTPStatus.NOT_FOUND, {"error": f"Unknown path {url.path}"})
+
+    def __handle(self, name: str, handler):
+        """Runs the handler of the endpoint, turning the errors into the responses, and sends the response. The
+        duration is recorded before the response is sent, so the client reading the latencies afterwards sees it
+
+        Parameters
+        ----------
+        name : str
+            The name of the endpoint
+        handler : Callable[[], Response]
+            The handler returning the response
+        """
+
+        start = time.perf_counter()
+        try:
+            response = handler()
+        except InvalidRequestError as error:
+            response = self.__get_json_response(HTTPStatus.BAD_REQUEST, {"error": str(error)})
+        except TimeoutError as error:
+            response = self.__get_json_response(HTTPStatus.SERVICE_UNAVAILABLE, {"error": str(error)},
+                                                {"Retry-After": "1"})
+        except Exception as error:
+            logging.exception(f"Generation failed: {error}")
+            response = self.__get_json_response(HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Generation failed"})
+
+        self.server.service.record_latency(name, time.perf_counter() - start)
+        self.__send(*response)
+
+    def __get_report(self, subject_id: str, query: Dict[str, List[str]]) -> Response:
+        """Gets the report of the subject as text
+
+        Parameters
+        ----------
+        subject_id : str
+            The id of the subject from the path
+        query : Dict[str, List[str]]
+            The parameters of the query, the language is given by lang
+
+        Returns
+        -------
+        Response
+            The status, body, content type and headers of the response
+        """
+
+        if not subject_id.isdigit():
+            raise InvalidRequestError(f"Invalid subject id {subject_id}")
+        language = self.__get_language(query)
+
+        report = self.server.service.generate_report(int(subject_id), language)
+        if report is None:
+            return self.__get_json_response(HTTPStatus.NOT_FOUND,
+                                            {"error": f"No data found for subject id {subject_id}"})
+
+        return HTTPStatus.OK, report.encode("utf-8"), "text/plain; charset=utf-8", None
+
+    def __post_batch(self, query: Dict[str, List[str]]) -> Response:
+        """Gets the reports of the subjects of the JSON body, such as {"subject_ids": [1, 2], "lang": "en_US"}, as
+        JSON with the reports and the ids of the subjects without any data
+
+        Parameters
+        ----------
+        query : Dict[str, List[str]]
+            The parameters of the query, the language is given by lang unless the body gives it
+
+        Returns
+        -------
+        Response
+            The status, body, content type and headers of the response
+        """
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError:
+            body = None
+
+        subject_ids = body.get("subject_ids") if isinstance(body, dict) else None
+        if not isinstance(subject_ids, list) or \
+                not all(isinstance(subject_id, int) and not isinstance(subject_id, bool) for subject_id in subject_ids):
+            raise InvalidRequestError('Expected JSON body with the list of the ids, such as {"subject_ids": [1, 2]}')
+
+        if len(subject_ids) > self.server.max_batch_size:
+            raise InvalidRequestError(f"Too many subject ids, at most {self.server.max_batch_size} are allowed")
+        language = self.__get_language(query, body.get("lang"))
+
+        reports = self.server.service.generate_reports(subject_ids, language)
+        found = {subject_id for subject_id, _ in reports}
+
+        return self.__get_json_response(HTTPStatus.OK, {"reports": [{"subject_id": subject_id, "report": report}
+                                                                    for subject_id, report in reports],
+                                                        "missing": sorted(set(subject_ids) - found)})
+
+    def __get_language(self, query: Dict[str, List[str]], body_language: Any = None) -> Optional[str]:
+        """Gets the language of the request, given by the body or else by the lang parameter of the query
+
+        Parameters
+        ----------
+        query : Dict[str, List[str]]
+            The parameters of the query
+        body_language : Any
+            The language given by the body of the request
+
+        Returns
+        -------
+        Optional[str]
+            The code of the language, None if the request does not specify any
+
+        Raises
+        ------
+        InvalidRequestError
+            If the language is not a string or there is no such language
+        """
+
+        language = body_language if body_language is not None else next(iter(query.get("lang", [])), None)
+        if language is None:
+            return None
+
+        if not isinstance(language, str) or not self.server.service.has_language(language):
+            raise InvalidRequestError(f"Unknown language {language}, expected one of {', '.join(list_languages())}")
+
+        return language
+
+    @staticmethod
+    def __get_json_response(status: HTTPStatus, content, headers: Optional[Dict[str, str]] = None) -> Response:
+        return status, json.dumps(content).encode("utf-8"), "application/json", headers
+
+    def __send_json(self, status: HTTPStatus, content, headers: Optional[Dict[str, str]] = None):
+        self.__send(*self.__get_json_response(status, content, headers))
+
+    def __send(self, status: HTTPStatus, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args):
+        logging.info(f"{self.address_string()} {format % args}")
+
+
+class ReportServer(ThreadingHTTPServer):
+    """
+    A class representing the HTTP server of the reports, each request is handled by its own thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, service: ReportService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 max_batch_size: int = DEFAULT_MAX_BATCH_SIZE):
+        """
+
+        Parameters
+        ----------
+        service : ReportService
+            The generation of the reports
+        host : str
+            The address the server listens on
+        port : int
+            The port the server listens on, 0 for any free port
+        max_batch_size : int
+            Maximum number of the subjects of a single batch request
+        """
+
+        super().__init__((host, port), ReportRequestHandler)
+        self.service = service
+        self.max_batch_size = max_batch_size
+
+
+def serve(service: ReportService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """Serves the reports until interrupted
+
+    Parameters
+    ----------
+    service : ReportService
+        The generation of the reports
+    host : str
+        The address the server listens on
+    port : int
+        The port the server listens on
+    """
+
+    service.warm_up()
+
+    with ReportServer(service, host, port) as server:
+        print(f"Serving reports on http://{host}:{server.server_address[1]}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
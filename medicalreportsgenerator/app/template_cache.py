@@ -0,0 +1,77 @@
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
+
+
+class TemplateCache:
+    """
+    A class representing a cache of compiled jinja2 templates.
+
+    Every template directory gets a single Environment and every template file is compiled only once. The modification
+    time of the file is checked on each access, so edits of the template are still picked up.
+
+    Methods
+    -------
+    get_template(template_filepath)
+        Gets the compiled template for the given file, compiling it only when needed
+    clear()
+        Removes all the compiled templates and environments from the cache
+    """
+
+    def __init__(self):
+        self.environments: Dict[Path, Environment] = {}
+        self.templates: Dict[Path, Tuple[int, Template]] = {}
+        self.lock = threading.Lock()
+
+    def get_template(self, template_filepath: Path) -> Template:
+        """Gets the compiled template for the given file, compiling it only when needed
+
+        Parameters
+        ----------
+        template_filepath : Path
+            File path towards the template
+
+        Returns
+        -------
+        Template
+            The compiled jinja2 template
+
+        Raises
+        ------
+        FileNotFoundError
+            If the template file does not exist
+        """
+
+        path = Path(template_filepath).resolve()
+        mtime = os.stat(path).st_mtime_ns
+
+        cached = self.templates.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with self.lock:
+            environment = self.environments.get(path.parent)
+            if environment is None:
+                environment = Environment(loader=FileSystemLoader(path.parent), autoescape=select_autoescape(),
+                                          auto_reload=True)
+                self.environments[path.parent] = environment
+
+            template = environment.get_template(path.name)
+            self.templates[path] = (mtime, template)
+
+        return template
+
+    def clear(self):
+        """Removes all the compiled templates and environments from the cache"""
+
+        with self.lock:
+            self.environments.clear()
+            self.templates.clear()
+
+
+# Cache shared by all generators which are not given their own, so generators using the same template path also use
+# the same compiled template
+SHARED_TEMPLATE_CACHE = TemplateCache()
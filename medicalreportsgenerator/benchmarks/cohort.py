@@ -0,0 +1,211 @@
+"""Synthetic cohorts for the benchmarks, written as csv files with the columns of the given csv file.
+
+Every synthetic subject is created from a row of the source file picked at random, so the combinations of the empty
+and filled values stay the ones the generator is used to. The filled values are then drawn again from the values of
+the source file: the measurements uniformly from the range of the column, the independent flags, such as the risk
+factors and the medications, by the frequency of their values, and the lookup ids together with their names. All the
+dates and timestamps of the subject are moved by the same number of days, so their order is kept.
+
+Run from the medicalreportsgenerator directory with ``python -m benchmarks.cohort -n 100000 cohort.csv``.
+"""
+import argparse
+import csv
+import random
+import re
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+from utils.definitions import DEFAULT_CSV_PATH
+
+# Prefixes of the boolean columns which do not depend on the other columns, drawn by the frequency of their values
+INDEPENDENT_FLAG_PREFIXES = ("risk_", "before_onset_", "discharge_", "old_infarcts_", "post_stroke_",
+                             "thromboembolism_")
+
+# Columns which keep the value of the source row, such as the free texts
+FIXED_COLUMNS = ("subject_id", "label", "first_arrival_hospital")
+
+# Range of the days all the dates of the synthetic subject are moved by
+DATE_SHIFT_DAYS = 365
+
+DATE_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}")
+
+
+class CohortModel:
+    """
+    A class representing the values of the columns of the source csv file the synthetic subjects are drawn from.
+
+    Methods
+    -------
+    create_row(random_generator, subject_id)
+        Creates the values of a single synthetic subject
+    """
+
+    def __init__(self, source_file: Union[str, Path] = DEFAULT_CSV_PATH):
+        """
+
+        Parameters
+        ----------
+        source_file : Union[str, Path]
+            Path to csv file with the rows the synthetic subjects are drawn from
+        """
+
+        with open(source_file, newline="") as source:
+            reader = csv.reader(source)
+            self.header = next(reader)
+            self.rows = list(reader)
+
+        if not self.rows:
+            raise ValueError(f"No rows to draw the synthetic subjects from in {source_file}")
+
+        self.subject_id = self.header.index("subject_id")
+        self.measurements: Dict[int, Tuple[float, float, bool]] = {}
+        self.flags: Dict[int, List[str]] = {}
+        self.lookups: List[Tuple[int, Optional[int], List[Tuple[str, str]]]] = []
+        self.dates: List[int] = []
+
+        for index, column in enumerate(self.header):
+            values = [row[index] for row in self.rows if row[index] != ""]
+            if column in FIXED_COLUMNS or not values:
+                continue
+
+            if all(DATE_PATTERN.match(value) for value in values):
+                self.dates.append(index)
+            elif column.endswith("_id"):
+                self.__add_lookup(index, column)
+            elif set(values) <= {"t", "f"}:
+                if column.startswith(INDEPENDENT_FLAG_PREFIXES):
+                    self.flags[index] = values
+            elif all(self.__is_number(value) for value in values):
+                numbers = [float(value) for value in values]
+                self.measurements[index] = (min(numbers), max(numbers), all(number.is_integer() for number in numbers))
+
+    def __add_lookup(self, index: int, column: str):
+        """Adds the lookup id column, together with the column of its names if present in the file
+
+        Parameters
+        ----------
+        index : int
+            Index of the id column
+        column : str
+            Name of the id column
+        """
+
+        name_column = column[:-len("_id")]
+        name = self.header.index(name_column) if name_column in self.header else None
+        pairs = [(row[index], row[name] if name is not None else "") for row in self.rows if row[index] != ""]
+
+        self.lookups.append((index, name, pairs))
+
+    @staticmethod
+    def __is_number(value: str) -> bool:
+        try:
+            float(value)
+        except ValueError:
+            return False
+
+        return True
+
+    def create_row(self, random_generator: random.Random, subject_id: int) -> List[str]:
+        """Creates the values of a single synthetic subject
+
+        Parameters
+        ----------
+        random_generator : random.Random
+            The source of the random values
+        subject_id : int
+            Id of the synthetic subject
+
+        Returns
+        -------
+        List[str]
+            The values of the columns of the source file
+        """
+
+        row = list(random_generator.choice(self.rows))
+        row[self.subject_id] = str(subject_id)
+
+        for index, (low, high, integer) in self.measurements.items():
+            if row[index] != "":
+                row[index] = str(random_generator.randint(int(low), int(high)) if integer
+                                 else round(random_generator.uniform(low, high), 2))
+
+        for index, values in self.flags.items():
+            if row[index] != "":
+                row[index] = random_generator.choice(values)
+
+        for index, name, pairs in self.lookups:
+            if row[index] != "":
+                row[index], value = random_generator.choice(pairs)
+                if name is not None:
+                    row[name] = value
+
+        shift = timedelta(days=random_generator.randrange(DATE_SHIFT_DAYS))
+        for index in self.dates:
+            value = row[index]
+            if value != "":
+                row[index] = (date.fromisoformat(value[:10]) + shift).isoformat() + value[10:]
+
+        return row
+
+
+def iter_cohort(subjects: int, source_file: Union[str, Path] = DEFAULT_CSV_PATH, seed: int = 0) -> Iterator[List[str]]:
+    """Lazily creates the rows of the synthetic cohort, the same seed gives the same rows
+
+    Parameters
+    ----------
+    subjects : int
+        Number of the synthetic subjects, with the ids from 1 to subjects
+    source_file : Union[str, Path]
+        Path to csv file with the rows the synthetic subjects are drawn from
+    seed : int
+        Seed of the random values
+
+    Returns
+    -------
+    Iterator[List[str]]
+        The header followed by the values of each synthetic subject
+    """
+
+    model = CohortModel(source_file)
+    random_generator = random.Random(seed)
+
+    yield model.header
+    for subject_id in range(1, subjects + 1):
+        yield model.create_row(random_generator, subject_id)
+
+
+def write_cohort(target_file: str, subjects: int, source_file: Union[str, Path] = DEFAULT_CSV_PATH, seed: int = 0):
+    """Writes the synthetic cohort into the csv file, one row at a time
+
+    Parameters
+    ----------
+    target_file : str
+        Path to the written csv file
+    subjects : int
+        Number of the synthetic subjects
+    source_file : Union[str, Path]
+        Path to csv file with the rows the synthetic subjects are drawn from
+    seed : int
+        Seed of the random values
+    """
+
+    with open(target_file, "w", newline="") as target:
+        csv.writer(target).writerows(iter_cohort(subjects, source_file, seed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Writes the synthetic cohort into the csv file")
+    parser.add_argument("output", help="Path to the written csv file")
+    parser.add_argument("-n", "--subjects", help="Number of the synthetic subjects", default=10_000, type=int)
+    parser.add_argument("-c", "--csv", help="Path to csv file with the rows the subjects are drawn from",
+                        default=DEFAULT_CSV_PATH)
+    parser.add_argument("--seed", help="Seed of the random values", default=0, type=int)
+    argument = parser.parse_args()
+
+    write_cohort(argument.output, argument.subjects, argument.csv, argument.seed)
+    print(f"Synthetic cohort of {argument.subjects} subjects written to {argument.output}")
+
+
+if __name__ == '__main__':
+    main()
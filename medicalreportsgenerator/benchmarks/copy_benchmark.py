@@ -0,0 +1,57 @@
+"""Benchmark of the extraction of all the rows from the database, comparing the fetching through the RealDictCursor,
+at once and through the server-side cursor, with the bulk extraction by COPY ... TO STDOUT parsed by the typed csv
+loader.
+
+The database is configured by the EMS_DB_* environment variables, the same way as for the generation. To measure on
+a large cohort, fill the fact table with the synthetic rows first, for example by repeating the rows of the backup
+with new subject ids. Every extraction runs twice, once for the time and once for the peak memory traced by
+tracemalloc, which slows the extractions down.
+
+Run from the medicalreportsgenerator directory with ``python -m benchmarks.copy_benchmark``.
+"""
+import argparse
+import time
+import tracemalloc
+
+from data.subject_storage import SubjectStorage, SourceOptions, DEFAULT_STREAM_BATCH_SIZE
+from utils.load_csv_utils import DEFAULT_CSV_CHUNK_SIZE
+
+
+def measure(name: str, extract) -> int:
+    """Runs the extraction and prints its time, rate and peak traced memory"""
+
+    start = time.perf_counter()
+    count = sum(1 for _ in extract())
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    sum(1 for _ in extract())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<24} {elapsed:8.2f} s {count / elapsed:12.0f} rows/s {peak / 2 ** 20:10.1f} MiB  ({count} rows)")
+
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the cursor extraction with the COPY extraction")
+    parser.add_argument("-b", "--batch", help="Number of rows fetched, or parsed, at once",
+                        default=DEFAULT_CSV_CHUNK_SIZE, type=int)
+    argument = parser.parse_args()
+
+    storage = SubjectStorage()
+    streamed = SubjectStorage(SourceOptions(stream_batch_size=max(argument.batch, DEFAULT_STREAM_BATCH_SIZE)))
+    copied = SubjectStorage(SourceOptions(bulk_copy=True, stream_batch_size=argument.batch))
+
+    rows = measure("cursor", storage.get_data)
+    assert measure("server-side cursor", streamed.get_data) == rows, "The streamed extraction gives other rows"
+    assert measure("copy", copied.get_data) == rows, "The copy extraction gives other rows"
+
+    first = next(iter(storage.get_data()))
+    copied_first = next(iter(copied.get_data()))
+    assert first["subject_id"] == copied_first["subject_id"], "The copy extraction gives other order"
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark of the loading of csv files, comparing the previous pandas pipeline, which converted the values with
+full-frame replace and astype passes after parsing, with the typed loader converting the values while parsing.
+
+A synthetic csv file is created by repeating the rows of the given csv file with new subject ids. Every loader runs
+on the file twice, once for the time and once for the peak memory traced by tracemalloc, which slows the loaders
+down. All the rows of the file are held in memory, so the default million rows need several gigabytes.
+
+Run from the medicalreportsgenerator directory with ``python -m benchmarks.csv_loader_benchmark``.
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd  # type: ignore[import]
+
+from data.subject_storage import CSV_COLUMN_DTYPES, REQUIRED_COLUMNS
+from utils.definitions import DEFAULT_CSV_PATH
+from utils.load_csv_utils import CSV_DTYPES, load_data_from_csv_file
+
+
+def load_legacy(csv_file: str) -> list:
+    """Loads the csv file the way the loader did before the values were converted while parsing"""
+
+    df = pd.read_csv(csv_file)
+    df = df.replace({"f": False})
+    df = df.replace({"t": True})
+    df = df.astype(CSV_DTYPES)
+    df = df.replace({np.nan: None})
+
+    return df.to_dict("records")
+
+
+def create_synthetic_csv(source_file: str, target_file: str, rows: int):
+    """Writes the csv file with given number of rows created by repeating the rows of the source file"""
+
+    with open(source_file, newline="") as source:
+        reader = csv.reader(source)
+        header = next(reader)
+        source_rows = list(reader)
+
+    subject_id = header.index("subject_id")
+
+    with open(target_file, "w", newline="") as target:
+        writer = csv.writer(target)
+        writer.writerow(header)
+
+        for index in range(rows):
+            row = list(source_rows[index % len(source_rows)])
+            row[subject_id] = str(index + 1)
+            writer.writerow(row)
+
+
+def measure(name: str, load):
+    """Runs the loader and prints its time and peak traced memory"""
+
+    start = time.perf_counter()
+    rows = load()
+    elapsed = time.perf_counter() - start
+    del rows
+
+    tracemalloc.start()
+    rows = load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{name:<24} {elapsed:8.2f} s {peak / 2 ** 20:10.1f} MiB  ({len(rows)} rows)")
+
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the previous csv loader with the typed loader")
+    parser.add_argument("-n", "--rows", help="Number of rows of the synthetic csv file", default=1_000_000, type=int)
+    parser.add_argument("-c", "--csv", help="Path to csv file with the rows to be repeated", default=DEFAULT_CSV_PATH)
+    argument = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_file = os.path.join(directory, "synthetic.csv")
+        create_synthetic_csv(argument.csv, csv_file, argument.rows)
+        print(f"Synthetic csv file: {argument.rows} rows, {os.path.getsize(csv_file) / 2 ** 20:.1f} MiB")
+
+        legacy = measure("previous loader", lambda: load_legacy(csv_file))
+        typed = measure("typed loader", lambda: load_data_from_csv_file(None, csv_file))
+        assert typed == legacy, "The typed loader gives a different result"
+        assert all(type(value) is type(row[key]) for row, legacy_row in zip(typed, legacy)
+                   for key, value in legacy_row.items()), "The typed loader gives different types"
+        del legacy, typed
+
+        measure("typed projected loader",
+                lambda: load_data_from_csv_file(None, csv_file, REQUIRED_COLUMNS, CSV_COLUMN_DTYPES))
+
+
+if __name__ == '__main__':
+    main()
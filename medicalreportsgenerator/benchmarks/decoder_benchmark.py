@@ -0,0 +1,51 @@
+"""Benchmark of the decoding of rows into the data objects, comparing DataclassFromDict.from_dict of every dataclass
+with the single pass RowDecoder.
+
+Run from the medicalreportsgenerator directory with ``python -m benchmarks.decoder_benchmark``.
+"""
+import argparse
+import timeit
+
+from data.row_decoder import DATA_CLASSES, RowDecoder
+from utils.definitions import DEFAULT_CSV_PATH
+from utils.load_csv_utils import load_data_from_csv_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares DataclassFromDict.from_dict with the RowDecoder")
+    parser.add_argument("-n", "--number", help="Number of decodings of all rows per measurement",
+                        default=500, type=int)
+    parser.add_argument("-r", "--repeat", help="Number of measurements, the best one is reported",
+                        default=5, type=int)
+    parser.add_argument("-c", "--csv", help="Path to csv file with the rows", default=DEFAULT_CSV_PATH)
+    argument = parser.parse_args()
+
+    rows = load_data_from_csv_file(None, argument.csv)
+    decoder = RowDecoder()
+
+    for row in rows:
+        decoded = decoder.decode(row)
+        for data_class in DATA_CLASSES:
+            assert decoded[data_class] == data_class.from_dict(row), "RowDecoder gives a different result"
+
+    def run_from_dict():
+        for row in rows:
+            for data_class in DATA_CLASSES:
+                data_class.from_dict(row)
+
+    def run_decoder():
+        for row in rows:
+            decoder.decode(row)
+
+    from_dict_time = min(timeit.repeat(run_from_dict, number=argument.number, repeat=argument.repeat))
+    decoder_time = min(timeit.repeat(run_decoder, number=argument.number, repeat=argument.repeat))
+    decodings = argument.number * len(rows)
+
+    print(f"Rows decoded per measurement: {decodings}")
+    print(f"from_dict:  {from_dict_time / decodings * 1e6:.2f} us per row")
+    print(f"RowDecoder: {decoder_time / decodings * 1e6:.2f} us per row")
+    print(f"Speed-up:   {from_dict_time / decoder_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Benchmark of the condition evaluation, comparing the interpreted language tree with the compiled closures.
+
+Run from the medicalreportsgenerator directory with ``python -m benchmarks.language_benchmark``.
+"""
+import argparse
+import timeit
+from typing import List
+
+from app.generator import MedicalReportsGenerator
+from app.language import Language
+from utils.definitions import DEFAULT_CSV_PATH, DEFAULT_LOCALE, DEFAULT_TEMPLATE_PATH
+from utils.load_csv_utils import load_data_from_csv_file
+from utils.load_language_utils import load_json_file
+
+BLOCKS = ["diagnosis", "patient", "onset", "admission", "treatment", "follow_up_imaging", "post_acute_care",
+          "post_stroke_complications", "etiology", "discharge"]
+
+
+def prepare_variables(language: Language, csv_file: str) -> List[dict]:
+    """Prepares the variables used for the condition evaluation for every row of the csv file
+
+    Parameters
+    ----------
+    language : Language
+        Loaded language
+    csv_file : str
+        Path to csv file
+
+    Returns
+    -------
+    List[dict]
+        Variables of the medical report for every row
+    """
+
+    generator = MedicalReportsGenerator(language, DEFAULT_TEMPLATE_PATH)
+    variables = []
+
+    for row in load_data_from_csv_file(None, csv_file):
+        generator.data = row
+        variables.append(generator._MedicalReportsGenerator__create_medical_report().to_dict())  # type: ignore
+
+    return variables
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the interpreted and compiled condition evaluation")
+    parser.add_argument("-n", "--number", help="Number of evaluations of all rows per measurement",
+                        default=2000, type=int)
+    parser.add_argument("-r", "--repeat", help="Number of measurements, the best one is reported",
+                        default=5, type=int)
+    parser.add_argument("-c", "--csv", help="Path to csv file with the rows", default=DEFAULT_CSV_PATH)
+    argument = parser.parse_args()
+
+    language = Language(**load_json_file(DEFAULT_LOCALE))
+    compiled_language = language.compile()
+    variables = prepare_variables(language, argument.csv)
+
+    # Same as in the generator, only the blocks generated for the report are evaluated
+    interpreted_rows = [(data, [getattr(language, block).get_block_result for block in BLOCKS if data[block]])
+                        for data in variables]
+    compiled_rows = [(data, [getattr(compiled_language, block) for block in BLOCKS if data[block]])
+                     for data in variables]
+
+    for (data, interpreted_blocks), (_, compiled_blocks) in zip(interpreted_rows, compiled_rows):
+        for interpreted, compiled in zip(interpreted_blocks, compiled_blocks):
+            assert interpreted(data) == "".join(template.text for template in compiled(data)), \
+                "Compiled language gives a different result"
+
+    def run_interpreted():
+        for row, blocks in interpreted_rows:
+            for block in blocks:
+                block(row)
+
+    def run_compiled():
+        for row, blocks in compiled_rows:
+            for block in blocks:
+                block(row)
+
+    interpreted_time = min(timeit.repeat(run_interpreted, number=argument.number, repeat=argument.repeat))
+    compiled_time = min(timeit.repeat(run_compiled, number=argument.number, repeat=argument.repeat))
+    evaluations = argument.number * len(variables)
+
+    print(f"Reports evaluated per measurement: {evaluations}")
+    print(f"Interpreted: {interpreted_time / evaluations * 1e6:.2f} us per report")
+    print(f"Compiled:    {compiled_time / evaluations * 1e6:.2f} us per report")
+    print(f"Speed-up:    {interpreted_time / compiled_time:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,449 @@
+"""Benchmark suite of the generation on a synthetic cohort, recording a JSON baseline and comparing the runs with it.
+
+The synthetic cohort of the given number of subjects is written by benchmarks.cohort into a temporary csv file. Each
+run of a benchmark then happens in its own fresh process, so its peak resident memory is not inflated by the previous
+ones. The process first runs the benchmark unmeasured as a warm-up:
+
+- language_loading loads, parses and compiles the language and creates the generator, several times
+- csv_loading loads all the subjects of the cohort the way the generation does, several times
+- report_generation generates the report of each loaded subject, measuring each report alone
+- generate runs the whole generation of the cohort, from streaming the csv to the rendered reports
+
+Each benchmark runs several times. The medians of the throughput, the latency percentiles and the peak resident memory
+are printed, and written into the JSON baseline with --output, along with their spread, the range of the runs relative
+to the median. With --compare, the run is compared with the stored baseline, the metrics worse by more than both the
+tolerance and the spread of either run are flagged and the exit status is 1. The baseline is only comparable on the
+same machine and with the same number of subjects.
+
+Run from the medicalreportsgenerator directory with
+``python -m benchmarks.suite -n 10000 --output baseline.json`` and later
+``python -m benchmarks.suite -n 10000 --compare baseline.json``.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from app.app_operations import create_generator, iter_reports
+from benchmarks.cohort import write_cohort
+from data.subject_storage import SubjectStorage, SourceOptions, DEFAULT_STREAM_BATCH_SIZE
+from utils.definitions import DEFAULT_CSV_PATH
+from utils.profiling import StageStatistics
+
+try:
+    import resource
+except ImportError:
+    resource = None  # type: ignore[assignment]
+
+# Direction of each compared metric, True when the higher value is better
+METRICS = {"throughput": True,
+           "p50": False,
+           "p95": False,
+           "p99": False,
+           "peak_rss_mib": False}
+
+# Relative change of a metric for the worse above which it is flagged as a regression
+DEFAULT_TOLERANCE = 0.1
+
+# Number of the languages loaded by the language_loading benchmark
+DEFAULT_LANGUAGE_REPEAT = 20
+
+# Number of the loadings of the csv file by the csv_loading benchmark
+DEFAULT_CSV_REPEAT = 5
+
+# Number of the measured runs of each benchmark, each in its own process
+DEFAULT_RUNS = 5
+
+# Number of the unmeasured runs of the benchmark in its process before the measured one
+DEFAULT_WARMUP = 1
+
+
+def get_peak_rss() -> Optional[float]:
+    """Gets the peak resident memory of this process
+
+    Returns
+    -------
+    Optional[float]
+        The peak resident memory in MiB, None if it cannot be measured on this platform
+    """
+
+    if resource is None:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports the peak in KiB, macOS in bytes
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def get_result(statistics: StageStatistics, seconds: float, items: int) -> dict:
+    """Gets the result of the benchmark from the latencies of its items
+
+    Parameters
+    ----------
+    statistics : StageStatistics
+        The latencies of the items
+    seconds : float
+        The duration of the whole benchmark
+    items : int
+        Number of the items processed by the benchmark, such as the reports
+
+    Returns
+    -------
+    dict
+        The duration, throughput, latencies in seconds and peak resident memory
+    """
+
+    summary = statistics.summary()
+
+    return {"items": items,
+            "seconds": seconds,
+            "throughput": items / seconds if seconds else 0.0,
+            "mean": summary["mean"],
+            "p50": summary["p50"],
+            "p95": summary["p95"],
+            "p99": summary["p99"],
+            "peak_rss_mib": get_peak_rss()}
+
+
+def run_language_loading(language: str, repeat: int) -> dict:
+    """Loads, parses and compiles the language and creates the generator repeatedly"""
+
+    statistics = StageStatistics()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        create_generator(language)
+        statistics.record(time.perf_counter() - started)
+
+    return get_result(statistics, time.perf_counter() - start, repeat)
+
+
+def run_csv_loading(csv_file: str, repeat: int) -> dict:
+    """Loads all the subjects of the csv file repeatedly, the latencies are of the whole loadings"""
+
+    statistics = StageStatistics()
+    items = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        items += len(SubjectStorage(SourceOptions(True, csv_file)).get_data())
+        statistics.record(time.perf_counter() - started)
+
+    return get_result(statistics, time.perf_counter() - start, items)
+
+
+def run_report_generation(language: str, csv_file: str) -> dict:
+    """Generates the report of each subject of the csv file loaded in advance"""
+
+    rows = SubjectStorage(SourceOptions(True, csv_file)).get_data()
+    generator = create_generator(language)
+    if generator is None:
+        raise ValueError(f"Could not create the generator of the language {language}")
+
+    statistics = StageStatistics()
+    start = time.perf_counter()
+    for row in rows:
+        started = time.perf_counter()
+        generator.generate_medical_report(row)
+        statistics.record(time.perf_counter() - started)
+
+    return get_result(statistics, time.perf_counter() - start, len(rows))
+
+
+def run_generate(language: str, csv_file: str) -> dict:
+    """Generates the reports of all the subjects, streaming the csv file the way the command line does"""
+
+    statistics = StageStatistics()
+    count = 0
+    start = time.perf_counter()
+    started = start
+    for _ in iter_reports(language, None, SourceOptions(True, csv_file, stream_batch_size=DEFAULT_STREAM_BATCH_SIZE)):
+        now = time.perf_counter()
+        statistics.record(now - started)
+        started = now
+        count += 1
+
+    return get_result(statistics, time.perf_counter() - start, count)
+
+
+def run_warmed_up(benchmark: Callable[..., dict], warmup: int, *args) -> dict:
+    """Runs the benchmark unmeasured the given number of times, so the imports and caches are warm, then measured"""
+
+    for _ in range(warmup):
+        benchmark(*args)
+
+    return benchmark(*args)
+
+
+def run_in_process(benchmark: Callable[..., dict], warmup: int, *args) -> dict:
+    """Runs the benchmark in a fresh process, so its peak resident memory is its own
+
+    Parameters
+    ----------
+    benchmark : Callable[..., dict]
+        The benchmark function
+    warmup : int
+        Number of the unmeasured runs of the benchmark before the measured one
+    args
+        Arguments of the benchmark function
+
+    Returns
+    -------
+    dict
+        The result of the benchmark
+    """
+
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+        return executor.submit(run_warmed_up, benchmark, warmup, *args).result()
+
+
+def aggregate_results(results: List[dict]) -> dict:
+    """Aggregates the results of the runs of the benchmark into their medians and spreads
+
+    Parameters
+    ----------
+    results : List[dict]
+        The results of the runs of the same benchmark
+
+    Returns
+    -------
+    dict
+        The median of each value of the results, the number of the runs and the spread of each compared metric, the
+        range of the runs relative to the median
+    """
+
+    aggregated: Dict[str, Any] = {"runs": len(results)}
+    for key, value in results[0].items():
+        values = [result[key] for result in results if result[key] is not None]
+        aggregated[key] = statistics.median(values) if values else None
+        if isinstance(value, int):
+            aggregated[key] = round(aggregated[key])
+
+    spread: Dict[str, float] = {}
+    for metric in METRICS:
+        values = [result[metric] for result in results if result.get(metric) is not None]
+        median = aggregated.get(metric)
+        if values and median:
+            spread[metric] = (max(values) - min(values)) / median
+    aggregated["spread"] = spread
+
+    return aggregated
+
+
+def run_benchmark(benchmark: Callable[..., dict], runs: int, warmup: int, *args) -> dict:
+    """Runs the benchmark several times, each in a fresh process, and aggregates the results
+
+    Parameters
+    ----------
+    benchmark : Callable[..., dict]
+        The benchmark function
+    runs : int
+        Number of the measured runs
+    warmup : int
+        Number of the unmeasured runs of the benchmark before each measured one
+    args
+        Arguments of the benchmark function
+
+    Returns
+    -------
+    dict
+        The medians and spreads of the results of the runs
+    """
+
+    return aggregate_results([run_in_process(benchmark, warmup, *args) for _ in range(runs)])
+
+
+def run_suite(subjects: int, language: str = "en_US", source_file: Union[str, Path] = DEFAULT_CSV_PATH, seed: int = 0,
+              language_repeat: int = DEFAULT_LANGUAGE_REPEAT, csv_repeat: int = DEFAULT_CSV_REPEAT,
+              runs: int = DEFAULT_RUNS, warmup: int = DEFAULT_WARMUP) -> dict:
+    """Runs all the benchmarks on the synthetic cohort
+
+    Parameters
+    ----------
+    subjects : int
+        Number of the subjects of the synthetic cohort
+    language : str
+        The language of the generated reports
+    source_file : Union[str, Path]
+        Path to csv file with the rows the synthetic subjects are drawn from
+    seed : int
+        Seed of the synthetic cohort
+    language_repeat : int
+        Number of the languages loaded by the language_loading benchmark
+    csv_repeat : int
+        Number of the loadings of the csv file by the csv_loading benchmark
+    runs : int
+        Number of the measured runs of each benchmark
+    warmup : int
+        Number of the unmeasured runs of the benchmark before each measured one
+
+    Returns
+    -------
+    dict
+        The description of the run and the results mapped by the names of the benchmarks
+    """
+
+    metadata = {"subjects": subjects,
+                "language": language,
+                "seed": seed,
+                "runs": runs,
+                "warmup": warmup,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "created": datetime.now().isoformat(timespec="seconds")}
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_file = os.path.join(directory, "cohort.csv")
+        write_cohort(csv_file, subjects, source_file, seed)
+
+        benchmarks = {"language_loading": run_benchmark(run_language_loading, runs, warmup, language,
+                                                        language_repeat),
+                      "csv_loading": run_benchmark(run_csv_loading, runs, warmup, csv_file, csv_repeat),
+                      "report_generation": run_benchmark(run_report_generation, runs, warmup, language, csv_file),
+                      "generate": run_benchmark(run_generate, runs, warmup, language, csv_file)}
+
+    return {"metadata": metadata, "benchmarks": benchmarks}
+
+
+def compare(baseline: dict, current: dict, tolerance: float = DEFAULT_TOLERANCE) -> List[Tuple[str, str, float]]:
+    """Compares the results of the run with the baseline. A metric is flagged only when its change for the worse is
+    larger than both the tolerance and the spread of the metric in the baseline and in the run, so the noise of the
+    machine is not reported as a regression
+
+    Parameters
+    ----------
+    baseline : dict
+        The stored results of the suite
+    current : dict
+        The results of the run
+    tolerance : float
+        Relative change of a metric for the worse above which it is flagged as a regression
+
+    Returns
+    -------
+    List[Tuple[str, str, float]]
+        The benchmark, the metric and the relative change for the worse of each regression
+    """
+
+    regressions = []
+
+    for name, result in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            continue
+
+        for metric, higher_is_better in METRICS.items():
+            value, base_value = result.get(metric), base.get(metric)
+            if not value or not base_value:
+                continue
+
+            change = (base_value - value) / base_value if higher_is_better else (value - base_value) / base_value
+            spread = max(base.get("spread", {}).get(metric, 0.0), result.get("spread", {}).get(metric, 0.0))
+            if change > max(tolerance, spread):
+                regressions.append((name, metric, change))
+
+    return regressions
+
+
+def format_results(results: dict, baseline: Optional[dict] = None) -> str:
+    """Formats the results as a table, the latencies are in milliseconds
+
+    Parameters
+    ----------
+    results : dict
+        The results of the suite
+    baseline : Optional[dict]
+        The stored results the relative changes are computed from
+
+    Returns
+    -------
+    str
+        The table of the results
+    """
+
+    columns = ["throughput", "p50", "p95", "p99", "peak_rss_mib"]
+    lines = [f"{'benchmark':<20}{'items':>10}{'seconds':>10}{'items/s':>12}{'spread':>8}{'p50 ms':>10}{'p95 ms':>10}"
+             f"{'p99 ms':>10}{'RSS MiB':>10}"]
+
+    for name, result in results["benchmarks"].items():
+        rss = result["peak_rss_mib"]
+        spread = result.get("spread", {}).get("throughput", 0.0)
+        lines.append(f"{name:<20}{result['items']:>10d}{result['seconds']:>10.2f}{result['throughput']:>12.1f}"
+                     f"{spread:>8.1%}{result['p50'] * 1000:>10.3f}{result['p95'] * 1000:>10.3f}"
+                     f"{result['p99'] * 1000:>10.3f}{rss if rss is not None else float('nan'):>10.1f}")
+
+        base = baseline["benchmarks"].get(name) if baseline else None
+        if base:
+            changes = [f"{column} {get_change(base.get(column), result.get(column)):+.1%}" for column in columns
+                       if base.get(column) and result.get(column)]
+            lines.append(f"{'':<20}vs baseline: {', '.join(changes)}")
+
+    return "\n".join(lines)
+
+
+def get_change(base_value: float, value: float) -> float:
+    """Gets the relative change of the value from the baseline"""
+
+    return (value - base_value) / base_value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the benchmarks on a synthetic cohort")
+    parser.add_argument("-n", "--subjects", help="Number of the subjects of the synthetic cohort", default=10_000,
+                        type=int)
+    parser.add_argument("-l", "--language", help="The language of the generated reports", default="en_US")
+    parser.add_argument("-c", "--csv", help="Path to csv file with the rows the subjects are drawn from",
+                        default=DEFAULT_CSV_PATH)
+    parser.add_argument("--seed", help="Seed of the synthetic cohort", default=0, type=int)
+    parser.add_argument("--language-repeat", help="Number of the languages loaded by the language_loading benchmark",
+                        default=DEFAULT_LANGUAGE_REPEAT, type=int)
+    parser.add_argument("--csv-repeat", help="Number of the loadings of the csv file by the csv_loading benchmark",
+                        default=DEFAULT_CSV_REPEAT, type=int)
+    parser.add_argument("-r", "--runs", help="Number of the measured runs of each benchmark, the medians are reported",
+                        default=DEFAULT_RUNS, type=int)
+    parser.add_argument("--warmup", help="Number of the unmeasured runs of the benchmark before each measured one",
+                        default=DEFAULT_WARMUP, type=int)
+    parser.add_argument("-o", "--output", help="JSON file the results are written to as the baseline", default=None)
+    parser.add_argument("--compare", help="JSON baseline the results are compared with", default=None)
+    parser.add_argument("-t", "--tolerance", help="Relative change of a metric for the worse flagged as a regression, "
+                                                  "when also larger than the spread of the runs",
+                        default=DEFAULT_TOLERANCE, type=float)
+    argument = parser.parse_args()
+
+    baseline = None
+    if argument.compare:
+        with open(argument.compare) as file:
+            baseline = json.load(file)
+        if baseline["metadata"].get("subjects") != argument.subjects:
+            print(f"Warning: the baseline was recorded with {baseline['metadata'].get('subjects')} subjects")
+
+    results = run_suite(argument.subjects, argument.language, argument.csv, argument.seed, argument.language_repeat,
+                        argument.csv_repeat, argument.runs, argument.warmup)
+    print(format_results(results, baseline))
+
+    if argument.output:
+        with open(argument.output, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {argument.output}")
+
+    if baseline is not None:
+        regressions = compare(baseline, results, argument.tolerance)
+        for name, metric, change in regressions:
+            print(f"REGRESSION {name} {metric}: {change:.1%} worse than the baseline")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions above {argument.tolerance:.0%}")
+
+
+if __name__ == '__main__':
+    main()
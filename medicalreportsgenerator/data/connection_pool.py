@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import psycopg2  # type: ignore[import]
+import psycopg2.extensions  # type: ignore[import]
+import psycopg2.pool  # type: ignore[import]
+
+# Default bounds of the number of connections kept by the pool
+DEFAULT_MIN_CONNECTIONS = 1
+DEFAULT_MAX_CONNECTIONS = 4
+# Seconds a thread waits for a free connection when all the connections of the pool are borrowed
+DEFAULT_CONNECTION_TIMEOUT = 30.0
+
+_types_registered = False
+_types_lock = threading.Lock()
+
+
+def register_types():
+    """Registers the customized adapters for PostgreSQL. The adapters are global, so they are registered only once
+    per process"""
+
+    global _types_registered
+
+    with _types_lock:
+        if _types_registered:
+            return
+
+        # Register a customized adapter for PostgreSQL to load decimals as floats
+        DEC2FLOAT = psycopg2.extensions.new_type(
+            psycopg2.extensions.DECIMAL.values,
+            'DEC2FLOAT',
+            lambda value, curs: float(value) if value is not None else None)
+        psycopg2.extensions.register_type(DEC2FLOAT)
+
+        _types_registered = True
+
+
+def get_connection_parameters() -> dict:
+    """Gets the parameters of the connection to the database from the environment variables
+
+    Returns
+    -------
+    dict
+        Keyword arguments of psycopg2.connect
+    """
+
+    return {"user": os.getenv("EMS_DB_USER"),
+            "password": os.getenv("EMS_DB_PASSWORD"),
+            "host": os.getenv("EMS_DB_HOST"),
+            "database": os.getenv("EMS_DB_NAME")}
+
+
+class ConnectionManager:
+    """
+    A class representing a pool of connections to the database shared by the threads of a long-running process.
+
+    The pool is created lazily with the first requested connection, so creating the manager does not connect to the
+    database. The connections are reused, so only the first requests pay for the connect and TLS handshake. When all
+    the connections are borrowed, the threads wait for a returned connection instead of failing.
+
+    Methods
+    -------
+    connection()
+        Context manager borrowing a connection from the pool
+    close()
+        Closes all the connections of the pool
+    """
+
+    def __init__(self, min_connections: int = DEFAULT_MIN_CONNECTIONS,
+                 max_connections: int = DEFAULT_MAX_CONNECTIONS, timeout: float = DEFAULT_CONNECTION_TIMEOUT,
+                 **connection_parameters):
+        """
+
+        Parameters
+        ----------
+        min_connections : int
+            Number of connections kept open by the pool
+        max_connections : int
+            Maximum number of connections opened by the pool at once
+        timeout : float
+            Seconds a thread waits for a free connection when all the connections are borrowed
+        connection_parameters
+            Keyword arguments of psycopg2.connect. When omitted, they are taken from the environment variables
+        """
+
+        self.min_connections = min_connections
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.connection_parameters = connection_parameters or get_connection_parameters()
+        self.pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+        self.lock = threading.Lock()
+        # Counts the free connections, the pool itself refuses a connection instead of waiting for one
+        self.semaphore = threading.BoundedSemaphore(max_connections)
+
+    def __get_pool(self) -> psycopg2.pool.ThreadedConnectionPool:
+        """Gets the pool of connections, creating it when needed
+
+        Returns
+        -------
+        psycopg2.pool.ThreadedConnectionPool
+            The pool of connections
+        """
+
+        with self.lock:
+            if self.pool is None:
+                register_types()
+
+                logging.info('Creating pool of connections to the PostgreSQL database...')
+                self.pool = psycopg2.pool.ThreadedConnectionPool(self.min_connections, self.max_connections,
+                                                                 **self.connection_parameters)
+
+            return self.pool
+
+    @contextmanager
+    def connection(self) -> Iterator:
+        """Context manager borrowing a connection from the pool. The connection is returned to the pool on exit, an
+        open transaction is rolled back by the pool and a broken connection is discarded
+
+        Returns
+        -------
+        Iterator
+            Connection to the database
+
+        Raises
+        ------
+        TimeoutError
+            If no connection was returned to the pool within the timeout
+        """
+
+        if not self.semaphore.acquire(timeout=self.timeout):
+            raise TimeoutError(f"No connection to the database became free within {self.timeout} seconds")
+
+        try:
+            pool = self.__get_pool()
+            conn = pool.getconn()
+            try:
+                yield conn
+            finally:
+                pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self.semaphore.release()
+
+    def close(self):
+        """Closes all the connections of the pool"""
+
+        with self.lock:
+            if self.pool is not None:
+                self.pool.closeall()
+                self.pool = None
+                logging.info('Database connections closed.')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,168 @@
+import io
+import queue
+import threading
+from typing import Any, Callable, Union
+
+# Number of bytes of the output of COPY collected before they are handed over to the reader
+COPY_CHUNK_SIZE = 2 ** 20
+
+# Number of chunks of the output of COPY held in memory at once, the COPY waits while the reader is behind
+DEFAULT_COPY_QUEUE_SIZE = 8
+
+# Seconds the COPY waits for a free place in the queue before checking whether the stream was closed
+_PUT_INTERVAL = 0.1
+
+# Marks the end of the output of COPY in the queue, the chunks of the output are never empty
+_END = b""
+
+
+class CopyStream(io.RawIOBase):
+    """
+    A class representing the output of COPY ... TO STDOUT read while it is being written.
+
+    The COPY runs in a thread writing into a bounded queue, so the rows are parsed as soon as they arrive and only the
+    queued chunks are held in memory instead of the whole output. An error of the COPY is raised by the read following
+    the last chunk. Closing the stream before the end aborts the COPY and waits for its thread, so the connection is
+    free again when the stream is closed.
+
+    Methods
+    -------
+    start()
+        Starts the COPY in the thread
+    readinto(buffer)
+        Reads the next bytes of the output, waiting for the COPY when none are queued
+    close()
+        Aborts the COPY if it is still running and waits for its thread
+    """
+
+    def __init__(self, copy: Callable[[Any], Any], queue_size: int = DEFAULT_COPY_QUEUE_SIZE):
+        """
+
+        Parameters
+        ----------
+        copy : Callable[[Any], Any]
+            Runs the COPY writing into the file it is given, such as a copy_expert of a cursor
+        queue_size : int
+            Number of chunks of the output held in memory at once
+        """
+
+        super().__init__()
+        self.copy = copy
+        self.chunks: "queue.Queue[Union[bytes, BaseException]]" = queue.Queue(queue_size)
+        self.pending = memoryview(b"")
+        self.finished = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.__run, name="copy_stream", daemon=True)
+
+    def start(self) -> "CopyStream":
+        """Starts the COPY in the thread
+
+        Returns
+        -------
+        CopyStream
+            The same stream
+        """
+
+        self.thread.start()
+
+        return self
+
+    def __run(self):
+        writer = _QueueWriter(self.__put)
+        try:
+            self.copy(writer)
+            writer.flush()
+        except BaseException as error:
+            if not self.stopped.is_set():
+                self.__put(error)
+        finally:
+            self.__put(_END)
+
+    def __put(self, item: Union[bytes, BaseException]) -> bool:
+        """Queues the item, waiting for a free place until the stream is closed
+
+        Returns
+        -------
+        bool
+            True if the item was queued, False if the stream was closed
+        """
+
+        while not self.stopped.is_set():
+            try:
+                self.chunks.put(item, timeout=_PUT_INTERVAL)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        """Reads the next bytes of the output, waiting for the COPY when none are queued
+
+        Parameters
+        ----------
+        buffer
+            The writable buffer the bytes are read into
+
+        Returns
+        -------
+        int
+            Number of the bytes read, 0 at the end of the output
+
+        Raises
+        ------
+        BaseException
+            The error of the COPY, after the chunks written before it were read
+        """
+
+        while not self.pending:
+            if self.finished:
+                return 0
+
+            item = self.chunks.get()
+            if isinstance(item, BaseException):
+                self.finished = True
+                raise item
+            if not item:
+                self.finished = True
+                continue
+            self.pending = memoryview(item)
+
+        size = min(len(buffer), len(self.pending))
+        buffer[:size] = self.pending[:size]
+        self.pending = self.pending[size:]
+
+        return size
+
+    def close(self):
+        """Aborts the COPY if it is still running and waits for its thread"""
+
+        if not self.closed:
+            self.stopped.set()
+            if self.thread.is_alive():
+                self.thread.join()
+        super().close()
+
+
+class _QueueWriter:
+    """Collects the writes of the COPY into chunks of COPY_CHUNK_SIZE bytes, so the rows are not queued one by one"""
+
+    def __init__(self, put: Callable[[bytes], bool]):
+        self.put = put
+        self.buffer = bytearray()
+
+    def write(self, data: Union[bytes, str]) -> int:
+        self.buffer += data.encode() if isinstance(data, str) else data
+        if len(self.buffer) >= COPY_CHUNK_SIZE:
+            self.flush()
+
+        return len(data)
+
+    def flush(self):
+        # Failing the write aborts the COPY once the stream is closed
+        if self.buffer and not self.put(bytes(self.buffer)):
+            raise OSError("The stream of the COPY was closed")
+        self.buffer = bytearray()
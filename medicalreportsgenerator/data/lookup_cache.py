@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.queries import LOOKUP_TABLES, select_lookup_table
+
+# Number of seconds after which the lookup tables are loaded again
+DEFAULT_LOOKUP_TTL = 3600.0
+
+
+class LookupCache:
+    """
+    A class representing an in-memory copy of the small lookup tables which turn the *_id columns of the fact table
+    into names.
+
+    The tables are loaded once and kept until the time to live expires or they are refreshed explicitly, so only the
+    fact table has to be queried and the ids are resolved client-side, the same way as the LEFT JOINs of select_all
+    resolve them.
+
+    Methods
+    -------
+    refresh(conn)
+        Loads all the lookup tables from the database
+    is_expired()
+        Checks whether the lookup tables have to be loaded again
+    get_tables(conn)
+        Gets the lookup tables, loading them when they expired
+    resolve(row, conn)
+        Adds the looked up names to the row of the fact table
+    resolve_with(row, tables)
+        Adds the names looked up in the given tables to the row of the fact table
+    resolve_all(rows, conn)
+        Lazily adds the looked up names to the rows of the fact table
+    """
+
+    def __init__(self, ttl: Optional[float] = DEFAULT_LOOKUP_TTL,
+                 lookup_tables: List[Tuple[str, str, str]] = LOOKUP_TABLES,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+
+        Parameters
+        ----------
+        ttl : Optional[float]
+            Number of seconds after which the lookup tables are loaded again. When None, they are kept until refreshed
+            explicitly
+        lookup_tables : List[Tuple[str, str, str]]
+            The name of each lookup table, the id column of the fact table and the name of the resolved column
+        clock : Callable[[], float]
+            Source of the current time in seconds
+        """
+
+        self.ttl = ttl
+        self.lookup_tables = lookup_tables
+        self.clock = clock
+        self.tables: Dict[str, Dict[int, str]] = {}
+        self.loaded_at: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def refresh(self, conn):
+        """Loads all the lookup tables from the database
+
+        Parameters
+        ----------
+        conn
+            Connection to the database from which we create the cursor
+        """
+
+        tables = {}
+
+        with conn.cursor() as cursor:
+            for table, _, _ in self.lookup_tables:
+                cursor.execute(select_lookup_table(table))
+                tables[table] = dict(cursor.fetchall())
+
+        with self.lock:
+            self.tables = tables
+            self.loaded_at = self.clock()
+
+        logging.info("Loaded %d lookup tables", len(tables))
+
+    def is_expired(self) -> bool:
+        """Checks whether the lookup tables have to be loaded again
+
+        Returns
+        -------
+        bool
+            True if the tables were not loaded yet or their time to live expired, False otherwise
+        """
+
+        if self.loaded_at is None:
+            return True
+
+        return self.ttl is not None and self.clock() - self.loaded_at >= self.ttl
+
+    def get_tables(self, conn) -> Dict[str, Dict[int, str]]:
+        """Gets the lookup tables, loading them when they expired
+
+        Parameters
+        ----------
+        conn
+            Connection to the database from which we create the cursor
+
+        Returns
+        -------
+        Dict[str, Dict[int, str]]
+            The names mapped by the ids for each lookup table
+        """
+
+        if self.is_expired():
+            self.refresh(conn)
+
+        return self.tables
+
+    def resolve(self, row: dict, conn) -> dict:
+        """Adds the looked up names to the row of the fact table. The ids which are None or missing from the lookup
+        table are resolved to None
+
+        Parameters
+        ----------
+        row : dict
+            Row of the fact table
+        conn
+            Connection to the database used when the lookup tables have to be loaded
+
+        Returns
+        -------
+        dict
+            The same row with the resolved names
+        """
+
+        return self.resolve_with(row, self.get_tables(conn))
+
+    def resolve_with(self, row: dict, tables: Dict[str, Dict[int, str]]) -> dict:
+        """Adds the names looked up in the given tables to the row of the fact table, without loading the tables, for
+        when the connection is busy
+
+        Parameters
+        ----------
+        row : dict
+            Row of the fact table
+        tables : Dict[str, Dict[int, str]]
+            The names mapped by the ids for each lookup table, see get_tables
+
+        Returns
+        -------
+        dict
+            The same row with the resolved names
+        """
+
+        for table, column, name in self.lookup_tables:
+            value_id = row.get(column)
+            row[name] = tables[table].get(value_id) if value_id is not None else None
+
+        return row
+
+    def resolve_all(self, rows: Iterable[dict], conn) -> Iterator[dict]:
+        """Lazily adds the looked up names to the rows of the fact table
+
+        Parameters
+        ----------
+        rows : Iterable[dict]
+            Rows of the fact table
+        conn
+            Connection to the database used when the lookup tables have to be loaded
+
+        Returns
+        -------
+        Iterator[dict]
+            The rows with the resolved names
+        """
+
+        for row in rows:
+            yield self.resolve(row, conn)
@@ -45,8 +45,8 @@ class Onset:
 
     """
 
-    def __init__(self, onset_timestamp: datetime, wake_up_stroke: Optional[bool],
-                 date_format: str, time_format: str):
+    def __init__(self, onset_timestamp: Optional[datetime], wake_up_stroke: Optional[bool],
+                 date_format: Optional[str], time_format: Optional[str]):
         self.onset_date = onset_timestamp.date().strftime(date_format if date_format else DEFAULT_DATE_FORMAT)\
             if onset_timestamp else None
         self.onset_time = onset_timestamp.time().strftime(time_format if time_format else DEFAULT_TIME_FORMAT)\
@@ -169,7 +169,7 @@ class Etiology:
 
     def __init__(self, large_artery: Optional[bool], cardioembolism: Optional[bool], other: Optional[bool],
                  cryptogenic_stroke: Optional[bool], small_vessel: Optional[bool],
-                 carotid_stenosis: Optional[bool], carotid_stenosis_level: [str], afib_flutter: Optional[bool]):
+                 carotid_stenosis: Optional[bool], carotid_stenosis_level: Optional[str], afib_flutter: Optional[str]):
         self.large_artery = large_artery
         self.cardioembolism = cardioembolism
         self.other = other
@@ -186,9 +186,9 @@ class Discharge:
 
     """
 
-    def __init__(self, discharge_date: date, discharge_destination: Optional[str], nihss: Optional[int],
-                 discharge_mrs: Optional[int], contact_date: Optional[datetime], mode_contact: Optional[str],
-                 discharge_medication: str, date_format: str):
+    def __init__(self, discharge_date: Optional[date], discharge_destination: Optional[str], nihss: Optional[int],
+                 discharge_mrs: Optional[int], contact_date: Optional[date], mode_contact: Optional[str],
+                 discharge_medication: str, date_format: Optional[str]):
         self.discharge_date = discharge_date.strftime(date_format if date_format else DEFAULT_DATE_FORMAT)\
             if discharge_date else None
         self.discharge_destination = discharge_destination
@@ -222,7 +222,8 @@ class MedicalReport:
         self.discharge = discharge
 
     def to_dict(self):
-        """Creates a dictionary from the attributes
+        """Creates a dictionary from the attributes. Each part is a shallow copy of the attributes, so the dictionary
+        can be changed without changing the medical report
 
         Returns
         -------
@@ -230,16 +231,17 @@ class MedicalReport:
             Dictionary of all attributes from child classes
         """
         data = {
-            "diagnosis": vars(self.diagnosis) if self.diagnosis else {},
-            "patient": vars(self.patient) if self.patient else {},
-            "onset": vars(self.onset) if self.onset else {},
-            "admission": vars(self.admission) if self.admission else {},
-            "treatment": vars(self.treatment) if self.treatment else {},
-            "follow_up_imaging": vars(self.follow_up_imaging) if self.follow_up_imaging else {},
-            "post_acute_care": vars(self.post_acute_care) if self.post_acute_care else {},
-            "post_stroke_complications": vars(self.post_stroke_complications) if self.post_stroke_complications else {},
-            "etiology": vars(self.etiology) if self.etiology else {},
-            "discharge": vars(self.discharge) if self.discharge else {},
+            "diagnosis": dict(vars(self.diagnosis)) if self.diagnosis else {},
+            "patient": dict(vars(self.patient)) if self.patient else {},
+            "onset": dict(vars(self.onset)) if self.onset else {},
+            "admission": dict(vars(self.admission)) if self.admission else {},
+            "treatment": dict(vars(self.treatment)) if self.treatment else {},
+            "follow_up_imaging": dict(vars(self.follow_up_imaging)) if self.follow_up_imaging else {},
+            "post_acute_care": dict(vars(self.post_acute_care)) if self.post_acute_care else {},
+            "post_stroke_complications": dict(vars(self.post_stroke_complications))
+            if self.post_stroke_complications else {},
+            "etiology": dict(vars(self.etiology)) if self.etiology else {},
+            "discharge": dict(vars(self.discharge)) if self.discharge else {},
         }
 
         if self.treatment:
@@ -0,0 +1,326 @@
+from dataclasses import MISSING, fields, is_dataclass
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Tuple, Type, Union, get_args, get_origin
+
+from dateutil.parser import parse
+from dict_to_dataclass.exceptions import DictKeyNotFoundError, DictValueConversionError, DictValueNotFoundError
+
+from data.data_objects import DiagnosisData, DiagnosisOcclusionsData, PatientData, OnsetData, AdmissionData, \
+    RiskFactorsData, PriorTreatmentData, TreatmentData, ImagingData, ImagingTreatmentData, PostAcuteCareData, \
+    PostStrokeComplicationsData, EtiologyData, DischargeData, MedicationData
+
+DATA_CLASSES = (DiagnosisData, DiagnosisOcclusionsData, PatientData, OnsetData, AdmissionData, RiskFactorsData,
+                PriorTreatmentData, TreatmentData, ImagingData, ImagingTreatmentData, PostAcuteCareData,
+                PostStrokeComplicationsData, EtiologyData, DischargeData, MedicationData)
+
+
+class FieldTarget:
+    """
+    A class representing a single dataclass field filled from a column of the row.
+
+    Methods
+    -------
+    convert(value, row)
+        Converts the value from the row to the type of the field
+    """
+
+    def __init__(self, section: int, dc_field: Any):
+        """
+
+        Parameters
+        ----------
+        section : int
+            Index of the dataclass inside the decoder
+        dc_field : Field
+            The dataclass field
+        """
+
+        self.section = section
+        self.field = dc_field
+        self.name = dc_field.name
+        self.optional = is_optional(dc_field.type)
+        self.type = get_optional_type(dc_field.type)
+        self.converter = dc_field.metadata.get("converter")
+        # The values of the fields with a converter are always passed to the converter, as in from_dict, so their
+        # values are never taken as they are
+        self.exact_type = self.type if self.converter is None else None
+        self.has_default = dc_field.default is not MISSING or dc_field.default_factory is not MISSING
+
+    def convert(self, value: Any, row: dict) -> Any:
+        """Converts the value from the row to the type of the field, the same way as DataclassFromDict.from_dict does
+
+        Parameters
+        ----------
+        value : Any
+            Value from the row
+        row : dict
+            The whole row, used for the error messages
+
+        Returns
+        -------
+        Any
+            The converted value
+
+        Raises
+        ------
+        DictValueNotFoundError
+            If the value is None and the field is not optional
+        DictValueConversionError
+            If the value cannot be converted to the type of the field
+        """
+
+        if value is None:
+            if not self.optional:
+                raise DictValueNotFoundError(self.field, row)
+            return None
+
+        if self.converter is not None:
+            return self.converter(value)
+
+        if isinstance(value, self.type):
+            return value
+
+        if self.type is datetime:
+            try:
+                if isinstance(value, str):
+                    return parse(value)
+                if isinstance(value, int):
+                    return datetime.fromtimestamp(value / 1000)
+                if isinstance(value, float):
+                    return datetime.fromtimestamp(value)
+            except Exception:
+                pass
+
+        raise DictValueConversionError(self.field, value)
+
+
+class RowDecoder:
+    """
+    A class representing a decoder of rows into the dataclasses from data_objects.
+
+    The dataclasses are introspected once, when the decoder is created, into a plan which maps every column of the
+    row to the dataclass fields filled from it. Every row is then decoded with a single pass over the plan instead of
+    reflecting over the fields of each dataclass separately.
+
+    Methods
+    -------
+    decode(row)
+        Decodes the row into instances of all dataclasses
+    columns(alternatives)
+        Gets the names of all columns read by the decoder
+    column_types()
+        Gets the types of the fields filled from each column
+    """
+
+    def __init__(self, data_classes: Tuple[Type, ...] = DATA_CLASSES):
+        """
+
+        Parameters
+        ----------
+        data_classes : Tuple[Type, ...]
+            Dataclasses deriving from DataclassFromDict to decode the rows into
+        """
+
+        self.data_classes = data_classes
+        # Dataclasses with fields the plan does not support are decoded with DataclassFromDict.from_dict
+        self.fallback: List[Type] = []
+        self.required: List[FieldTarget] = []
+        self.plan: List[Tuple[Tuple[str, ...], List[FieldTarget]]] = self.__create_plan()
+
+    def __create_plan(self) -> List[Tuple[Tuple[str, ...], List[FieldTarget]]]:
+        """Creates the plan mapping the columns of the row to the dataclass fields
+
+        Returns
+        -------
+        List[Tuple[Tuple[str, ...], List[FieldTarget]]]
+            Pairs of the column names, in the order in which they are looked up, and the fields filled from the column
+        """
+
+        plan: Dict[Tuple[str, ...], List[FieldTarget]] = {}
+
+        for section, data_class in enumerate(self.data_classes):
+            dc_fields = [dc_field for dc_field in fields(data_class) if dc_field.metadata.get("should_get_from_dict")]
+
+            if not all(dc_field.metadata.get("converter") or is_supported(get_optional_type(dc_field.type))
+                       for dc_field in dc_fields):
+                self.fallback.append(data_class)
+                continue
+
+            for dc_field in dc_fields:
+                dict_key = dc_field.metadata.get("dict_key")
+                keys = (dict_key,) if dict_key is not None else (dc_field.name, to_camel_case(dc_field.name))
+                target = FieldTarget(section, dc_field)
+
+                plan.setdefault(keys, []).append(target)
+                if not target.has_default:
+                    self.required.append(target)
+
+        return list(plan.items())
+
+    def decode(self, row: dict) -> Dict[Type, Any]:
+        """Decodes the row into instances of all dataclasses
+
+        Parameters
+        ----------
+        row : dict
+            Row with the data of the patient
+
+        Returns
+        -------
+        Dict[Type, Any]
+            Instances of the dataclasses mapped by the dataclass
+
+        Raises
+        ------
+        DictKeyNotFoundError
+            If a column for a field without default value is missing
+        DictValueNotFoundError
+            If the value is None and the field is not optional
+        DictValueConversionError
+            If the value cannot be converted to the type of the field
+        """
+
+        arguments: List[Dict[str, Any]] = [{} for _ in self.data_classes]
+
+        for keys, targets in self.plan:
+            value = row.get(keys[0], MISSING)
+            if value is MISSING and len(keys) > 1:
+                value = row.get(keys[1], MISSING)
+            if value is MISSING:
+                continue
+
+            for target in targets:
+                if type(value) is target.exact_type:
+                    arguments[target.section][target.name] = value
+                else:
+                    arguments[target.section][target.name] = target.convert(value, row)
+
+        for target in self.required:
+            if target.name not in arguments[target.section]:
+                raise DictKeyNotFoundError(target.field, row)
+
+        result = {data_class: data_class(**arguments[section])
+                  for section, data_class in enumerate(self.data_classes) if data_class not in self.fallback}
+
+        for data_class in self.fallback:
+            result[data_class] = data_class.from_dict(row)
+
+        return result
+
+    def columns(self, alternatives: bool = False) -> List[str]:
+        """Gets the names of all columns read by the decoder
+
+        Parameters
+        ----------
+        alternatives : bool
+            Boolean deciding whether to include the alternative camelCase names of the columns
+
+        Returns
+        -------
+        List[str]
+            Names of the columns
+        """
+
+        if alternatives:
+            return [key for keys, _ in self.plan for key in keys]
+
+        return [keys[0] for keys, _ in self.plan]
+
+    def column_types(self) -> Dict[str, Any]:
+        """Gets the types of the fields filled from each column. The columns filling fields of different types or
+        fields with a converter, which may expect any type, are left out
+
+        Returns
+        -------
+        Dict[str, Any]
+            The types of the fields, without Optional, mapped by the names of the columns
+        """
+
+        column_types = {}
+
+        for keys, targets in self.plan:
+            types = {target.exact_type for target in targets}
+            if len(types) == 1 and None not in types:
+                column_types[keys[0]] = types.pop()
+
+        return column_types
+
+
+def is_optional(field_type: Any) -> bool:
+    """Checks whether the type is Optional
+
+    Parameters
+    ----------
+    field_type : Any
+        Type of the dataclass field
+
+    Returns
+    -------
+    bool
+        True if the type is Optional, False otherwise
+    """
+
+    return get_origin(field_type) is Union and type(None) in get_args(field_type)
+
+
+def get_optional_type(field_type: Any) -> Any:
+    """Gets the type wrapped in Optional
+
+    Parameters
+    ----------
+    field_type : Any
+        Type of the dataclass field
+
+    Returns
+    -------
+    Any
+        The type which is not None if the type is Optional, the type itself otherwise
+    """
+
+    if is_optional(field_type):
+        return next(arg for arg in get_args(field_type) if arg is not type(None))
+
+    return field_type
+
+
+def is_supported(field_type: Any) -> bool:
+    """Checks whether the values of the type can be converted by the decoder
+
+    Parameters
+    ----------
+    field_type : Any
+        Type of the dataclass field without Optional
+
+    Returns
+    -------
+    bool
+        False for lists, enums and nested dataclasses, True otherwise
+    """
+
+    if not isinstance(field_type, type):
+        return False
+
+    return not (issubclass(field_type, (list, Enum)) or is_dataclass(field_type))
+
+
+def to_camel_case(snake_str: str) -> str:
+    """Converts the snake_case name to camelCase, which is the alternative key looked up for the fields
+
+    Parameters
+    ----------
+    snake_str : str
+        Name in snake_case
+
+    Returns
+    -------
+    str
+        Name in camelCase
+    """
+
+    components = snake_str.split("_")
+    return components[0] + "".join(x.title() for x in components[1:])
+
+
+# Decoder of all dataclasses used by the generator, the dataclasses are introspected only once at start-up
+ROW_DECODER = RowDecoder()
@@ -0,0 +1,415 @@
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional, Iterable, Iterator, List, Dict, Tuple, Collection, Sequence, Mapping, Union
+
+import pandas as pd  # type: ignore[import]
+
+from utils.id_utils import chunk_ids
+from utils.load_csv_utils import read_csv, to_records
+from utils.queries import LOOKUP_TABLES, FACT_TABLE, TABLE_PREFIX, select_all, select_by_id, select_in_ids, \
+    select_facts, select_lookup_table, select_subject_ids
+
+# Number of rows inserted into the snapshot, or fetched from the source, at once
+DEFAULT_SNAPSHOT_BATCH_SIZE = 1000
+
+# Maximum number of subject ids bound to a single query, lower than the limit of the host parameters of SQLite
+DEFAULT_SNAPSHOT_IDS_CHUNK_SIZE = 900
+
+# Declared SQLite types of the booleans, dates and timestamps of the snapshot. The converters are registered for these
+# names only, so the connections of the process to other SQLite files, declaring plain DATE or TIMESTAMP columns, are
+# not affected. The names have the same NUMERIC affinity as BOOLEAN, DATE and TIMESTAMP
+SNAPSHOT_BOOLEAN = "SNAPSHOT_BOOLEAN"
+SNAPSHOT_DATE = "SNAPSHOT_DATE"
+SNAPSHOT_TIMESTAMP = "SNAPSHOT_TIMESTAMP"
+
+# Declared SQLite types of the columns mapped by the type codes of PostgreSQL
+POSTGRES_TYPES = {16: SNAPSHOT_BOOLEAN,
+                  20: "INTEGER",
+                  21: "INTEGER",
+                  23: "INTEGER",
+                  700: "REAL",
+                  701: "REAL",
+                  1700: "REAL",
+                  1082: SNAPSHOT_DATE,
+                  1114: SNAPSHOT_TIMESTAMP,
+                  1184: SNAPSHOT_TIMESTAMP,
+                  }
+
+# Declared SQLite types of the columns mapped by the types of the values inferred by pandas
+PANDAS_TYPES = {"boolean": SNAPSHOT_BOOLEAN,
+                "integer": "INTEGER",
+                "floating": "REAL",
+                "mixed-integer-float": "REAL",
+                "datetime64": SNAPSHOT_DATE,
+                "datetime": SNAPSHOT_DATE,
+                "date": SNAPSHOT_DATE,
+                }
+
+_types_registered = False
+_types_lock = threading.Lock()
+
+
+def register_types():
+    """Registers the adapters and converters restoring the booleans, dates and timestamps, which SQLite stores as
+    integers and text, from the declared snapshot types of the columns. The converters are global, so they are
+    registered only once per process and only for the snapshot types"""
+
+    global _types_registered
+
+    with _types_lock:
+        if _types_registered:
+            return
+
+        sqlite3.register_adapter(date, date.isoformat)
+        sqlite3.register_adapter(datetime, datetime.isoformat)
+        sqlite3.register_converter(SNAPSHOT_BOOLEAN, lambda value: bool(int(value)))
+        sqlite3.register_converter(SNAPSHOT_DATE, lambda value: date.fromisoformat(value.decode()))
+        sqlite3.register_converter(SNAPSHOT_TIMESTAMP, lambda value: datetime.fromisoformat(value.decode()))
+
+        _types_registered = True
+
+
+def connect(snapshot_file: str, create: bool = False) -> sqlite3.Connection:
+    """Opens the snapshot, returning the rows as dictionaries with the restored types
+
+    Parameters
+    ----------
+    snapshot_file : str
+        Path to SQLite file
+    create : bool
+        Boolean deciding whether to create the file when it does not exist
+
+    Returns
+    -------
+    sqlite3.Connection
+        Connection to the snapshot
+
+    Raises
+    ------
+    FileNotFoundError
+        If the snapshot does not exist and is not to be created
+    """
+
+    if not create and not os.path.exists(snapshot_file):
+        raise FileNotFoundError(f"Snapshot {snapshot_file} does not exist, create it with option --snapshot")
+
+    register_types()
+
+    conn = sqlite3.connect(str(snapshot_file), detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+    conn.row_factory = lambda cursor, row: {column[0]: value for column, value in zip(cursor.description, row)}
+
+    return conn
+
+
+@contextmanager
+def connection(snapshot_file: str) -> Iterator[sqlite3.Connection]:
+    """Opens the snapshot for the duration of the block and closes it afterwards
+
+    Parameters
+    ----------
+    snapshot_file : str
+        Path to SQLite file
+
+    Returns
+    -------
+    Iterator[sqlite3.Connection]
+        Connection to the snapshot
+    """
+
+    conn = connect(snapshot_file)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def write_snapshot(snapshot_file: str, columns: Sequence[Tuple[str, str]], rows: Iterable[Sequence],
+                   lookup_tables: Mapping[str, Iterable[Tuple[int, str]]],
+                   batch_size: int = DEFAULT_SNAPSHOT_BATCH_SIZE) -> int:
+    """Writes the fact table and the lookup tables into the SQLite file, under the same names as in the database, and
+    indexes the fact table by the subject id. The file is written aside and replaces the previous snapshot only when
+    complete
+
+    Parameters
+    ----------
+    snapshot_file : str
+        Path to SQLite file
+    columns : Sequence[Tuple[str, str]]
+        The name and the declared type of each column of the fact table
+    rows : Iterable[Sequence]
+        The values of the rows of the fact table, in the order of the columns
+    lookup_tables : Mapping[str, Iterable[Tuple[int, str]]]
+        The ids and the names of each lookup table, mapped by the name of the table without the prefix
+    batch_size : int
+        Number of rows inserted at once
+
+    Returns
+    -------
+    int
+        Number of rows of the fact table
+    """
+
+    partial_file = f"{snapshot_file}.partial"
+    if os.path.exists(partial_file):
+        os.remove(partial_file)
+
+    conn = connect(partial_file, create=True)
+    count = 0
+
+    try:
+        definition = ", ".join(f'"{name}" {declared_type}' for name, declared_type in columns)
+        conn.execute(f"CREATE TABLE {FACT_TABLE} ({definition})")
+
+        insert = f"INSERT INTO {FACT_TABLE} VALUES ({', '.join('?' for _ in columns)})"
+        batch = []
+        for row in rows:
+            batch.append(tuple(row))
+            if len(batch) >= batch_size:
+                conn.executemany(insert, batch)
+                count += len(batch)
+                batch = []
+        conn.executemany(insert, batch)
+        count += len(batch)
+
+        # The id columns missing from the source are added empty, so the joins of the queries resolve them to None
+        names = {name for name, _ in columns}
+        for _, column, _ in LOOKUP_TABLES:
+            if column not in names:
+                conn.execute(f'ALTER TABLE {FACT_TABLE} ADD COLUMN "{column}" INTEGER')
+
+        conn.execute(f"CREATE INDEX {FACT_TABLE}_subject_id ON {FACT_TABLE} (subject_id)")
+
+        for table, values in lookup_tables.items():
+            conn.execute(f"CREATE TABLE {TABLE_PREFIX}{table} (id INTEGER PRIMARY KEY, name TEXT)")
+            conn.executemany(f"INSERT INTO {TABLE_PREFIX}{table} VALUES (?, ?)", values)
+
+        conn.commit()
+    finally:
+        conn.close()
+
+    os.replace(partial_file, snapshot_file)
+    logging.info("Stored %d rows into snapshot %s", count, snapshot_file)
+
+    return count
+
+
+def create_snapshot_from_db(conn, snapshot_file: str, batch_size: int = DEFAULT_SNAPSHOT_BATCH_SIZE) -> int:
+    """Copies the fact table and the lookup tables from the database into the SQLite file. The fact table is fetched
+    through a server-side cursor in batches
+
+    Parameters
+    ----------
+    conn
+        Connection to the database from which we create the cursor
+    snapshot_file : str
+        Path to SQLite file
+    batch_size : int
+        Number of rows fetched and inserted at once
+
+    Returns
+    -------
+    int
+        Number of rows of the fact table
+    """
+
+    lookup_tables = {}
+    with conn.cursor() as cursor:
+        for table, _, _ in LOOKUP_TABLES:
+            cursor.execute(select_lookup_table(table))
+            lookup_tables[table] = cursor.fetchall()
+
+    with conn.cursor("snapshot_stream") as cursor:
+        cursor.itersize = batch_size
+        cursor.execute(select_facts(True))
+
+        # The description of the server-side cursor is known only after the first fetch
+        first = cursor.fetchmany(batch_size)
+        columns = [(column.name, POSTGRES_TYPES.get(column.type_code, "TEXT")) for column in cursor.description]
+
+        def iter_rows():
+            batch = first
+            while batch:
+                yield from batch
+                batch = cursor.fetchmany(batch_size)
+
+        return write_snapshot(snapshot_file, columns, iter_rows(), lookup_tables, batch_size)
+
+
+def create_snapshot_from_csv(csv_file: Union[str, Path], snapshot_file: str, dtypes: Optional[Dict[str, str]] = None,
+                             batch_size: int = DEFAULT_SNAPSHOT_BATCH_SIZE) -> int:
+    """Copies the csv export into the SQLite file. The export holds both the ids of the lookup tables and the looked up
+    names, so the lookup tables are rebuilt from the distinct pairs of them and the names are left out of the fact
+    table
+
+    Parameters
+    ----------
+    csv_file : Union[str, Path]
+        Path to csv file
+    snapshot_file : str
+        Path to SQLite file
+    dtypes : Optional[Dict[str, str]]
+        Types of the columns to be converted while parsing. When omitted, CSV_DTYPES are used
+    batch_size : int
+        Number of rows inserted at once
+
+    Returns
+    -------
+    int
+        Number of rows of the fact table
+    """
+
+    df = read_csv(csv_file, None, dtypes)
+
+    # The tables missing from the export are created empty, so the joins of the queries resolve the names to None
+    lookup_tables: Dict[str, List[Tuple[int, str]]] = {}
+    for table, column, name in LOOKUP_TABLES:
+        lookup_tables[table] = []
+        if column in df.columns and name in df.columns:
+            pairs = df[[column, name]].dropna().drop_duplicates(column)
+            lookup_tables[table] = [(int(id_), str(value)) for id_, value in pairs.itertuples(index=False)]
+
+    names = {name for _, _, name in LOOKUP_TABLES}
+    facts = df[[column for column in df.columns if column not in names]]
+    columns = [(column, PANDAS_TYPES.get(pd.api.types.infer_dtype(facts[column], skipna=True), "TEXT"))
+               for column in facts.columns]
+    dates = [name for name, declared_type in columns if declared_type == SNAPSHOT_DATE]
+
+    def iter_rows():
+        for row in to_records(facts):
+            for column in dates:
+                if row[column] is not None:
+                    row[column] = row[column].date()
+            yield row.values()
+
+    return write_snapshot(snapshot_file, columns, iter_rows(), lookup_tables, batch_size)
+
+
+def get_columns(conn: sqlite3.Connection, columns: Optional[Collection[str]] = None) -> Optional[List[str]]:
+    """Gets the columns of the fact table to be selected
+
+    Parameters
+    ----------
+    conn : sqlite3.Connection
+        Connection to the snapshot
+    columns : Optional[Collection[str]]
+        Names of the columns to be selected. The names missing from the fact table are ignored. When omitted, all
+        columns are selected
+
+    Returns
+    -------
+    Optional[List[str]]
+        Names of the columns to be selected, None when all columns are selected
+    """
+
+    if columns is None:
+        return None
+
+    available = [row["name"] for row in conn.execute(f"PRAGMA table_info({FACT_TABLE})")]
+
+    return [column for column in available if column in columns]
+
+
+def load_data_from_snapshot(subject_id: Optional[int], snapshot_file: str,
+                            columns: Optional[Collection[str]] = None) -> list:
+    """Loads data from the snapshot, joining the lookup tables the same way as the database
+
+    Parameters
+    ----------
+    subject_id : Optional[int]
+        Specifies the patient for which to load the data, looked up by the index. When None, all patients are loaded
+    snapshot_file : str
+        Path to SQLite file
+    columns : Optional[Collection[str]]
+        Names of the columns of the fact table to be loaded. When omitted, all columns are loaded
+
+    Returns
+    -------
+    list
+        List of dictionaries with key value pairs of data from the snapshot
+    """
+
+    with connection(snapshot_file) as conn:
+        selected = get_columns(conn, columns)
+        if subject_id is None:
+            return conn.execute(select_all(True, selected)).fetchall()
+
+        return conn.execute(select_by_id(True, selected, "?"), (int(subject_id),)).fetchall()
+
+
+def load_data_many_from_snapshot(subject_ids: Iterable[int], snapshot_file: str,
+                                 columns: Optional[Collection[str]] = None,
+                                 chunk_size: int = DEFAULT_SNAPSHOT_IDS_CHUNK_SIZE) -> Iterator[dict]:
+    """Lazily loads data of the given subjects from the snapshot, ordered by the subject id. The snapshot is queried
+    once for each chunk of the ids
+
+    Parameters
+    ----------
+    subject_ids : Iterable[int]
+        Ids of the subjects to be loaded. The ids missing from the snapshot are skipped
+    snapshot_file : str
+        Path to SQLite file
+    columns : Optional[Collection[str]]
+        Names of the columns of the fact table to be loaded. When omitted, all columns are loaded
+    chunk_size : int
+        Maximum number of ids looked up by a single query
+
+    Returns
+    -------
+    Iterator[dict]
+        Dictionaries with key value pairs of data from the snapshot
+    """
+
+    with connection(snapshot_file) as conn:
+        selected = get_columns(conn, columns)
+        for chunk in chunk_ids(sorted({int(subject_id) for subject_id in subject_ids}), chunk_size):
+            yield from conn.execute(select_in_ids(len(chunk), True, selected), chunk).fetchall()
+
+
+def iter_data_from_snapshot(snapshot_file: str, columns: Optional[Collection[str]] = None,
+                            batch_size: int = DEFAULT_SNAPSHOT_BATCH_SIZE) -> Iterator[dict]:
+    """Lazily loads data from the snapshot in batches of rows, so only a single batch is held in memory at a time
+
+    Parameters
+    ----------
+    snapshot_file : str
+        Path to SQLite file
+    columns : Optional[Collection[str]]
+        Names of the columns of the fact table to be loaded. When omitted, all columns are loaded
+    batch_size : int
+        Number of rows fetched at once
+
+    Returns
+    -------
+    Iterator[dict]
+        Dictionaries with key value pairs of data from the snapshot
+    """
+
+    with connection(snapshot_file) as conn:
+        cursor = conn.execute(select_all(True, get_columns(conn, columns)))
+        batch = cursor.fetchmany(batch_size)
+        while batch:
+            yield from batch
+            batch = cursor.fetchmany(batch_size)
+
+
+def load_ids_from_snapshot(snapshot_file: str) -> List[int]:
+    """Loads the ids of the subjects from the snapshot
+
+    Parameters
+    ----------
+    snapshot_file : str
+        Path to SQLite file
+
+    Returns
+    -------
+    List[int]
+        Sorted list of the ids
+    """
+
+    with connection(snapshot_file) as conn:
+        return [row["subject_id"] for row in conn.execute(select_subject_ids())]
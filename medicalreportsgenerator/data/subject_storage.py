@@ -1,20 +1,174 @@
+import io
 import logging
-import os
-from typing import Optional, Any, List
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+from typing import Optional, Any, List, Iterator, Sequence, Dict, Union
 
 import psycopg2
 import psycopg2.extras
-import psycopg2.extensions
 
+from data.connection_pool import ConnectionManager, get_connection_parameters, register_types
+from data.copy_stream import CopyStream
+from data.lookup_cache import LookupCache
+from data.row_decoder import RowDecoder, ROW_DECODER
+from data.sqlite_snapshot import load_data_from_snapshot, load_data_many_from_snapshot, iter_data_from_snapshot, \
+    load_ids_from_snapshot
+from utils.columnar_utils import load_data_from_columnar_file, iter_data_from_columnar_file, \
+    load_ids_from_columnar_file
 from utils.definitions import DEFAULT_CSV_PATH
-from utils.load_csv_utils import load_ids_from_csv_file, load_data_from_csv_file
-from utils.queries import select_all, select_by_id, select_subject_ids
+from utils.id_utils import chunk_ids
+from utils.load_csv_utils import load_ids_from_csv_file, load_data_from_csv_file, load_data_many_from_csv_file, \
+    iter_data_from_csv_file, load_data_indexed_from_csv_file, CSV_DTYPES, DATETIME_DTYPE, DEFAULT_CSV_CHUNK_SIZE
+from utils.queries import select_all, select_by_id, select_by_ids, select_subject_ids, select_facts, \
+    select_fact_columns, copy_to_csv, LOOKUP_TABLES
+
+
+# Number of rows fetched from the server-side cursor at once when streaming
+DEFAULT_STREAM_BATCH_SIZE = 500
+
+# Number of subject ids looked up by a single query when fetching many subjects
+DEFAULT_IDS_CHUNK_SIZE = 1000
+
+# Number of bytes of the output of COPY buffered for the csv parser
+COPY_BUFFER_SIZE = 2 ** 20
+
+
+def get_required_columns(row_decoder: RowDecoder = ROW_DECODER) -> List[str]:
+    """Gets the names of the source columns the reports are generated from, which are the columns read by the decoder,
+    the subject id and the id columns of the lookup tables
+
+    Parameters
+    ----------
+    row_decoder : RowDecoder
+        Decoder of the rows into the data objects
+
+    Returns
+    -------
+    List[str]
+        Names of the required columns
+    """
+
+    columns = ["subject_id"] + row_decoder.columns(True) + [column for _, column, _ in LOOKUP_TABLES]
+
+    return list(dict.fromkeys(columns))
+
+
+def get_csv_dtypes(row_decoder: RowDecoder = ROW_DECODER) -> Dict[str, str]:
+    """Gets the types the columns of csv file are converted to while parsing, derived from the types of the fields
+    filled from the columns. The types do not depend on the other values of the column, so the values read by the
+    decoder are the same whether the file is parsed at once or in chunks. The booleans are converted by the parser
+    itself, which is faster than the nullable boolean type, and the datetime fields are left as strings, their time
+    zone is parsed by the decoder. The id columns of the lookup tables are integers
+
+    Parameters
+    ----------
+    row_decoder : RowDecoder
+        Decoder of the rows into the data objects
+
+    Returns
+    -------
+    Dict[str, str]
+        The pandas types mapped by the names of the columns
+    """
+
+    dtypes = dict(CSV_DTYPES)
+
+    for column, field_type in row_decoder.column_types().items():
+        if field_type is int:
+            dtypes.setdefault(column, "Int64")
+        elif field_type is float:
+            dtypes.setdefault(column, "float64")
+        elif field_type is str:
+            dtypes.setdefault(column, "object")
+        elif field_type is date:
+            dtypes.setdefault(column, DATETIME_DTYPE)
+
+    for _, column, _ in LOOKUP_TABLES:
+        dtypes.setdefault(column, "Int64")
+
+    return dtypes
+
+
+# Columns required by the decoder shared by all generators
+REQUIRED_COLUMNS = get_required_columns()
+
+# Types of the csv columns read by the decoder shared by all generators
+CSV_COLUMN_DTYPES = get_csv_dtypes()
+
+
+@dataclass(frozen=True)
+class SourceOptions:
+    """
+    A class representing the options of the source the data of the subjects are loaded from and of the way they are
+    loaded. The columnar file takes precedence over the snapshot, the snapshot over the csv and the csv over the
+    database.
+
+    Attributes
+    ----------
+    from_csv : bool
+        Boolean deciding whether to load the data from csv instead of the database
+    csv_file : Union[str, Path]
+        Path to csv file
+    columnar_file : Optional[str]
+        Path to parquet or feather file. When given, the data are loaded from the file instead of the csv or the
+        database
+    snapshot_file : Optional[str]
+        Path to SQLite snapshot of the database. When given, the data are loaded from the snapshot instead of the csv
+        or the database
+    bulk_copy : bool
+        Boolean deciding whether to extract all the data from the database at once with COPY as csv, which is parsed
+        by the typed csv loader, instead of fetching the rows through the cursor
+    stream_batch_size : Optional[int]
+        Number of rows fetched at once when streaming all the data from the database through a server-side cursor, or
+        parsed at once when streaming the csv file in chunks. When omitted, all the rows are fetched at once
+    lookup_cache : Optional[LookupCache]
+        In-memory copy of the lookup tables. When given, only the fact table is queried and the ids are resolved
+        client-side. When omitted, the lookup tables are joined by the database
+    discharge_from : Optional[date]
+        The first discharge date of the patients loaded from the columnar file, inclusive
+    discharge_to : Optional[date]
+        The last discharge date of the patients loaded from the columnar file, inclusive
+    project_columns : bool
+        Boolean deciding whether to load only the columns required by the reports instead of all the columns of the
+        fact table or csv
+    csv_index : bool
+        Boolean deciding whether to look up the rows of the given subjects through the index of the csv file, parsing
+        only their rows, instead of parsing the whole csv file
+    """
+
+    from_csv: bool = False
+    csv_file: Union[str, Path] = DEFAULT_CSV_PATH
+    columnar_file: Optional[str] = None
+    snapshot_file: Optional[str] = None
+    bulk_copy: bool = False
+    stream_batch_size: Optional[int] = None
+    lookup_cache: Optional[LookupCache] = None
+    discharge_from: Optional[date] = None
+    discharge_to: Optional[date] = None
+    project_columns: bool = True
+    csv_index: bool = True
 
 
 class SubjectStorage:
-    def __init__(self, from_csv: bool = False, csv_file: str = DEFAULT_CSV_PATH):
-        self.from_csv = from_csv
-        self.csv_file = csv_file
+    def __init__(self, options: Optional[SourceOptions] = None,
+                 connection_manager: Optional[ConnectionManager] = None):
+        """
+
+        Parameters
+        ----------
+        options : Optional[SourceOptions]
+            The source of the data and the way they are loaded. When omitted, all the rows are loaded from the
+            database at once
+        connection_manager : Optional[ConnectionManager]
+            Pool of connections to the database. When omitted, a new connection is created for every query
+        """
+
+        self.options = options if options is not None else SourceOptions()
+        self.connection_manager = connection_manager
+        self.columns = REQUIRED_COLUMNS if self.options.project_columns else None
+        self.fact_columns: Optional[List[str]] = None
 
     def get_data(self, subject_id: Optional[int] = None) -> Any:
         """Gets all the data about patient from database or csv
@@ -26,14 +180,90 @@ class SubjectStorage:
         Returns
         -------
         Any
-            The data af the patient
+            The data af the patient. When streaming, an iterator over the rows which are fetched lazily
         """
 
-        if self.from_csv:
-            return load_data_from_csv_file(subject_id, self.csv_file)
+        options = self.options
+
+        if options.columnar_file:
+            return self.get_columnar_data(options.columnar_file, subject_id)
+
+        if options.snapshot_file:
+            if options.stream_batch_size and subject_id is None:
+                return iter_data_from_snapshot(options.snapshot_file, self.columns, options.stream_batch_size)
+
+            return load_data_from_snapshot(subject_id, options.snapshot_file, self.columns)
+
+        if options.from_csv:
+            if options.stream_batch_size and subject_id is None:
+                return iter_data_from_csv_file(options.csv_file, self.columns, CSV_COLUMN_DTYPES,
+                                               options.stream_batch_size)
+
+            if options.csv_index and subject_id is not None:
+                data = load_data_indexed_from_csv_file([subject_id], options.csv_file, self.columns, CSV_COLUMN_DTYPES)
+                if not data:
+                    raise IndexError("Invalid subject id, try running with option --list to list available ids")
+
+                return data[:1]
+
+            return load_data_from_csv_file(subject_id, options.csv_file, self.columns, CSV_COLUMN_DTYPES)
+
+        if options.bulk_copy and subject_id is None:
+            return self.copy_patient_info(options.stream_batch_size or DEFAULT_CSV_CHUNK_SIZE)
+
+        if options.stream_batch_size and subject_id is None:
+            return self.stream_patient_info(options.stream_batch_size)
 
         return self.get_patient_info(False, subject_id)
 
+    def get_data_many(self, subject_ids: Sequence[int], chunk_size: int = DEFAULT_IDS_CHUNK_SIZE) -> Iterator[dict]:
+        """Gets all the data about the given patients from database or csv, ordered by the subject id. The database
+        is queried once for each chunk of the ids
+
+        Parameters
+        ----------
+        subject_ids : Sequence[int]
+            Specifies the patients for which to get the data. The ids which are not found are skipped
+        chunk_size : int
+            Maximum number of ids looked up by a single query
+
+        Returns
+        -------
+        Iterator[dict]
+            The data of the patients
+        """
+
+        options = self.options
+
+        if options.columnar_file:
+            yield from load_data_from_columnar_file(subject_ids, options.columnar_file, self.columns,
+                                                    options.discharge_from, options.discharge_to)
+            return
+
+        if options.snapshot_file:
+            yield from load_data_many_from_snapshot(subject_ids, options.snapshot_file, self.columns)
+            return
+
+        if options.from_csv and options.csv_index:
+            yield from load_data_indexed_from_csv_file(subject_ids, options.csv_file, self.columns, CSV_COLUMN_DTYPES)
+            return
+
+        if options.from_csv:
+            yield from load_data_many_from_csv_file(subject_ids, options.csv_file, self.columns, CSV_COLUMN_DTYPES,
+                                                    options.stream_batch_size)
+            return
+
+        try:
+            with self.connection() as conn:
+                for chunk in chunk_ids(sorted(subject_ids), chunk_size):
+                    yield from self.get_patient_info_many_from_db(conn, chunk, options.lookup_cache,
+                                                                  self.get_fact_columns(conn))
+        except TimeoutError:
+            # All the connections of the pool are borrowed, which is not a problem of the setup
+            raise
+        except (Exception, psycopg2.DatabaseError) as error:
+            raise psycopg2.DatabaseError(f"{error} Have you set up the environment variables for database correctly?")
+
     def get_subject_ids(self) -> List[int]:
         """Gets all the patient ids from database or csv
 
@@ -43,11 +273,58 @@ class SubjectStorage:
             List of patient ids
         """
 
-        if self.from_csv:
-            return load_ids_from_csv_file(self.csv_file)
+        options = self.options
+
+        if options.columnar_file:
+            return load_ids_from_columnar_file(options.columnar_file, options.discharge_from, options.discharge_to)
+
+        if options.snapshot_file:
+            return load_ids_from_snapshot(options.snapshot_file)
+
+        if options.from_csv:
+            return load_ids_from_csv_file(options.csv_file, options.stream_batch_size)
 
         return self.get_patient_info(True, None)
 
+    def get_columnar_data(self, columnar_file: str, subject_id: Optional[int] = None) -> Any:
+        """Gets all the data about patient from parquet or feather file, reading only the required columns and the
+        rows matching the subject id and the discharge dates
+
+        Parameters
+        ----------
+        columnar_file : str
+            Path to parquet or feather file
+        subject_id
+            Specifies the patient for which to get the data
+
+        Returns
+        -------
+        Any
+            The data af the patient. When streaming, an iterator over the rows which are read lazily
+
+        Raises
+        ------
+        IndexError
+            If the subject is not found in the file
+        """
+
+        options = self.options
+
+        if subject_id is not None:
+            data = load_data_from_columnar_file([subject_id], columnar_file, self.columns, options.discharge_from,
+                                                options.discharge_to)
+            if not data:
+                raise IndexError("Invalid subject id, try running with option --list to list available ids")
+
+            return data[:1]
+
+        if options.stream_batch_size:
+            return iter_data_from_columnar_file(columnar_file, self.columns, options.stream_batch_size,
+                                                options.discharge_from, options.discharge_to)
+
+        return load_data_from_columnar_file(None, columnar_file, self.columns, options.discharge_from,
+                                            options.discharge_to)
+
     def get_patient_info(self, only_ids: bool = False, subject_id: Optional[int] = None) -> Any:
         """Creates a connection to the database and fetches data about patients, which can be either only the ids,
         or all the data
@@ -64,40 +341,134 @@ class SubjectStorage:
             Fetched data from the database
         """
 
-        # Connect to the PostgreSQL database server
-        conn = None
+        try:
+            with self.connection() as conn:
+                if only_ids:
+                    return self.get_patient_ids_from_db(conn)
+
+                return self.get_patient_info_from_db(conn, subject_id, self.options.lookup_cache,
+                                                     self.get_fact_columns(conn))
+        except TimeoutError:
+            raise
+        except (Exception, psycopg2.DatabaseError) as error:
+            raise psycopg2.DatabaseError(f"{error} Have you set up the environment variables for database correctly?")
+
+    def stream_patient_info(self, batch_size: int = DEFAULT_STREAM_BATCH_SIZE) -> Iterator[dict]:
+        """Creates a connection to the database and lazily fetches all the data about patients through a server-side
+        cursor. The connection stays open until the iterator is exhausted or closed
+
+        Parameters
+        ----------
+        batch_size : int
+            Number of rows fetched from the database at once
+
+        Returns
+        -------
+        Iterator[dict]
+            Rows fetched from the database
+        """
 
         try:
+            with self.connection() as conn:
+                yield from self.stream_patient_info_from_db(conn, batch_size, self.options.lookup_cache,
+                                                            self.get_fact_columns(conn))
+        except TimeoutError:
+            raise
+        except (Exception, psycopg2.DatabaseError) as error:
+            raise psycopg2.DatabaseError(f"{error} Have you set up the environment variables for database correctly?")
 
-            # connect to the PostgreSQL server
-            logging.info('Connecting to the PostgreSQL database...')
-            conn = psycopg2.connect(
-                user=os.getenv("EMS_DB_USER"),
-                password=os.getenv("EMS_DB_PASSWORD"),
-                host=os.getenv("EMS_DB_HOST"),
-                database=os.getenv("EMS_DB_NAME")
-            )
-
-            # Register a customized adapter for PostgreSQL to load decimals as floats
-            DEC2FLOAT = psycopg2.extensions.new_type(
-                psycopg2.extensions.DECIMAL.values,
-                'DEC2FLOAT',
-                lambda value, curs: float(value) if value is not None else None)
-            psycopg2.extensions.register_type(DEC2FLOAT)
-
-            if only_ids:
-                return self.get_patient_ids_from_db(conn)
-
-            return self.get_patient_info_from_db(conn, subject_id)
+    def copy_patient_info(self, chunk_size: int = DEFAULT_CSV_CHUNK_SIZE) -> Iterator[dict]:
+        """Creates a connection to the database and extracts all the data about patients at once with COPY. The
+        connection stays open until the iterator is exhausted or closed
+
+        Parameters
+        ----------
+        chunk_size : int
+            Number of rows of the extracted csv parsed at once
+
+        Returns
+        -------
+        Iterator[dict]
+            Rows extracted from the database
+        """
+
+        try:
+            with self.connection() as conn:
+                yield from self.copy_patient_info_from_db(conn, chunk_size, self.options.lookup_cache,
+                                                          self.get_fact_columns(conn))
+        except TimeoutError:
+            raise
         except (Exception, psycopg2.DatabaseError) as error:
             raise psycopg2.DatabaseError(f"{error} Have you set up the environment variables for database correctly?")
+
+    def get_fact_columns(self, conn) -> Optional[List[str]]:
+        """Gets the required columns which the fact table has. The columns of the fact table are queried only once
+
+        Parameters
+        ----------
+        conn
+            Connection to the database from which we create the cursor
+
+        Returns
+        -------
+        Optional[List[str]]
+            Names of the columns to be selected from the fact table. None if all columns should be selected
+        """
+
+        if self.columns is None:
+            return None
+
+        if self.fact_columns is None:
+            with conn.cursor() as cursor:
+                cursor.execute(select_fact_columns())
+                available = [description[0] for description in cursor.description]
+
+            required = set(self.columns)
+            self.fact_columns = [column for column in available if column in required]
+
+        return self.fact_columns
+
+    @contextmanager
+    def connection(self) -> Iterator:
+        """Context manager providing a connection to the database. The connection is borrowed from the connection
+        manager if the storage has one, otherwise a new connection is created and closed on exit
+
+        Returns
+        -------
+        Iterator
+            Connection to the database
+        """
+
+        if self.connection_manager is not None:
+            with self.connection_manager.connection() as conn:
+                yield conn
+            return
+
+        conn = self.connect()
+        try:
+            yield conn
         finally:
-            if conn is not None:
-                conn.close()
-                logging.info('Database connection closed.')
+            conn.close()
+            logging.info('Database connection closed.')
+
+    @staticmethod
+    def connect():
+        """Creates a connection to the database configured by the environment variables
+
+        Returns
+        -------
+            Connection to the database
+        """
+
+        register_types()
+
+        # connect to the PostgreSQL server
+        logging.info('Connecting to the PostgreSQL database...')
+        return psycopg2.connect(**get_connection_parameters())
 
     @staticmethod
-    def get_patient_info_from_db(conn, subject_id: Optional[int] = None) -> list[tuple[Any, ...]]:
+    def get_patient_info_from_db(conn, subject_id: Optional[int] = None, lookup_cache: Optional[LookupCache] = None,
+                                 columns: Optional[List[str]] = None) -> List[dict]:
         """Fetches data about patient from the database
 
         Parameters
@@ -106,6 +477,10 @@ class SubjectStorage:
             Connection to the database from which we create the cursor
         subject_id
             The id of subject for which the medical report should be generated.
+        lookup_cache : Optional[LookupCache]
+            In-memory copy of the lookup tables resolving the ids of the fact table instead of the joins
+        columns : Optional[List[str]]
+            Columns selected from the fact table. When omitted, all columns are selected
 
         Returns
         -------
@@ -114,16 +489,125 @@ class SubjectStorage:
 
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
             # fetch data from database
+            joined = lookup_cache is None
             if subject_id:
-                select = select_by_id(subject_id)
-                cursor.execute(select, subject_id)
+                select = select_by_id(joined, columns)
+                cursor.execute(select, (subject_id,))
             else:
-                select = select_all(True)
+                select = select_all(True, columns) if joined else select_facts(True, columns)
                 cursor.execute(select)
             data = cursor.fetchall()
 
+        if lookup_cache is not None:
+            return list(lookup_cache.resolve_all(data, conn))
+
+        return data
+
+    @staticmethod
+    def get_patient_info_many_from_db(conn, subject_ids: List[int], lookup_cache: Optional[LookupCache] = None,
+                                      columns: Optional[List[str]] = None) -> list[dict]:
+        """Fetches data about the given patients from the database with a single parameterized query
+
+        Parameters
+        ----------
+        conn
+            Connection to the database from which we create the cursor
+        subject_ids : List[int]
+            The ids of subjects for which the medical reports should be generated
+        lookup_cache : Optional[LookupCache]
+            In-memory copy of the lookup tables resolving the ids of the fact table instead of the joins
+        columns : Optional[List[str]]
+            Columns selected from the fact table. When omitted, all columns are selected
+
+        Returns
+        -------
+            Fetched data from database
+        """
+
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            cursor.execute(select_by_ids(lookup_cache is None, columns), (list(subject_ids),))
+            data = cursor.fetchall()
+
+        if lookup_cache is not None:
+            return list(lookup_cache.resolve_all(data, conn))
+
         return data
 
+    @staticmethod
+    def stream_patient_info_from_db(conn, batch_size: int = DEFAULT_STREAM_BATCH_SIZE,
+                                    lookup_cache: Optional[LookupCache] = None,
+                                    columns: Optional[List[str]] = None) -> Iterator[dict]:
+        """Lazily fetches data about all patients from the database through a named server-side cursor, so only a
+        single batch of rows is held in memory at a time
+
+        Parameters
+        ----------
+        conn
+            Connection to the database from which we create the cursor
+        batch_size : int
+            Number of rows fetched from the database at once
+        lookup_cache : Optional[LookupCache]
+            In-memory copy of the lookup tables resolving the ids of the fact table instead of the joins
+        columns : Optional[List[str]]
+            Columns selected from the fact table. When omitted, all columns are selected
+
+        Returns
+        -------
+        Iterator[dict]
+            Rows fetched from the database
+        """
+
+        if lookup_cache is not None:
+            # Load the lookup tables before the server-side cursor is opened
+            lookup_cache.get_tables(conn)
+
+        with conn.cursor("subject_stream", cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+            cursor.itersize = batch_size
+            cursor.execute(select_all(True, columns) if lookup_cache is None else select_facts(True, columns))
+
+            while rows := cursor.fetchmany(batch_size):
+                yield from rows if lookup_cache is None else lookup_cache.resolve_all(rows, conn)
+
+    @staticmethod
+    def copy_patient_info_from_db(conn, chunk_size: int = DEFAULT_CSV_CHUNK_SIZE,
+                                  lookup_cache: Optional[LookupCache] = None,
+                                  columns: Optional[List[str]] = None) -> Iterator[dict]:
+        """Extracts data about all patients from the database with COPY ... TO STDOUT as csv, which skips building a
+        dictionary per row in the cursor. The extracted csv is streamed from a thread running the COPY and parsed in
+        chunks by the typed csv loader as it arrives, so the values are converted the same way as from the csv file
+        and only a few chunks of the output are held in memory
+
+        Parameters
+        ----------
+        conn
+            Connection to the database from which we create the cursor
+        chunk_size : int
+            Number of rows of the extracted csv parsed at once
+        lookup_cache : Optional[LookupCache]
+            In-memory copy of the lookup tables resolving the ids of the fact table instead of the joins
+        columns : Optional[List[str]]
+            Columns selected from the fact table. When omitted, all columns are selected
+
+        Returns
+        -------
+        Iterator[dict]
+            Rows extracted from the database
+        """
+
+        query = select_all(True, columns) if lookup_cache is None else select_facts(True, columns)
+
+        # The COPY holds the connection until its output is read, so the lookup tables are loaded before it
+        tables = lookup_cache.get_tables(conn) if lookup_cache is not None else None
+
+        with conn.cursor() as cursor:
+            with CopyStream(lambda file: cursor.copy_expert(copy_to_csv(query), file)).start() as stream:
+                rows = iter_data_from_csv_file(io.BufferedReader(stream, COPY_BUFFER_SIZE), None, CSV_COLUMN_DTYPES,
+                                               chunk_size)
+                if lookup_cache is None or tables is None:
+                    yield from rows
+                else:
+                    yield from (lookup_cache.resolve_with(row, tables) for row in rows)
+
     @staticmethod
     def get_patient_ids_from_db(conn) -> list[int]:
         """Fetches subject ids from the database
@@ -1,9 +1,15 @@
 import datetime
+import os
+import tempfile
 import unittest
 import logging
+from pathlib import Path
 
 from app.generator import MedicalReportsGenerator
 from app.language import Language
+from app.phrase_builder import PhraseBuilder, replace_last
+from app.placeholder_template import PlaceholderTemplate, TemplateWithPeriods, substitute_templates
+from app.template_cache import TemplateCache
 from data.models import Diagnosis, Discharge, Etiology, PostStrokeComplications, PostAcuteCare, Treatment, Admission, \
     Onset, Patient, Thrombolysis, Thrombectomy, MedicalReport, FollowUpImaging
 from tests.definitions import FIXTURES_PATH
@@ -46,14 +52,6 @@ class TestMedicalRecordsGenerator(unittest.TestCase):
         self.data["discharge_medication"] = True
         self.generator = MedicalReportsGenerator(language, path_to_template)
 
-    def test_replace_last(self):
-        test_str = "orange, bananna, apple, strawberry"
-        replacement = ", and"
-
-        result = MedicalReportsGenerator.replace_last(test_str, ",", replacement)
-
-        self.assertEqual("orange, bananna, apple, and strawberry", result)
-
     def test_prepare_scoped_values_simple(self):
         values = {"scope": {"a": 4, "b": 1}}
 
@@ -100,61 +98,49 @@ class TestMedicalRecordsGenerator(unittest.TestCase):
 
         self.assertEqual("", result)
 
-    def test_parse_data_single(self):
-        data = {"test": "value"}
-        translations = {"test": "changed value"}
+    def test_resolve_variables_missing(self):
+        del self.generator.language.variables["risk_factors"]
 
-        result = self.generator._MedicalReportsGenerator__parse_data(translations, data)
+        with self.assertRaises(KeyError):
+            self.generator._MedicalReportsGenerator__resolve_variables()
 
-        self.assertEqual("changed value", result)
+    def test_resolve_variables_valid(self):
+        result = self.generator._MedicalReportsGenerator__resolve_variables()
 
-    def test_parse_data_multiple(self):
-        data = {"test1": "value", "test2": "value2", "test3": "value3"}
-        translations = {"test1": "changed value", "test2": "changed value2", "test3": "changed value3"}
-
-        result = self.generator._MedicalReportsGenerator__parse_data(translations, data)
-
-        self.assertEqual("changed value, changed value2, and changed value3", result)
-
-    def test_get_variable_invalid(self):
-        key = "invalid_key"
+        self.assertEqual(self.generator.language.variables["risk_factors"], result["risk_factors"])
 
-        with self.assertLogs(None, logging.ERROR):
-            result = self.generator._MedicalReportsGenerator__get_variables(key)
-
-        self.assertIsNone(result)
+    def test_resolve_settings_missing(self):
+        del self.generator.language.settings["time_format"]
 
-    def test_get_variable_valid(self):
-        self.generator.language.variables["test"] = {}
-        self.generator.language.variables["test"]["first"] = "val1"
-        self.generator.language.variables["test"]["second"] = "val2"
-        self.generator.language.variables["test"]["third"] = "val3"
+        with self.assertRaises(KeyError):
+            self.generator._MedicalReportsGenerator__resolve_settings()
 
-        key = "test"
-
-        result = self.generator._MedicalReportsGenerator__get_variables(key)
-        expected = {"first": "val1", "second": "val2", "third": "val3"}
+    def test_resolve_settings_valid(self):
+        result = self.generator._MedicalReportsGenerator__resolve_settings()
 
+        expected = {"date_format": self.generator.language.settings["date_format"],
+                    "time_format": self.generator.language.settings["time_format"]}
         self.assertEqual(expected, result)
 
-    def test_get_setting_invalid(self):
-        key = "invalid_key"
-
-        with self.assertLogs(None, logging.ERROR):
-            result = self.generator._MedicalReportsGenerator__get_setting(key)
-
-        self.assertIsNone(result)
+    def test_missing_variables_fail_fast(self):
+        language_file = load_json_file(FIXTURES_PATH / "language.json")
+        del language_file["variables"]["medications"]
+        language = Language(**language_file)
 
-    def test_get_setting_valid(self):
-        self.generator.language.settings["test1"] = "val1"
-        self.generator.language.settings["test2"] = "val2"
-        self.generator.language.settings["test3"] = "val3"
+        with self.assertRaises(KeyError):
+            MedicalReportsGenerator(language, FIXTURES_PATH / "test.txt")
 
-        key = "test1"
+    def test_missing_settings_fail_fast(self):
+        language_file = load_json_file(FIXTURES_PATH / "language.json")
+        del language_file["settings"]["date_format"]
+        language = Language(**language_file)
 
-        result = self.generator._MedicalReportsGenerator__get_setting(key)
+        with self.assertRaises(KeyError):
+            MedicalReportsGenerator(language, FIXTURES_PATH / "test.txt")
 
-        self.assertEqual("val1", result)
+    def test_variables_resolved(self):
+        self.assertIs(self.generator.language.variables["sex"], self.generator.variables["sex"])
+        self.assertEqual("", self.generator.settings["time_format"])
 
     def test_diagnosis_empty(self):
         self.generator.data = {}
@@ -378,6 +364,19 @@ class TestMedicalRecordsGenerator(unittest.TestCase):
         self.assertIsInstance(result.etiology, Etiology)
         self.assertIsInstance(result.discharge, Discharge)
 
+    def test_translate_variables_keeps_report(self):
+        self.generator.data = self.data
+        medical_report = self.generator._MedicalReportsGenerator__create_medical_report()
+        variables = medical_report.to_dict()
+
+        result = self.generator._MedicalReportsGenerator__translate_variables(variables)
+
+        self.assertEqual("male", medical_report.patient.sex)
+        self.assertEqual("male", variables["patient"]["sex"])
+        self.assertEqual("M", result["patient"]["sex"])
+        self.assertEqual("tici_score_2B", variables["treatment"]["tici_score_meaning"])
+        self.assertIs(variables["onset"], result["onset"])
+
     def test_generate_structure(self):
         self.generator.data = self.data
 
@@ -396,6 +395,14 @@ class TestMedicalRecordsGenerator(unittest.TestCase):
 
         self.assertEqual(expected, result)
 
+    def test_phrase_statistics(self):
+        self.generator.generate_medical_report(self.data)
+        self.generator.generate_medical_report(self.data)
+
+        statistics = self.generator.get_phrase_statistics()
+
+        self.assertEqual({"hits": 1, "misses": 1, "size": 1, "hit_rate": 0.5}, statistics["occlusion_position"])
+
     def test_generate_medical_record(self):
         result = self.generator.generate_medical_report(self.data)
         expected = "Diagnosis test with CT CTA variableTest patient whose sex is not other M/77Onset on Jun 10 2022. " \
@@ -406,5 +413,120 @@ class TestMedicalRecordsGenerator(unittest.TestCase):
         self.assertEqual(expected, result)
 
 
+class TestTemplateCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.template_path = Path(self.directory.name) / "main.txt"
+        self.template_path.write_text("{{report.diagnosis}}")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_template_reused(self):
+        cache = TemplateCache()
+
+        first = cache.get_template(self.template_path)
+        second = cache.get_template(self.template_path)
+
+        self.assertIs(first, second)
+
+    def test_template_shared_between_generators(self):
+        cache = TemplateCache()
+        language = Language(**load_json_file(FIXTURES_PATH / "language.json"))
+        first_generator = MedicalReportsGenerator(language, self.template_path, cache)
+        second_generator = MedicalReportsGenerator(language, self.template_path, cache)
+
+        first_generator.generate_medical_report({})
+        second_generator.generate_medical_report({})
+
+        self.assertEqual(1, len(cache.templates))
+
+    def test_template_reloaded_when_modified(self):
+        cache = TemplateCache()
+        first = cache.get_template(self.template_path)
+
+        self.template_path.write_text("{{report.patient}}")
+        stat = os.stat(self.template_path)
+        os.utime(self.template_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+        second = cache.get_template(self.template_path)
+
+        self.assertIsNot(first, second)
+        self.assertEqual("patient", second.render(report={"patient": "patient"}))
+
+
+class TestPhraseBuilder(unittest.TestCase):
+    def setUp(self) -> None:
+        self.builder = PhraseBuilder({"a": "first", "b": "second", "c": "third"})
+
+    def test_build(self):
+        result = self.builder.build({"a": True, "b": False, "c": True})
+
+        self.assertEqual("first, and third", result)
+
+    def test_build_none_set(self):
+        result = self.builder.build({"a": False, "b": None, "c": False})
+
+        self.assertEqual("", result)
+        self.assertEqual(0, self.builder.statistics()["misses"])
+
+    def test_build_cached(self):
+        self.builder.build({"a": True, "b": True, "c": False})
+        self.builder.build({"a": 1, "b": "t", "c": None})
+        result = self.builder.build({"a": True, "b": True, "c": False})
+
+        self.assertEqual("first, and second", result)
+        self.assertEqual({"hits": 2, "misses": 1, "size": 1, "hit_rate": 2 / 3}, self.builder.statistics())
+
+    def test_build_invalid_key(self):
+        with self.assertLogs(None, logging.ERROR):
+            result = self.builder.build({"a": True, "invalid": True})
+
+        self.assertEqual("first", result)
+
+    def test_build_single(self):
+        data = {"test": "value"}
+        translations = {"test": "changed value"}
+
+        result = PhraseBuilder(translations).build(data)
+
+        self.assertEqual("changed value", result)
+
+    def test_build_multiple(self):
+        data = {"test1": "value", "test2": "value2", "test3": "value3"}
+        translations = {"test1": "changed value", "test2": "changed value2", "test3": "changed value3"}
+
+        result = PhraseBuilder(translations).build(data)
+
+        self.assertEqual("changed value, changed value2, and changed value3", result)
+
+    def test_replace_last(self):
+        test_str = "orange, bananna, apple, strawberry"
+        replacement = ", and"
+
+        result = replace_last(test_str, ",", replacement)
+
+        self.assertEqual("orange, bananna, apple, and strawberry", result)
+
+
+
+class TestPlaceholderTemplate(unittest.TestCase):
+    def test_safe_substitute_matches_template(self):
+        mapping = {"scope.a": 4, "scope.b": None, "name": "value", "scope.date": datetime.date(2022, 11, 24)}
+        texts = ["", "no placeholders", "$scope.a and ${scope.b}.", "$$scope.a costs $$5", "$unknown and ${unknown}",
+                 "trailing $", "$name$scope.date, $ invalid", "${name}s at the end $scope.a"]
+
+        for text in texts:
+            with self.subTest(text=text):
+                expected = TemplateWithPeriods(text).safe_substitute(mapping)
+
+                self.assertEqual(expected, PlaceholderTemplate(text).safe_substitute(mapping))
+
+    def test_substitute_templates(self):
+        templates = [PlaceholderTemplate("$scope.a and "), PlaceholderTemplate("${scope.b}.")]
+
+        self.assertEqual("4 and 5.", substitute_templates(templates, {"scope.a": 4, "scope.b": 5}))
+        self.assertEqual("", substitute_templates([], {}))
+
+
 if __name__ == '__main__':
     unittest.main()
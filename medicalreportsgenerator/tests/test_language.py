@@ -1,8 +1,11 @@
+import datetime
 import logging
 import unittest
+from typing import List
 
 from app.language import Condition, ConditionEmpty, ConditionValue, ConditionExistence, ConditionAnd, ConditionOr, \
     ConditionNot, Variant, MedicalReportBlock
+from app.language_statistics import LanguageStatistics
 
 
 class TestCondition(unittest.TestCase):
@@ -520,5 +523,148 @@ class TestMedicalRecordBlock(unittest.TestCase):
         self.assertEqual("Some text;Some other text;Some other text again;", result)
 
 
+class TestCompiledLanguage(unittest.TestCase):
+    def setUp(self) -> None:
+        logging.disable(logging.CRITICAL)
+
+    def tearDown(self) -> None:
+        logging.disable(logging.NOTSET)
+
+    def test_compiled_conditions_match_interpreted(self):
+        conditions = [{},
+                      {"type": "VALUE", "scope": "scope.a", "value": 4},
+                      {"type": "EXISTENCE", "scope": "scope.a", "value": True},
+                      {"type": "EXISTENCE", "scope": "scope.b", "value": False},
+                      {"type": "EXISTENCE", "scope": "scope.c", "value": True},
+                      {"type": "EXISTENCE", "scope": "scope.d", "value": True},
+                      {"type": "AND", "conditions": [{"type": "VALUE", "scope": "scope.a", "value": 4}, {}]},
+                      {"type": "AND", "conditions": [{"type": "VALUE", "scope": "scope.a", "value": 4},
+                                                     {"type": "VALUE", "scope": "scope.b", "value": ""},
+                                                     {"type": "EXISTENCE", "scope": "scope.c", "value": True}]},
+                      {"type": "OR", "conditions": [{"type": "VALUE", "scope": "scope.a", "value": 1}, {}]},
+                      {"type": "OR", "conditions": [{"type": "VALUE", "scope": "scope.a", "value": 1},
+                                                    {"type": "VALUE", "scope": "scope.b", "value": "x"}]},
+                      {"type": "NOT", "condition": {}},
+                      {"type": "NOT", "condition": {"type": "EXISTENCE", "scope": "scope.b", "value": True}}]
+        data = [{"scope": {"a": 4, "b": "", "c": True, "d": datetime.time(10, 5)}},
+                {"scope": {"a": 1, "b": "x", "c": None, "d": None}}]
+
+        for condition_data in conditions:
+            condition = Condition(condition_data)
+            compiled = condition.compile()
+            for values in data:
+                with self.subTest(condition=condition_data, data=values):
+                    expected = bool(condition.condition.get_condition_result(values))
+                    result = True if compiled is None else bool(compiled(values))
+
+                    self.assertEqual(expected, result)
+
+    def test_compile_invalid_scope(self):
+        condition = ConditionValue("scope", "value")
+
+        with self.assertRaises(ValueError):
+            condition.compile()
+
+    def test_compiled_condition_key_error(self):
+        condition = ConditionExistence("scope.test", True).compile()
+
+        with self.assertRaises(KeyError):
+            condition({"scope": {}})
+
+    def test_compiled_block_flattens_nested_blocks(self):
+        variants = [{"condition": {"type": "VALUE", "scope": "scope2.b", "value": "hello"},
+                     "text": "Some text;"},
+                    {"condition": {},
+                     "block": {"variants": [{"condition": {"type": "EXISTENCE", "scope": "scope.b", "value": True},
+                                             "text": "Some other text;"},
+                                            {"condition": {"type": "EXISTENCE", "scope": "scope.a", "value": True},
+                                             "block": {"variants": [{"condition": {}, "text": "Nested text;"}]}}]}}]
+
+        medical_record_block = MedicalReportBlock("Test", variants)
+        data = {"scope": {"a": "", "b": 5}, "scope2": {"b": "hello"}}
+
+        self.assertEqual(3, len(medical_record_block.compile_variants()))
+        self.assertEqual(medical_record_block.get_block_result(data),
+                         "".join(template.text for template in medical_record_block.compile()(data)))
+
+    def test_compiled_block_parses_texts_once(self):
+        variants = [{"condition": {}, "text": "$scope.a;"}]
+
+        compiled = MedicalReportBlock("Test", variants).compile()
+
+        self.assertIs(compiled({})[0], compiled({})[0])
+
+
+class TestLanguageStatistics(unittest.TestCase):
+    def setUp(self) -> None:
+        variants: List[dict]
+        variants = [{"condition": {"type": "VALUE", "scope": "scope2.b", "value": "hello"},
+                     "text": "Some text;"},
+                    {"condition": {},
+                     "block": {"variants": [{"condition": {"type": "EXISTENCE", "scope": "scope.b", "value": True},
+                                             "text": "Some other text;"},
+                                            {"condition": {"type": "AND",
+                                                           "conditions": [
+                                                               {"type": "EXISTENCE", "scope": "scope.a", "value": True},
+                                                               {"type": "VALUE", "scope": "scope.b", "value": 5}]},
+                                             "nested": {"variants": [{"condition": {}, "text": "Nested text;"}]}}]}}]
+        self.block = MedicalReportBlock("test", variants)
+        self.data = [{"scope": {"a": "", "b": 5}, "scope2": {"b": "hello"}},
+                     {"scope": {"a": "x", "b": 5}, "scope2": {"b": "bye"}}]
+
+    def test_counted_block_gives_same_results(self):
+        statistics = LanguageStatistics()
+        counted = self.block.compile(statistics)
+
+        for values in self.data:
+            self.assertEqual([template.text for template in self.block.compile()(values)],
+                             [template.text for template in counted(values)])
+
+    def test_counts_variants_by_path(self):
+        statistics = LanguageStatistics()
+        compiled = self.block.compile(statistics)
+        for values in self.data:
+            compiled(values)
+            statistics.count_report()
+
+        summary = statistics.summary()
+
+        self.assertEqual(["test[0]", "test[1].block[0]", "test[1].block[1]", "test[1].block[1].nested[0]"],
+                         list(summary["variants"]))
+        self.assertEqual({"evaluated": 2, "hits": 1, "hit_rate": 0.5, "conditions": 2}, summary["variants"]["test[0]"])
+        # The AND condition short-circuits on the empty scope.a of the first row
+        self.assertEqual(3, summary["variants"]["test[1].block[1]"]["conditions"])
+        self.assertEqual({"evaluated": 1, "hits": 1, "hit_rate": 1.0, "conditions": 0},
+                         summary["variants"]["test[1].block[1].nested[0]"])
+        self.assertEqual(2, summary["reports"])
+        self.assertEqual(3.5, summary["conditions_per_report"])
+        self.assertEqual([], statistics.dead_variants())
+
+    def test_dead_variants(self):
+        statistics = LanguageStatistics()
+        self.block.compile(statistics)(self.data[0])
+
+        self.assertEqual(["test[1].block[1]", "test[1].block[1].nested[0]"], statistics.dead_variants())
+
+    def test_drain_and_merge(self):
+        statistics = LanguageStatistics()
+        compiled = self.block.compile(statistics)
+        compiled(self.data[0])
+        statistics.count_report()
+
+        merged = LanguageStatistics()
+        merged.merge(statistics.drain())
+        merged.merge(statistics.drain())
+
+        self.assertEqual(0, statistics.summary()["reports"])
+        self.assertEqual(0, statistics.summary()["variants"]["test[0]"]["evaluated"])
+        self.assertEqual(1, merged.summary()["variants"]["test[0]"]["hits"])
+        self.assertEqual(1, merged.summary()["reports"])
+
+        compiled(self.data[0])
+        self.assertEqual(1, statistics.summary()["variants"]["test[0]"]["evaluated"])
+        self.assertIn("test[1].block[1]", merged.format_summary())
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,21 +1,66 @@
+import json
 import os
+import shutil
+import sqlite3
+import tempfile
+import threading
 import unittest
 import io
+import urllib.error
+import urllib.request
+from dataclasses import dataclass
+from datetime import date
 import re
+from typing import Iterator, Optional
 from unittest import mock
 
+import pandas as pd  # type: ignore[import]
 import psycopg2
-
-from app.app_operations import generate
-from data.subject_storage import SubjectStorage
-from utils.queries import select_all, select_by_id
+import psycopg2.extras  # type: ignore[import]
+
+from dict_to_dataclass import DataclassFromDict, field_from_dict  # type: ignore[import]
+from dict_to_dataclass.exceptions import DictValueNotFoundError  # type: ignore[import]
+
+from app.app_operations import create_generator, generate, iter_reports, iter_reports_parallel, convert, snapshot
+from app.report_cache import ReportCache, get_row_key
+from app.report_server import ReportService, ReportServer
+from benchmarks.cohort import write_cohort, iter_cohort
+from benchmarks.suite import aggregate_results, compare
+from data import connection_pool, copy_stream
+from data.connection_pool import ConnectionManager
+from data.copy_stream import CopyStream
+from data.lookup_cache import LookupCache
+from data.data_objects import PatientData, RiskFactorsData, TreatmentData, OnsetData
+from data.row_decoder import RowDecoder, DATA_CLASSES
+from data.sqlite_snapshot import create_snapshot_from_db, load_data_from_snapshot, connect
+from data.subject_storage import SubjectStorage, SourceOptions, REQUIRED_COLUMNS
+from utils import columnar_utils
+from utils.columnar_utils import load_data_from_columnar_file, load_ids_from_columnar_file, get_columnar_format
+from utils.csv_index import CsvIndex, get_index_path
+from utils.id_utils import parse_ids, chunk_ids
+from utils.load_language_utils import get_language_path
+from utils.load_csv_utils import load_data_from_csv_file, load_ids_from_csv_file, load_data_many_from_csv_file, \
+    load_data_indexed_from_csv_file, iter_data_from_csv_file
+from utils.profiling import StageProfiler, StageStatistics, PROFILER
+from utils.queries import copy_to_csv, select_all, select_by_id, select_by_ids, select_facts, LOOKUP_TABLES
 from tests.definitions import FIXTURES_PATH
+from utils.definitions import DEFAULT_TEMPLATE_PATH, DEFAULT_CSV_PATH
+
+
+def copy_default_csv(directory: str) -> str:
+    """Copies the default csv file into the directory, so the index of the csv built by the test is stored there
+    instead of the source tree"""
+
+    csv_file = os.path.join(directory, "data.csv")
+    shutil.copyfile(DEFAULT_CSV_PATH, csv_file)
+
+    return csv_file
 
 
 class TestGenerate(unittest.TestCase):
     @unittest.mock.patch('sys.stdout', new_callable=io.StringIO)
     def assert_stdout_for_generate(self, subject_id, expected_output, mock_stdout):
-        generate("en_US", False, subject_id)
+        generate("en_US", subject_id)
         self.assertEqual(expected_output.strip(), mock_stdout.getvalue().strip())
 
     @unittest.skipIf(os.environ.get("EMS_DB_NAME") is None, "because it depends on database")
@@ -24,7 +69,11 @@ class TestGenerate(unittest.TestCase):
         with open(expected_result_file_path) as f:
             expected = f.read()
 
-        self.assertEqual(expected, generate("en_US", None, False))
+        self.assertEqual(expected, generate("en_US", None))
+
+    @unittest.skipIf(os.environ.get("EMS_DB_NAME") is None, "because it depends on database")
+    def test_generate_all_bulk_copy(self):
+        self.assertEqual(generate("en_US", None), generate("en_US", None, SourceOptions(bulk_copy=True)))
 
     @unittest.skipIf(os.environ.get("EMS_DB_NAME") is None, "because it depends on database")
     def test_generate_by_id(self):
@@ -34,10 +83,760 @@ class TestGenerate(unittest.TestCase):
 
         for i in range(1, 8):
             with self.subTest(f"Test subject with id {i}"):
-                result = generate("en_US", i, False)
+                result = generate("en_US", i)
 
                 self.assertEqual(expected[i-1], result)
 
+    def test_iter_reports_csv(self):
+        reports = list(iter_reports("en_US", None, SourceOptions(True)))
+
+        self.assertEqual([4, 5, 6, 7, 1, 2, 3], [subject_id for subject_id, _ in reports])
+        self.assertEqual(generate("en_US", None, SourceOptions(True)), "".join(f"{report}\n" for _, report in reports))
+
+    def test_iter_reports_is_lazy(self):
+        reports = iter_reports("en_US", None, SourceOptions(True))
+
+        subject_id, report = next(reports)
+
+        self.assertEqual(4, subject_id)
+        self.assertTrue(report.startswith("Cerebral ischemic stroke"))
+
+    def test_create_generator_invalid_scope(self):
+        with open(get_language_path("en_US")) as file:
+            language = json.loads(file.read().replace('"scope": "diagnosis.stroke_type"',
+                                                      '"scope": "diagnosis_stroke_type"', 1))
+
+        with mock.patch("app.app_operations.load_language", return_value=language), \
+                mock.patch("app.app_operations.logging.error") as error:
+            self.assertIsNone(create_generator("en_US"))
+
+        error.assert_called()
+
+    def test_iter_reports_language_not_created(self):
+        with mock.patch("app.app_operations.create_generator", return_value=None), \
+                mock.patch.object(SubjectStorage, "get_data") as get_data, self.assertRaises(ValueError):
+            next(iter_reports("en_US", None, SourceOptions(True)))
+
+        get_data.assert_not_called()
+
+    def test_iter_reports_closes_source(self):
+        closed = []
+        data = list(SubjectStorage(SourceOptions(True)).get_data())
+
+        def rows():
+            try:
+                yield from data
+            finally:
+                closed.append(True)
+
+        for enabled in (False, True):
+            with self.subTest(profile=enabled), mock.patch.object(SubjectStorage, "get_data", return_value=rows()):
+                closed.clear()
+                if enabled:
+                    PROFILER.enable()
+                try:
+                    reports = iter_reports("en_US", None, SourceOptions(True))
+                    next(reports)
+                    reports.close()
+                finally:
+                    PROFILER.disable()
+                    PROFILER.drain()
+
+                self.assertEqual([True], closed)
+
+    def test_iter_reports_many_csv(self):
+        with tempfile.TemporaryDirectory() as directory:
+            csv_file = copy_default_csv(directory)
+            reports = list(iter_reports("en_US", None, SourceOptions(True, csv_file), subject_ids=[5, 2, 99]))
+            serial = dict(iter_reports("en_US", None, SourceOptions(True, csv_file)))
+
+        self.assertEqual([(2, serial[2]), (5, serial[5])], reports)
+
+    def test_iter_reports_many_not_found(self):
+        with tempfile.TemporaryDirectory() as directory, self.assertRaises(IndexError):
+            next(iter_reports("en_US", None, SourceOptions(True, copy_default_csv(directory)), subject_ids=[99]))
+
+    def test_iter_reports_parallel_keeps_order(self):
+        data = SubjectStorage(SourceOptions(True)).get_data()
+
+        serial = list(iter_reports("en_US", None, SourceOptions(True)))
+        parallel = list(iter_reports_parallel(data, "en_US", DEFAULT_TEMPLATE_PATH, 2, chunk_size=2))
+
+        self.assertEqual(serial, parallel)
+
+
+class TestRowDecoder(unittest.TestCase):
+    def setUp(self) -> None:
+        self.decoder = RowDecoder()
+
+    def test_decode_matches_from_dict(self):
+        for row in SubjectStorage(SourceOptions(True)).get_data():
+            decoded = self.decoder.decode(row)
+            for data_class in DATA_CLASSES:
+                with self.subTest(subject_id=row["subject_id"], data_class=data_class.__name__):
+                    self.assertEqual(data_class.from_dict(row), decoded[data_class])
+
+    def test_decode_empty(self):
+        decoded = self.decoder.decode({})
+
+        self.assertIsNone(decoded[PatientData].patient_id)
+        self.assertFalse(decoded[TreatmentData].thrombectomy_transport)
+
+    def test_decode_dict_keys(self):
+        decoded = self.decoder.decode({"subject_id": 3, "door_to_needle": 20, "risk_hiv": True,
+                                       "onset_timestamp": "2022-10-06 00:36:00+02"})
+
+        self.assertEqual(3, decoded[PatientData].patient_id)
+        self.assertEqual(20, decoded[TreatmentData].dtn)
+        self.assertTrue(decoded[RiskFactorsData].risk_hiv)
+        self.assertEqual(OnsetData.from_dict({"onset_timestamp": "2022-10-06 00:36:00+02"}).onset_timestamp,
+                         decoded[OnsetData].onset_timestamp)
+
+    def test_decode_projected_columns(self):
+        projected = load_data_from_csv_file(None, columns=REQUIRED_COLUMNS)
+
+        for full_row, row in zip(SubjectStorage(SourceOptions(True, project_columns=False)).get_data(), projected):
+            self.assertLess(len(row), len(full_row))
+            self.assertEqual(self.decoder.decode(full_row), self.decoder.decode(row))
+
+    def test_decode_not_optional(self):
+        with self.assertRaises(DictValueNotFoundError):
+            self.decoder.decode({"subject_id": None})
+
+    def test_decode_converter(self):
+        @dataclass
+        class ConvertedData(DataclassFromDict):
+            score: Optional[int] = field_from_dict(default=None, converter=lambda value: int(value) * 2)
+            name: str = field_from_dict(default="", converter=str.upper)
+
+        decoder = RowDecoder((ConvertedData,))
+
+        for row in [{"score": "3", "name": "a"}, {"score": 3, "name": "b"}, {"score": None}]:
+            with self.subTest(row=row):
+                self.assertEqual(ConvertedData.from_dict(row), decoder.decode(row)[ConvertedData])
+        self.assertEqual({}, decoder.column_types())
+
+
+class TestLoadCsv(unittest.TestCase):
+    def test_typed_values(self):
+        with tempfile.TemporaryDirectory() as directory:
+            csv_file = os.path.join(directory, "data.csv")
+            with open(csv_file, "w") as file:
+                file.write("subject_id,risk_hiv,aspects_score,discharge_date,name,unused\n"
+                           "1,t,,2022-11-24,a,x\n"
+                           "2,f,7,,,x\n")
+
+            rows = load_data_from_csv_file(None, csv_file, ["subject_id", "risk_hiv", "aspects_score",
+                                                            "discharge_date", "name"])
+
+        self.assertEqual([{"subject_id": 1, "risk_hiv": True, "aspects_score": None,
+                           "discharge_date": pd.Timestamp(2022, 11, 24), "name": "a"},
+                          {"subject_id": 2, "risk_hiv": False, "aspects_score": 7, "discharge_date": None,
+                           "name": None}], rows)
+        self.assertIs(int, type(rows[1]["aspects_score"]))
+        self.assertIs(bool, type(rows[0]["risk_hiv"]))
+
+    def test_streamed_matches_loaded(self):
+        streamed = SubjectStorage(SourceOptions(True, stream_batch_size=2)).get_data()
+        loaded = SubjectStorage(SourceOptions(True)).get_data()
+
+        self.assertIsInstance(streamed, Iterator)
+        self.assertEqual(loaded, list(streamed))
+
+    def test_load_in_chunks(self):
+        self.assertEqual(load_ids_from_csv_file(), load_ids_from_csv_file(chunk_size=3))
+        self.assertEqual(load_data_many_from_csv_file([6, 2, 4]),
+                         load_data_many_from_csv_file([6, 2, 4], chunk_size=3))
+
+    def test_iter_reports_streamed_csv(self):
+        self.assertEqual(list(iter_reports("en_US", None, SourceOptions(True))),
+                         list(iter_reports("en_US", None, SourceOptions(True, stream_batch_size=3))))
+
+    def test_load_by_subject_id(self):
+        with tempfile.TemporaryDirectory() as directory:
+            csv_file = copy_default_csv(directory)
+
+            # The rows of the csv file are not ordered by the subject id
+            for csv_index in (True, False):
+                storage = SubjectStorage(SourceOptions(True, csv_file, csv_index=csv_index))
+                self.assertEqual([1], [row["subject_id"] for row in storage.get_data(1)])
+                self.assertEqual([2, 4, 6], [row["subject_id"] for row in storage.get_data_many([6, 2, 4])])
+                self.assertRaises(IndexError, storage.get_data, 100)
+
+            self.assertEqual(1, next(iter_reports("en_US", 1, SourceOptions(True, csv_file)))[0])
+
+    def test_indexed_matches_loaded(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.assertEqual(load_data_many_from_csv_file([6, 2, 4]),
+                             load_data_indexed_from_csv_file([6, 2, 4], copy_default_csv(directory)))
+
+
+@unittest.skipIf(columnar_utils.pa is None, "pyarrow is not installed")
+class TestColumnar(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_file = copy_default_csv(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def convert(self, name: str) -> str:
+        path = os.path.join(self.directory.name, name)
+        self.assertEqual(7, convert(True, DEFAULT_CSV_PATH, path, row_group_size=2))
+
+        return path
+
+    def test_typed_values(self):
+        path = self.convert("data.parquet")
+        row = load_data_from_columnar_file([4], path, ["subject_id", "risk_hiv", "aspects_score", "discharge_date"])
+
+        self.assertEqual([{"subject_id": 4, "risk_hiv": False, "aspects_score": 10,
+                           "discharge_date": pd.Timestamp(2022, 10, 12)}], row)
+        self.assertIs(int, type(row[0]["aspects_score"]))
+        self.assertIs(bool, type(row[0]["risk_hiv"]))
+
+    def test_reports_match_csv(self):
+        for name in ("data.parquet", "data.feather"):
+            path = self.convert(name)
+
+            self.assertEqual(sorted(iter_reports("en_US", None, SourceOptions(True, self.csv_file))),
+                             list(iter_reports("en_US", None, SourceOptions(columnar_file=path))))
+            self.assertEqual(list(iter_reports("en_US", None, SourceOptions(columnar_file=path))),
+                             list(iter_reports("en_US", None, SourceOptions(columnar_file=path, stream_batch_size=3))))
+            self.assertEqual(list(iter_reports("en_US", None, SourceOptions(True, self.csv_file), subject_ids=[6, 2])),
+                             list(iter_reports("en_US", None, SourceOptions(columnar_file=path), subject_ids=[6, 2])))
+
+    def test_filters(self):
+        path = self.convert("data.parquet")
+        storage = SubjectStorage(SourceOptions(columnar_file=path, discharge_from=date(2022, 8, 1)))
+
+        self.assertEqual([4, 5], storage.get_subject_ids())
+        self.assertEqual([4], [row["subject_id"] for row in storage.get_data_many([1, 4])])
+        self.assertEqual([1, 2, 3, 6, 7], load_ids_from_columnar_file(path, discharge_to=date(2022, 7, 31)))
+        self.assertRaises(IndexError, storage.get_data, 1)
+
+    def test_format(self):
+        self.assertEqual("parquet", get_columnar_format("data.PARQUET"))
+        self.assertEqual("feather", get_columnar_format("data.arrow"))
+        self.assertRaises(ValueError, get_columnar_format, "data.csv")
+
+
+class TestSqliteSnapshot(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.snapshot_file = os.path.join(self.directory.name, "snapshot.sqlite")
+        self.csv_file = copy_default_csv(self.directory.name)
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_reports_match_csv(self):
+        self.assertEqual(7, snapshot(True, DEFAULT_CSV_PATH, self.snapshot_file))
+
+        self.assertEqual(sorted(iter_reports("en_US", None, SourceOptions(True, self.csv_file))),
+                         list(iter_reports("en_US", None, SourceOptions(snapshot_file=self.snapshot_file))))
+        self.assertEqual(list(iter_reports("en_US", 3, SourceOptions(True, self.csv_file))),
+                         list(iter_reports("en_US", 3, SourceOptions(snapshot_file=self.snapshot_file))))
+        self.assertEqual(list(iter_reports("en_US", None, SourceOptions(True, self.csv_file), subject_ids=[6, 2])),
+                         list(iter_reports("en_US", None, SourceOptions(snapshot_file=self.snapshot_file,
+                                                                        stream_batch_size=2), subject_ids=[6, 2])))
+        storage = SubjectStorage(SourceOptions(snapshot_file=self.snapshot_file))
+        self.assertEqual(list(range(1, 8)), storage.get_subject_ids())
+
+    def test_indexed_typed_values(self):
+        snapshot(True, DEFAULT_CSV_PATH, self.snapshot_file)
+        row = load_data_from_snapshot(4, self.snapshot_file, ["subject_id", "risk_hiv", "discharge_date"])[0]
+
+        self.assertEqual({"subject_id": 4, "risk_hiv": False, "discharge_date": date(2022, 10, 12)},
+                         {key: row[key] for key in ("subject_id", "risk_hiv", "discharge_date")})
+        self.assertEqual("male", row["sex"])
+
+        conn = connect(self.snapshot_file)
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {select_by_id(False, placeholder='?')}", (4,)).fetchall()
+        conn.close()
+        self.assertIn("USING INDEX", " ".join(str(step["detail"]) for step in plan))
+
+    def test_converters_keep_other_databases(self):
+        snapshot(True, DEFAULT_CSV_PATH, self.snapshot_file)
+
+        conn = sqlite3.connect(":memory:", detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.execute("CREATE TABLE other (flag BOOLEAN)")
+        conn.execute("INSERT INTO other VALUES ('yes')")
+        self.assertEqual([("yes",)], conn.execute("SELECT * FROM other").fetchall())
+        conn.close()
+
+    def test_create_from_db(self):
+        dbc = mock.MagicMock(spec=['cursor'])
+        cursor = dbc.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [(1, "male")]
+        cursor.fetchmany.side_effect = [[(1, True, date(2022, 1, 2), 1)], [(2, None, None, None)], []]
+        cursor.description = [mock.Mock(type_code=23), mock.Mock(type_code=16), mock.Mock(type_code=1082),
+                               mock.Mock(type_code=23)]
+        for column, name in zip(cursor.description, ["subject_id", "risk_hiv", "discharge_date", "sex_id"]):
+            column.name = name
+
+        self.assertEqual(2, create_snapshot_from_db(dbc, self.snapshot_file, 1))
+
+        cursor.execute.assert_any_call(select_facts(True))
+        rows = load_data_from_snapshot(None, self.snapshot_file, ["subject_id", "risk_hiv", "discharge_date"])
+        self.assertEqual([(1, True, date(2022, 1, 2), "male"), (2, None, None, None)],
+                         [(row["subject_id"], row["risk_hiv"], row["discharge_date"], row["sex"]) for row in rows])
+
+    def test_missing_snapshot(self):
+        storage = SubjectStorage(SourceOptions(snapshot_file=self.snapshot_file))
+        self.assertRaises(FileNotFoundError, storage.get_data, 1)
+
+
+class TestProfiling(unittest.TestCase):
+    def tearDown(self) -> None:
+        PROFILER.disable()
+        PROFILER.drain()
+
+    def test_disabled(self):
+        profiler = StageProfiler()
+
+        with profiler.stage("stage"):
+            pass
+        self.assertEqual([1, 2], list(profiler.iterate("next", [1, 2])))
+        self.assertEqual({}, profiler.summary())
+
+    def test_statistics(self):
+        statistics = StageStatistics()
+        for milliseconds in range(1, 101):
+            statistics.record(milliseconds / 1000)
+
+        summary = statistics.summary()
+        self.assertEqual(100, summary["count"])
+        self.assertAlmostEqual(5.05, summary["total"])
+        self.assertAlmostEqual(0.0505, summary["mean"])
+        for percent in (50, 95, 99):
+            self.assertAlmostEqual(percent / 1000, summary[f"p{percent}"], delta=percent / 1000 * 0.02)
+        self.assertEqual(0.1, statistics.percentile(100))
+
+    def test_merge(self):
+        profiler = StageProfiler(True)
+        other = StageProfiler(True)
+        profiler.record("stage", 0.001)
+        other.record("stage", 0.003)
+        other.record("other", 0.002)
+
+        profiler.merge(other.drain())
+
+        self.assertEqual({}, other.summary())
+        self.assertEqual(2, profiler.summary()["stage"]["count"])
+        self.assertEqual(0.003, profiler.summary()["stage"]["max"])
+        self.assertEqual(["stage", "other"], list(profiler.summary()))
+
+    def test_report_stages(self):
+        PROFILER.enable()
+        reports = list(iter_reports("en_US", None, SourceOptions(True)))
+        parallel = list(iter_reports("en_US", None, SourceOptions(True), workers=2))
+        summary = PROFILER.summary()
+
+        self.assertEqual(reports, parallel)
+        self.assertEqual(14, summary["generate_report"]["count"])
+        self.assertEqual(14, summary["create_discharge"]["count"])
+        self.assertEqual(14, summary["next_row"]["count"])
+        for stage in ("get_data", "load_language", "create_language", "evaluate_conditions", "substitute", "render"):
+            self.assertIn(stage, summary)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "profile.json")
+            PROFILER.write_json(path, {"workers": 2})
+            with open(path) as file:
+                stored = json.load(file)
+
+        self.assertEqual({"workers": 2}, stored["metadata"])
+        self.assertEqual(summary["render"]["count"], stored["stages"]["render"]["count"])
+
+
+class TestCsvIndex(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_file = os.path.join(self.directory.name, "data.csv")
+        with open(self.csv_file, "w") as file:
+            file.write('name,subject_id\n'
+                       '"multi\nline ""quoted"", value",3\n'
+                       '\n'
+                       'b,1\n'
+                       'c,2\n')
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_build(self):
+        index = CsvIndex.build(self.csv_file)
+
+        self.assertEqual([1, 2, 3], [subject_id for subject_id, _, _ in index.records])
+        self.assertEqual([], index.find(7))
+        self.assertEqual(b'name,subject_id\nb,1\n"multi\nline ""quoted"", value",3\n', index.read_rows([3, 1, 7]))
+
+    def test_load_stores_index(self):
+        index = CsvIndex.load(self.csv_file)
+
+        self.assertTrue(os.path.exists(get_index_path(self.csv_file)))
+        self.assertIsNone(index.records)
+        self.assertEqual([CsvIndex.build(self.csv_file).find(subject_id) for subject_id in range(5)],
+                         [CsvIndex.read(self.csv_file).find(subject_id) for subject_id in range(5)])
+        self.assertEqual(["c", 'multi\nline "quoted", value'],
+                         [row["name"] for row in load_data_indexed_from_csv_file([3, 2], self.csv_file)])
+
+    def test_invalidated_by_modification(self):
+        CsvIndex.load(self.csv_file)
+        with open(self.csv_file, "a") as file:
+            file.write("d,4\n")
+
+        self.assertIsNone(CsvIndex.read(self.csv_file))
+        self.assertEqual(["d"], [row["name"] for row in load_data_indexed_from_csv_file([4], self.csv_file)])
+
+    def test_rebuilds_json_index(self):
+        stat = os.stat(self.csv_file)
+        with open(get_index_path(self.csv_file), "w") as file:
+            json.dump({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "header": [0, 16], "offsets": {}}, file)
+
+        self.assertIsNone(CsvIndex.read(self.csv_file))
+        self.assertEqual(["b"], [row["name"] for row in load_data_indexed_from_csv_file([1], self.csv_file)])
+        self.assertIsNotNone(CsvIndex.read(self.csv_file))
+
+    def test_missing_subject_id_column(self):
+        with open(self.csv_file, "w") as file:
+            file.write("name\na\n")
+
+        self.assertRaises(ValueError, CsvIndex.build, self.csv_file)
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_file = os.path.join(self.directory.name, "cohort.csv")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_cohort_is_generated(self):
+        write_cohort(self.csv_file, 50, seed=3)
+        reports = list(iter_reports("en_US", None, SourceOptions(True, self.csv_file)))
+
+        self.assertEqual(list(range(1, 51)), [subject_id for subject_id, _ in reports])
+        self.assertTrue(all(report for _, report in reports))
+        self.assertEqual(list(iter_cohort(20, seed=3)), list(iter_cohort(20, seed=3)))
+        self.assertNotEqual(list(iter_cohort(20, seed=3)), list(iter_cohort(20, seed=4)))
+
+    def test_cohort_keeps_dates_ordered(self):
+        rows = iter_cohort(100)
+        header = next(rows)
+        onset, discharge = header.index("onset_timestamp"), header.index("discharge_date")
+
+        for row in rows:
+            self.assertLess(row[onset][:10], row[discharge])
+
+    def test_compare(self):
+        baseline = {"benchmarks": {"generate": {"throughput": 100.0, "p95": 0.010, "peak_rss_mib": 100.0},
+                                   "removed": {"throughput": 1.0}}}
+        current = {"benchmarks": {"generate": {"throughput": 80.0, "p95": 0.0105, "peak_rss_mib": None},
+                                  "added": {"throughput": 1.0}}}
+
+        regressions = compare(baseline, current, 0.1)
+
+        self.assertEqual([("generate", "throughput")], [(name, metric) for name, metric, _ in regressions])
+        self.assertAlmostEqual(0.2, regressions[0][2])
+        self.assertEqual([], compare(baseline, current, 0.25))
+
+    def test_compare_within_spread(self):
+        baseline = {"benchmarks": {"generate": {"throughput": 100.0, "spread": {"throughput": 0.3}}}}
+        current = {"benchmarks": {"generate": {"throughput": 80.0, "spread": {"throughput": 0.05}}}}
+
+        self.assertEqual([], compare(baseline, current, 0.1))
+        current["benchmarks"]["generate"]["throughput"] = 60.0
+        self.assertEqual([("generate", "throughput")], [(name, metric) for name, metric, _ in
+                                                        compare(baseline, current, 0.1)])
+
+    def test_aggregate_results(self):
+        results = [{"items": 10, "seconds": seconds, "throughput": 10 / seconds, "p50": seconds / 10,
+                    "p95": seconds / 10, "p99": seconds / 10, "peak_rss_mib": None} for seconds in [1.0, 2.0, 4.0]]
+
+        aggregated = aggregate_results(results)
+
+        self.assertEqual(3, aggregated["runs"])
+        self.assertEqual(10, aggregated["items"])
+        self.assertEqual(2.0, aggregated["seconds"])
+        self.assertEqual(5.0, aggregated["throughput"])
+        self.assertIsNone(aggregated["peak_rss_mib"])
+        self.assertAlmostEqual(1.5, aggregated["spread"]["throughput"])
+        self.assertAlmostEqual(1.5, aggregated["spread"]["p95"])
+        self.assertNotIn("peak_rss_mib", aggregated["spread"])
+
+
+class TestReportServer(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.csv_file = copy_default_csv(self.directory.name)
+        self.service = ReportService(SubjectStorage(SourceOptions(True, self.csv_file)), max_concurrent=1,
+                                     queue_timeout=0.1)
+        self.server = ReportServer(self.service, port=0, max_batch_size=3)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def request(self, path: str, body: Optional[dict] = None):
+        data = json.dumps(body).encode() if body is not None else None
+        try:
+            with urllib.request.urlopen(self.url + path, data) as response:
+                return response.status, response.read().decode()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read().decode()
+
+    def test_get_report(self):
+        status, report = self.request("/reports/4?lang=en_US")
+
+        self.assertEqual(200, status)
+        self.assertEqual(generate("en_US", 4, SourceOptions(True, self.csv_file)).rstrip("\n"), report)
+        self.assertEqual(404, self.request("/reports/99")[0])
+        self.assertEqual(400, self.request("/reports/abc")[0])
+        self.assertEqual(400, self.request("/reports/4?lang=xx_XX")[0])
+
+    def test_batch(self):
+        status, content = self.request("/reports:batch", {"subject_ids": [2, 1, 99]})
+        content = json.loads(content)
+
+        self.assertEqual(200, status)
+        self.assertEqual([1, 2], [report["subject_id"] for report in content["reports"]])
+        self.assertEqual([99], content["missing"])
+        self.assertEqual(400, self.request("/reports:batch", {"subject_ids": [1, 2, 3, 4]})[0])
+        self.assertEqual(400, self.request("/reports:batch", {"ids": [1]})[0])
+        self.assertEqual(400, self.request("/reports:batch", {"subject_ids": "1"})[0])
+        self.assertEqual(400, self.request("/reports:batch", {"subject_ids": [1, True]})[0])
+        self.assertEqual(400, self.request("/reports:batch", {"subject_ids": [1], "lang": "xx_XX"})[0])
+        self.assertEqual(400, self.request("/reports:batch", {"subject_ids": [1], "lang": 1})[0])
+        self.assertEqual(400, self.request("/reports:batch?lang=xx_XX", {"subject_ids": [1]})[0])
+
+    def test_generation_failure(self):
+        with mock.patch.object(self.service, "generate_reports", side_effect=ValueError("Invalid value")), \
+                mock.patch("app.report_server.logging.exception"):
+            status, content = self.request("/reports/4")
+            self.assertEqual(500, self.request("/reports:batch", {"subject_ids": [1]})[0])
+
+        self.assertEqual(500, status)
+        self.assertEqual({"error": "Generation failed"}, json.loads(content))
+
+    def test_concurrency_limit(self):
+        with self.service.slot():
+            self.assertEqual(503, self.request("/reports/4")[0])
+
+        self.assertEqual(200, self.request("/reports/4")[0])
+
+    def test_latency(self):
+        self.request("/reports/4")
+        self.request("/reports/99")
+
+        status, content = self.request("/metrics/latency")
+        latency = json.loads(content)["GET /reports/{subject_id}"]
+
+        self.assertEqual(200, status)
+        self.assertEqual(2, latency["count"])
+        self.assertEqual(2, sum(count for _, count in latency["histogram"]))
+
+
+class TestReportCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache", "reports.sqlite")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_stored_reports_are_persisted(self):
+        with ReportCache(self.path) as cache:
+            self.assertIsNone(cache.get("a"))
+            cache.put("a", "report")
+            self.assertEqual("report", cache.get("a"))
+
+        with ReportCache(self.path) as cache:
+            self.assertEqual("report", cache.get("a"))
+            self.assertEqual({"hits": 1, "misses": 0, "hit_rate": 1.0, "evictions": 0}, cache.statistics())
+
+    def test_least_recently_used_are_evicted(self):
+        with ReportCache(self.path, max_size=35, flush_size=1) as cache:
+            for key in "abc":
+                cache.put(key, "x" * 10)
+            cache.get("a")
+            cache.put("d", "x" * 10)
+
+            self.assertEqual(["a", "c", "d"], [key for key in "abcd" if cache.get(key) is not None])
+            self.assertEqual(1, cache.statistics()["evictions"])
+
+    def test_row_key(self):
+        row = {"age": 1, "onset": date(2022, 1, 1)}
+
+        self.assertEqual(get_row_key(row, "context"), get_row_key(dict(reversed(row.items())), "context"))
+        self.assertNotEqual(get_row_key(row, "context"), get_row_key(row, "other context"))
+        self.assertNotEqual(get_row_key(row, "context"), get_row_key({**row, "age": 1.0}, "context"))
+        self.assertNotEqual(get_row_key(row, "context"), get_row_key({**row, "age": True}, "context"))
+        self.assertNotEqual(get_row_key(row, "context"), get_row_key({**row, "onset": "2022-01-01"}, "context"))
+
+    def test_generate_with_cache(self):
+        expected = generate("en_US", None, SourceOptions(True))
+
+        for workers, hits in [(1, 0), (1, 7), (2, 7)]:
+            with ReportCache(self.path) as cache:
+                self.assertEqual(expected, generate("en_US", None, SourceOptions(True), workers=workers,
+                                                    report_cache=cache))
+                self.assertEqual((hits, 7 - hits), (cache.hits, cache.misses))
+
+    def test_corrupt_file_falls_back_to_generation(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, "wb") as file:
+            file.write(b"not a database" * 100)
+        expected = generate("en_US", None, SourceOptions(True))
+
+        with ReportCache(self.path) as cache, mock.patch("app.report_cache.logging.warning") as warning:
+            self.assertEqual(expected, generate("en_US", None, SourceOptions(True), report_cache=cache))
+            self.assertTrue(cache.disabled)
+            warning.assert_called_once()
+
+        # The workers disable their own caches
+        with ReportCache(self.path) as cache:
+            self.assertEqual(expected, generate("en_US", None, SourceOptions(True), workers=2, report_cache=cache))
+            self.assertEqual(0, cache.hits)
+
+    def test_unwritable_file_falls_back_to_generation(self):
+        connection = mock.MagicMock()
+        connection.__exit__.return_value = False
+        connection.executemany.side_effect = sqlite3.OperationalError("database is locked")
+
+        with ReportCache(self.path, flush_size=1) as cache, mock.patch("app.report_cache.logging.warning") as warning:
+            cache.connection = connection
+            cache.put("a", "report")
+
+            self.assertTrue(cache.disabled)
+            warning.assert_called_once()
+            self.assertIsNone(cache.get("a"))
+
+
+class TestIdUtils(unittest.TestCase):
+    def test_parse_ids(self):
+        self.assertEqual([1, 4, 10, 11, 12, 2], parse_ids("1, 4,10-12,,2,11"))
+
+    def test_parse_ids_invalid(self):
+        for value in ["", "a", "5-3", "1-"]:
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_ids(value)
+
+    def test_chunk_ids(self):
+        self.assertEqual([[1, 2], [3, 4], [5]], list(chunk_ids([1, 2, 3, 4, 5], 2)))
+
+
+class TestLookupCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.now = 0.0
+        self.conn = mock.MagicMock()
+        self.cursor = self.conn.cursor.return_value.__enter__.return_value
+        self.cursor.fetchall.side_effect = lambda: [(1, "Female"), (2, "Male")]
+        self.cache = LookupCache(10, [("sexmodel", "sex_id", "sex"), ("stroketypemodel", "stroke_type_id",
+                                                                     "stroke_type")], lambda: self.now)
+
+    def test_resolve(self):
+        row = self.cache.resolve({"sex_id": 2, "stroke_type_id": None}, self.conn)
+
+        self.assertEqual({"sex_id": 2, "stroke_type_id": None, "sex": "Male", "stroke_type": None}, row)
+        self.cursor.execute.assert_has_calls([mock.call("SELECT id, name FROM strokehealthcaremodel_sexmodel"),
+                                              mock.call("SELECT id, name FROM strokehealthcaremodel_stroketypemodel")])
+
+    def test_resolve_unknown_id(self):
+        row = self.cache.resolve({"sex_id": 3}, self.conn)
+
+        self.assertIsNone(row["sex"])
+
+    def test_tables_loaded_once(self):
+        list(self.cache.resolve_all([{"sex_id": 1}, {"sex_id": 2}], self.conn))
+        self.now = 9.0
+        self.cache.resolve({"sex_id": 1}, self.conn)
+
+        self.assertEqual(2, self.cursor.execute.call_count)
+
+    def test_tables_expire(self):
+        self.cache.resolve({"sex_id": 1}, self.conn)
+        self.now = 10.0
+        self.cache.resolve({"sex_id": 1}, self.conn)
+
+        self.assertEqual(4, self.cursor.execute.call_count)
+
+    def test_refresh(self):
+        self.cache.ttl = None
+        self.cache.resolve({"sex_id": 1}, self.conn)
+        self.now = 1000.0
+        self.assertFalse(self.cache.is_expired())
+
+        self.cache.refresh(self.conn)
+
+        self.assertEqual(4, self.cursor.execute.call_count)
+        self.assertEqual(1000.0, self.cache.loaded_at)
+
+    def test_lookup_tables_match_select_all(self):
+        query = re.sub(r"\s+", " ", select_all(False))
+
+        for table, column, name in LOOKUP_TABLES:
+            with self.subTest(table=table):
+                match = re.search(rf"strokehealthcaremodel_{table} as (\w+) ON SHCM.{column} = \1.id", query,
+                                  re.IGNORECASE)
+                self.assertIsNotNone(match)
+                self.assertRegex(query, rf"(?i){match.group(1)}.name AS {name}\b")
+
+        self.assertEqual(len(LOOKUP_TABLES), query.count("LEFT JOIN"))
+
+
+class TestCopyStream(unittest.TestCase):
+    @mock.patch.object(copy_stream, "COPY_CHUNK_SIZE", 1)
+    def test_reads_while_copying(self):
+        first_read = threading.Event()
+
+        def copy(file):
+            file.write(b"subject_id\n1\n")
+            # The rest of the output is written only after the reader got the first rows
+            self.assertTrue(first_read.wait(5))
+            file.write(b"2\n")
+
+        with CopyStream(copy).start() as stream:
+            self.assertEqual(b"subject_id\n", stream.read(11))
+            first_read.set()
+            self.assertEqual(b"1\n2\n", stream.readall())
+
+    def test_raises_copy_error(self):
+        def copy(file):
+            file.write(b"subject_id\n")
+            raise psycopg2.DatabaseError("COPY failed")
+
+        with CopyStream(copy).start() as stream:
+            self.assertRaises(psycopg2.DatabaseError, stream.readall)
+
+    @mock.patch.object(copy_stream, "COPY_CHUNK_SIZE", 1)
+    def test_close_aborts_copy(self):
+        def copy(file):
+            while True:
+                file.write(b"1\n")
+
+        stream = CopyStream(copy, queue_size=1).start()
+        stream.read(2)
+        stream.close()
+
+        self.assertFalse(stream.thread.is_alive())
+
+    def test_parsed_by_csv_loader(self):
+        def copy(file):
+            file.write(b"subject_id,risk_hiv,discharge_date\n1,t,2022-11-24\n2,f,\n")
+
+        with CopyStream(copy).start() as stream:
+            rows = list(iter_data_from_csv_file(io.BufferedReader(stream), None, None, 1))
+
+        self.assertEqual([{"subject_id": 1, "risk_hiv": True, "discharge_date": pd.Timestamp(2022, 11, 24)},
+                          {"subject_id": 2, "risk_hiv": False, "discharge_date": None}], rows)
+
 
 class TestDbOperations(unittest.TestCase):
     @staticmethod
@@ -59,6 +858,215 @@ class TestDbOperations(unittest.TestCase):
             cursor.assert_has_calls(calls)
         self.assertTrue(dbc.autocommit)
 
+    def test_get_patient_info_from_db_by_id(self):
+        dbc = self.fix_dbc()
+
+        SubjectStorage.get_patient_info_from_db(dbc, 3)
+
+        with dbc.cursor() as cursor:
+            cursor.assert_has_calls([mock.call.execute(select_by_id(), (3,)), mock.call.fetchall()])
+
+    def test_stream_patient_info_from_db(self):
+        dbc = self.fix_dbc()
+        cursor = dbc.cursor.return_value.__enter__.return_value
+        cursor.fetchmany.side_effect = [[{"subject_id": 1}, {"subject_id": 2}], [{"subject_id": 3}], []]
+
+        rows = SubjectStorage.stream_patient_info_from_db(dbc, 2)
+
+        self.assertEqual({"subject_id": 1}, next(rows))
+        dbc.cursor.assert_called_once_with("subject_stream", cursor_factory=psycopg2.extras.RealDictCursor)
+        cursor.execute.assert_called_once_with(select_all(True))
+        self.assertEqual(2, cursor.itersize)
+        self.assertEqual([{"subject_id": 2}, {"subject_id": 3}], list(rows))
+        self.assertEqual(3, cursor.fetchmany.call_count)
+
+    def test_copy_patient_info_from_db(self):
+        dbc = self.fix_dbc()
+        cursor = dbc.cursor.return_value.__enter__.return_value
+        cursor.copy_expert.side_effect = lambda query, buffer: buffer.write(b"subject_id,risk_hiv,aspects_score,"
+                                                                            b"discharge_date,sex_id\n"
+                                                                            b"1,t,,2022-11-24,2\n"
+                                                                            b"2,f,7,,\n")
+        cache = LookupCache(None, [("sexmodel", "sex_id", "sex")])
+        cache.tables, cache.loaded_at = {"sexmodel": {2: "female"}}, 0.0
+
+        rows = list(SubjectStorage.copy_patient_info_from_db(dbc, 1, cache))
+
+        cursor.copy_expert.assert_called_once_with(copy_to_csv(select_facts(True)), mock.ANY)
+        self.assertEqual([{"subject_id": 1, "risk_hiv": True, "aspects_score": None,
+                           "discharge_date": pd.Timestamp(2022, 11, 24), "sex_id": 2, "sex": "female"},
+                          {"subject_id": 2, "risk_hiv": False, "aspects_score": 7, "discharge_date": None,
+                           "sex_id": None, "sex": None}], rows)
+        self.assertIs(int, type(rows[1]["aspects_score"]))
+
+    def test_get_data_bulk_copy(self):
+        rows = iter([{"subject_id": 1}])
+        subject_storage = SubjectStorage(SourceOptions(bulk_copy=True))
+
+        with mock.patch.object(subject_storage, "copy_patient_info", return_value=rows) as copy:
+            self.assertIs(rows, subject_storage.get_data())
+
+        copy.assert_called_once_with(10000)
+
+    def test_get_data_streamed(self):
+        rows = iter([{"subject_id": 1}])
+        subject_storage = SubjectStorage(SourceOptions(stream_batch_size=10))
+
+        with mock.patch.object(subject_storage, "stream_patient_info", return_value=rows) as stream:
+            self.assertIs(rows, subject_storage.get_data())
+
+        stream.assert_called_once_with(10)
+
+    def test_iter_reports_empty_stream(self):
+        with mock.patch.object(SubjectStorage, "stream_patient_info", return_value=iter(())):
+            with self.assertRaises(IndexError):
+                next(iter_reports("en_US", None, SourceOptions(stream_batch_size=10)))
+
+    @mock.patch("psycopg2.pool.ThreadedConnectionPool")
+    def test_connection_manager_reuses_pool(self, pool_class):
+        pool = pool_class.return_value
+        pool.getconn.return_value.closed = 0
+        manager = ConnectionManager(1, 2, host="localhost")
+
+        with manager.connection() as first:
+            pass
+        with manager.connection() as second:
+            pass
+
+        pool_class.assert_called_once_with(1, 2, host="localhost")
+        self.assertIs(first, second)
+        pool.putconn.assert_called_with(first, close=False)
+
+        manager.close()
+        pool.closeall.assert_called_once()
+        self.assertIsNone(manager.pool)
+
+    @mock.patch("psycopg2.pool.ThreadedConnectionPool")
+    def test_connection_manager_waits_for_connection(self, pool_class):
+        pool_class.return_value.getconn.return_value.closed = 0
+        manager = ConnectionManager(1, 1, host="localhost")
+        borrowed = threading.Event()
+        released = threading.Event()
+
+        def borrow():
+            with manager.connection():
+                borrowed.set()
+                released.wait()
+
+        thread = threading.Thread(target=borrow)
+        thread.start()
+        borrowed.wait()
+        threading.Timer(0.05, released.set).start()
+
+        with manager.connection():
+            pass
+
+        thread.join()
+        self.assertEqual(2, pool_class.return_value.getconn.call_count)
+
+    @mock.patch("psycopg2.pool.ThreadedConnectionPool")
+    def test_connection_manager_timeout(self, pool_class):
+        pool_class.return_value.getconn.return_value.closed = 0
+        manager = ConnectionManager(1, 1, timeout=0.01, host="localhost")
+
+        with manager.connection():
+            with self.assertRaises(TimeoutError):
+                with manager.connection():
+                    pass
+            self.assertRaises(TimeoutError, SubjectStorage(connection_manager=manager).get_subject_ids)
+
+        with manager.connection():
+            pass
+        self.assertEqual(2, pool_class.return_value.getconn.call_count)
+
+    @mock.patch("psycopg2.pool.ThreadedConnectionPool")
+    def test_storage_uses_connection_manager(self, pool_class):
+        pool = pool_class.return_value
+        pool.getconn.return_value.closed = 0
+        subject_storage = SubjectStorage(connection_manager=ConnectionManager(host="localhost"))
+
+        with mock.patch.object(SubjectStorage, "get_patient_ids_from_db", return_value=[1, 2]), \
+                mock.patch("psycopg2.connect") as connect:
+            self.assertEqual([1, 2], subject_storage.get_subject_ids())
+            self.assertEqual([1, 2], subject_storage.get_subject_ids())
+
+        connect.assert_not_called()
+        self.assertEqual(2, pool.getconn.call_count)
+        self.assertEqual(2, pool.putconn.call_count)
+
+    @mock.patch("psycopg2.extensions.register_type")
+    def test_register_types_once(self, register_type):
+        with mock.patch.object(connection_pool, "_types_registered", False):
+            connection_pool.register_types()
+            connection_pool.register_types()
+
+        register_type.assert_called_once()
+
+    @unittest.skipIf(os.environ.get("EMS_DB_NAME") is None, "because it depends on database")
+    def test_connection_manager_database(self):
+        with ConnectionManager() as manager:
+            subject_storage = SubjectStorage(connection_manager=manager)
+
+            self.assertEqual(subject_storage.get_subject_ids(), subject_storage.get_subject_ids())
+            self.assertEqual(1, len(manager.pool._pool))
+
+    def test_get_patient_info_from_db_lookup_cache(self):
+        dbc = self.fix_dbc()
+        lookup_cache = mock.MagicMock(spec=LookupCache)
+        lookup_cache.resolve_all.side_effect = lambda rows, conn: iter(rows)
+
+        SubjectStorage.get_patient_info_from_db(dbc, None, lookup_cache)
+
+        with dbc.cursor() as cursor:
+            cursor.assert_has_calls([mock.call.execute(select_facts(True)), mock.call.fetchall()])
+        lookup_cache.resolve_all.assert_called_once()
+
+    def test_get_patient_info_many_from_db(self):
+        dbc = self.fix_dbc()
+
+        SubjectStorage.get_patient_info_many_from_db(dbc, [3, 1])
+
+        with dbc.cursor() as cursor:
+            cursor.assert_has_calls([mock.call.execute(select_by_ids(), ([3, 1],)), mock.call.fetchall()])
+
+    def test_get_data_many_chunked(self):
+        subject_storage = SubjectStorage(SourceOptions(project_columns=False))
+        connection = mock.MagicMock()
+
+        with mock.patch.object(SubjectStorage, "connect", return_value=connection), \
+                mock.patch.object(SubjectStorage, "get_patient_info_many_from_db",
+                                  side_effect=lambda conn, ids, *_: [{"subject_id": i} for i in ids]) as fetch:
+            rows = list(subject_storage.get_data_many([5, 1, 3], chunk_size=2))
+
+        self.assertEqual([{"subject_id": 1}, {"subject_id": 3}, {"subject_id": 5}], rows)
+        fetch.assert_has_calls([mock.call(connection, [1, 3], None, None), mock.call(connection, [5], None, None)])
+        connection.close.assert_called_once()
+
+    def test_get_fact_columns(self):
+        dbc = self.fix_dbc()
+        cursor = dbc.cursor.return_value.__enter__.return_value
+        cursor.description = [("id",), ("subject_id",), ("sex_id",), ("unused",)]
+        subject_storage = SubjectStorage()
+
+        self.assertEqual(["subject_id", "sex_id"], subject_storage.get_fact_columns(dbc))
+        self.assertEqual(["subject_id", "sex_id"], subject_storage.get_fact_columns(dbc))
+        cursor.execute.assert_called_once()
+        self.assertIsNone(SubjectStorage(SourceOptions(project_columns=False)).get_fact_columns(dbc))
+
+    def test_select_all_columns(self):
+        result = re.sub(r"\s+", " ", select_all(True, ["subject_id", "sex_id"]))
+
+        self.assertIn("SELECT SHCM.subject_id, SHCM.sex_id, STM.name AS stroke_type", result)
+        self.assertEqual(re.sub(r"\s+", " ", select_all(True)).replace("SHCM.*", "SHCM.subject_id, SHCM.sex_id"),
+                         result)
+
+    def test_select_by_ids(self):
+        result = re.sub(r"\s+", "", select_by_ids(), flags=re.UNICODE)
+        expected = re.sub(r"\s+", "", select_all(False) + " WHERE SHCM.subject_id = ANY(%s) ORDER BY SHCM.subject_id",
+                          flags=re.UNICODE)
+
+        self.assertEqual(expected, result)
+
     def test_select_all(self):
         result = re.sub(r"\s+", "", select_all(True), flags=re.UNICODE)
         expected = re.sub(r"\s+", "", '''
@@ -142,7 +1150,7 @@ class TestDbOperations(unittest.TestCase):
         self.assertEqual(expected, result)
 
     def test_select_by_id(self):
-        result = re.sub(r"\s+", "", select_by_id(1), flags=re.UNICODE)
+        result = re.sub(r"\s+", "", select_by_id(), flags=re.UNICODE)
         expected = re.sub(r"\s+", "", '''
         SELECT SHCM.*, STM.name AS stroke_type, ITM.name AS imaging_type, SM.name AS sex, 
         ADM.name AS admittance_department, AMM.name AS arrival_mode, HIM.name AS hospitalized_in, 
@@ -216,7 +1224,7 @@ class TestDbOperations(unittest.TestCase):
         ON SHCM.carotid_stenosis_level_id = CSLM.id
 
         LEFT JOIN strokehealthcaremodel_departmenttypemodel AS DTM
-        ON SHCM.department_type_id = DTM.id WHERE SHCM.subject_id=1
+        ON SHCM.department_type_id = DTM.id WHERE SHCM.subject_id = %s
         ''', flags=re.UNICODE)
 
         self.assertEqual(expected, result)
@@ -0,0 +1,315 @@
+from datetime import date
+from pathlib import Path
+from typing import Optional, Iterable, Collection, Dict, Iterator, List, Union
+
+from utils.load_csv_utils import read_csv
+
+try:
+    import pyarrow as pa  # type: ignore[import]
+    import pyarrow.dataset as ds  # type: ignore[import]
+    import pyarrow.feather as feather  # type: ignore[import]
+    import pyarrow.parquet as pq  # type: ignore[import]
+except ImportError:
+    pa = ds = feather = pq = None
+
+# Formats of the columnar files mapped by their extensions
+COLUMNAR_FORMATS = {".parquet": "parquet",
+                    ".pq": "parquet",
+                    ".feather": "feather",
+                    ".arrow": "feather",
+                    ".ipc": "feather",
+                    }
+
+# Number of rows of each row group of the written parquet file, the row groups not matching the filters are skipped
+# by their statistics without being read
+DEFAULT_ROW_GROUP_SIZE = 10000
+
+# Number of rows read at once when the columnar file is streamed
+DEFAULT_BATCH_SIZE = 10000
+
+
+def require_pyarrow():
+    """Checks whether pyarrow, which is an optional dependency, is installed
+
+    Raises
+    ------
+    ImportError
+        If pyarrow is not installed
+    """
+
+    if pa is None:
+        raise ImportError("Parquet and Feather files require pyarrow, install it with the columnar extra, "
+                          "such as poetry install -E columnar")
+
+
+def get_columnar_format(path: str) -> str:
+    """Gets the format of the columnar file from its extension
+
+    Parameters
+    ----------
+    path : str
+        Path to parquet or feather file
+
+    Returns
+    -------
+    str
+        Either parquet or feather
+
+    Raises
+    ------
+    ValueError
+        If the extension is not one of the COLUMNAR_FORMATS
+    """
+
+    extension = Path(path).suffix.lower()
+    if extension not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unknown columnar file extension {extension}, expected one of "
+                         f"{', '.join(COLUMNAR_FORMATS)}")
+
+    return COLUMNAR_FORMATS[extension]
+
+
+def open_dataset(path: str) -> "ds.Dataset":
+    """Opens the columnar file lazily, only its schema and metadata are read
+
+    Parameters
+    ----------
+    path : str
+        Path to parquet or feather file
+
+    Returns
+    -------
+    ds.Dataset
+        The dataset of the file
+    """
+
+    require_pyarrow()
+
+    return ds.dataset(str(path), format=get_columnar_format(path))
+
+
+def get_filter(dataset: "ds.Dataset", subject_ids: Optional[Iterable[int]] = None,
+               discharge_from: Optional[date] = None,
+               discharge_to: Optional[date] = None) -> Optional["ds.Expression"]:
+    """Gets the filter of the rows pushed down to the reader of the dataset
+
+    Parameters
+    ----------
+    dataset : ds.Dataset
+        The dataset of the columnar file
+    subject_ids : Optional[Iterable[int]]
+        Ids of the subjects to be read. When omitted, all subjects are read
+    discharge_from : Optional[date]
+        The first discharge date of the subjects to be read, inclusive
+    discharge_to : Optional[date]
+        The last discharge date of the subjects to be read, inclusive
+
+    Returns
+    -------
+    Optional[ds.Expression]
+        The filter of the rows, None when all rows are read
+    """
+
+    conditions = []
+
+    if subject_ids is not None:
+        conditions.append(ds.field("subject_id").isin([int(subject_id) for subject_id in subject_ids]))
+
+    if discharge_from is not None or discharge_to is not None:
+        # The bounds are cast to the type of the column, which is a date or a timestamp depending on the source
+        discharge_type = dataset.schema.field("discharge_date").type
+        if discharge_from is not None:
+            conditions.append(ds.field("discharge_date") >= pa.scalar(discharge_from).cast(discharge_type))
+        if discharge_to is not None:
+            conditions.append(ds.field("discharge_date") <= pa.scalar(discharge_to).cast(discharge_type))
+
+    result = None
+    for condition in conditions:
+        result = condition if result is None else result & condition
+
+    return result
+
+
+def get_columns(dataset: "ds.Dataset", columns: Optional[Collection[str]] = None) -> Optional[List[str]]:
+    """Gets the columns of the dataset to be read
+
+    Parameters
+    ----------
+    dataset : ds.Dataset
+        The dataset of the columnar file
+    columns : Optional[Collection[str]]
+        Names of the columns to be loaded. The names missing from the file are ignored. When omitted, all columns are
+        loaded
+
+    Returns
+    -------
+    Optional[List[str]]
+        Names of the columns to be read, None when all columns are read
+    """
+
+    if columns is None:
+        return None
+
+    return [column for column in dataset.schema.names if column in columns]
+
+
+def load_data_from_columnar_file(subject_ids: Optional[Iterable[int]], path: str,
+                                 columns: Optional[Collection[str]] = None, discharge_from: Optional[date] = None,
+                                 discharge_to: Optional[date] = None) -> list:
+    """Loads data from parquet or feather file. Only the given columns are read and the filters are pushed down to
+    the reader, so the row groups of parquet file which cannot match are skipped. The values keep the types they
+    were stored with
+
+    Parameters
+    ----------
+    subject_ids : Optional[Iterable[int]]
+        Ids of the subjects to be loaded, ordered by the subject id. The ids missing from the file are skipped. When
+        None, all subjects are loaded in the order of the file
+    path : str
+        Path to parquet or feather file
+    columns : Optional[Collection[str]]
+        Names of the columns to be loaded, the other columns of the file are skipped. When omitted, all columns are
+        loaded
+    discharge_from : Optional[date]
+        The first discharge date of the subjects to be loaded, inclusive
+    discharge_to : Optional[date]
+        The last discharge date of the subjects to be loaded, inclusive
+
+    Returns
+    -------
+    list
+        List of dictionaries with key value pairs of data from the file
+
+    """
+    dataset = open_dataset(path)
+    table = dataset.to_table(columns=get_columns(dataset, columns),
+                             filter=get_filter(dataset, subject_ids, discharge_from, discharge_to))
+
+    if subject_ids is not None:
+        table = table.sort_by("subject_id")
+
+    return table.to_pylist()
+
+
+def iter_data_from_columnar_file(path: str, columns: Optional[Collection[str]] = None,
+                                 batch_size: int = DEFAULT_BATCH_SIZE, discharge_from: Optional[date] = None,
+                                 discharge_to: Optional[date] = None) -> Iterator[dict]:
+    """Lazily loads data from parquet or feather file in batches of rows, so only a single batch is held in memory
+    at a time
+
+    Parameters
+    ----------
+    path : str
+        Path to parquet or feather file
+    columns : Optional[Collection[str]]
+        Names of the columns to be loaded, the other columns of the file are skipped. When omitted, all columns are
+        loaded
+    batch_size : int
+        Maximum number of rows read at once
+    discharge_from : Optional[date]
+        The first discharge date of the subjects to be loaded, inclusive
+    discharge_to : Optional[date]
+        The last discharge date of the subjects to be loaded, inclusive
+
+    Returns
+    -------
+    Iterator[dict]
+        Dictionaries with key value pairs of data from the file
+
+    """
+    dataset = open_dataset(path)
+    batches = dataset.to_batches(columns=get_columns(dataset, columns), batch_size=batch_size,
+                                 filter=get_filter(dataset, None, discharge_from, discharge_to))
+
+    for batch in batches:
+        yield from batch.to_pylist()
+
+
+def load_ids_from_columnar_file(path: str, discharge_from: Optional[date] = None,
+                                discharge_to: Optional[date] = None) -> List[int]:
+    """Loads the ids of the subjects from parquet or feather file, reading only the subject_id column and the
+    columns of the filters
+
+    Parameters
+    ----------
+    path : str
+        Path to parquet or feather file
+    discharge_from : Optional[date]
+        The first discharge date of the subjects to be loaded, inclusive
+    discharge_to : Optional[date]
+        The last discharge date of the subjects to be loaded, inclusive
+
+    Returns
+    -------
+    List[int]
+        Sorted list of the ids
+    """
+
+    dataset = open_dataset(path)
+    table = dataset.to_table(columns=["subject_id"], filter=get_filter(dataset, None, discharge_from, discharge_to))
+
+    return sorted(table.column("subject_id").to_pylist())
+
+
+def table_from_csv_file(csv_file: Union[str, Path], dtypes: Optional[Dict[str, str]] = None) -> "pa.Table":
+    """Reads all columns of the csv file into a table, converting the values the same way as load_data_from_csv_file
+
+    Parameters
+    ----------
+    csv_file : Union[str, Path]
+        Path to csv file
+    dtypes : Optional[Dict[str, str]]
+        Types of the columns to be converted while parsing. When omitted, CSV_DTYPES are used
+
+    Returns
+    -------
+    pa.Table
+        The typed table
+    """
+
+    require_pyarrow()
+
+    return pa.Table.from_pandas(read_csv(csv_file, None, dtypes), preserve_index=False)
+
+
+def table_from_records(rows: Iterable[dict]) -> "pa.Table":
+    """Creates a table from the rows, such as the rows fetched from the database, inferring the types of the columns
+    from their values
+
+    Parameters
+    ----------
+    rows : Iterable[dict]
+        The rows with key value pairs of data
+
+    Returns
+    -------
+    pa.Table
+        The typed table
+    """
+
+    require_pyarrow()
+
+    return pa.Table.from_pylist([dict(row) for row in rows])
+
+
+def write_columnar_file(table: "pa.Table", path: str, row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+    """Writes the table into parquet or feather file, depending on the extension of the path. The rows are ordered by
+    the subject id, so each row group holds a narrow range of ids and the filters on the ids skip the other groups
+
+    Parameters
+    ----------
+    table : pa.Table
+        The table to be written
+    path : str
+        Path to parquet or feather file
+    row_group_size : int
+        Number of rows of each row group of parquet file, or each record batch of feather file
+    """
+
+    columnar_format = get_columnar_format(path)
+    table = table.sort_by("subject_id")
+
+    if columnar_format == "parquet":
+        pq.write_table(table, str(path), row_group_size=row_group_size)
+    else:
+        feather.write_feather(table, str(path), chunksize=row_group_size)
@@ -0,0 +1,411 @@
+import csv
+import logging
+import os
+import struct
+import tempfile
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Suffix of the index file stored next to the csv file
+INDEX_SUFFIX = ".idx"
+
+# The index file starts with the magic, the size and modification time of the csv file, the offset and length of the
+# header of the csv file and the number of the records, which follow sorted by the subject id and the offset. Each
+# record holds the subject id, the offset and the length of a row
+INDEX_MAGIC = b"CSVIDX01"
+INDEX_HEADER = struct.Struct("<8sqqQQQ")
+INDEX_RECORD = struct.Struct("<qQQ")
+
+# Record of the index, as the subject id, the offset and the length of the row
+Record = Tuple[int, int, int]
+
+# Indexes already loaded by the process, mapped by the path of the csv file
+_loaded_indexes: Dict[str, "CsvIndex"] = {}
+_loaded_indexes_lock = threading.Lock()
+
+
+class StoredRecords(Sequence[Record]):
+    """
+    A class representing the records of the index file read on demand, so the index is searched by seeking to the
+    records instead of loading all of them.
+
+    Methods
+    -------
+    __getitem__(position)
+        Reads the record at the position
+    __len__()
+        Gets the number of the records
+    """
+
+    def __init__(self, file: BinaryIO, count: int):
+        """
+
+        Parameters
+        ----------
+        file : BinaryIO
+            The index file opened in binary mode
+        count : int
+            Number of the records of the index file
+        """
+
+        self.file = file
+        self.length = count
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.length:
+            raise IndexError("Record out of range")
+
+        self.file.seek(INDEX_HEADER.size + position * INDEX_RECORD.size)
+
+        return INDEX_RECORD.unpack(self.file.read(INDEX_RECORD.size))
+
+    def __len__(self) -> int:
+        return self.length
+
+
+class CsvIndex:
+    """
+    A class representing an index of csv file mapping the subject ids to the byte offsets of their rows.
+
+    The index is stored next to the csv file as fixed-width binary records sorted by the subject id, so the rows of a
+    subject are found by a binary search seeking through the index file instead of loading the whole index. The index
+    is valid only as long as the size and the modification time of the csv file match, so a changed file is indexed
+    again, as is an index file of another format. The rows are found by counting the quotes of each line, so values
+    spanning several lines are kept in a single row.
+
+    Methods
+    -------
+    build(csv_file)
+        Indexes the rows of the csv file
+    read(csv_file)
+        Reads the header of the stored index of the csv file
+    load(csv_file)
+        Gets the index of the csv file, building and storing it when there is no valid one
+    save()
+        Stores the index next to the csv file
+    is_valid()
+        Checks whether the csv file did not change since it was indexed
+    find(subject_id)
+        Finds the offsets and lengths of the rows of the subject
+    read_rows(subject_ids)
+        Reads the header and the rows of the subjects from the csv file
+    """
+
+    def __init__(self, csv_file: Union[str, Path], size: int, mtime_ns: int, header: Tuple[int, int], count: int,
+                 records: Optional[List[Record]] = None):
+        """
+
+        Parameters
+        ----------
+        csv_file : Union[str, Path]
+            Path to csv file
+        size : int
+            Size of the indexed csv file in bytes
+        mtime_ns : int
+            Modification time of the indexed csv file in nanoseconds
+        header : Tuple[int, int]
+            Offset and length of the header of the csv file
+        count : int
+            Number of the indexed rows
+        records : Optional[List[Record]]
+            The records of the rows sorted by the subject id and the offset. When omitted, the records are read from
+            the stored index
+        """
+
+        self.csv_file = str(csv_file)
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.header = header
+        self.count = count
+        self.records = records
+
+    @classmethod
+    def build(cls, csv_file: Union[str, Path]) -> "CsvIndex":
+        """Indexes the rows of the csv file
+
+        Parameters
+        ----------
+        csv_file : Union[str, Path]
+            Path to csv file
+
+        Returns
+        -------
+        CsvIndex
+            The index of the csv file, holding its records
+
+        Raises
+        ------
+        ValueError
+            If the csv file has no subject_id column
+        """
+
+        stat = os.stat(csv_file)
+        records: List[Record] = []
+
+        with open(csv_file, "rb") as file:
+            rows = iter_rows(file)
+            header_offset, header_row = next(rows, (0, b""))
+            columns: List[str] = next(csv.reader([header_row.decode("utf-8")]), [])
+
+            if "subject_id" not in columns:
+                raise ValueError(f"Csv file {csv_file} has no subject_id column")
+            position = columns.index("subject_id")
+
+            for offset, row in rows:
+                values: List[str] = next(csv.reader([row.decode("utf-8", errors="replace")]), [])
+                if len(values) <= position or not values[position].strip():
+                    continue
+
+                records.append((int(values[position]), offset, len(row)))
+
+        records.sort()
+
+        return cls(csv_file, stat.st_size, stat.st_mtime_ns, (header_offset, len(header_row)), len(records), records)
+
+    @classmethod
+    def read(cls, csv_file: Union[str, Path]) -> Optional["CsvIndex"]:
+        """Reads the header of the stored index of the csv file, the records are read when the rows are looked up
+
+        Parameters
+        ----------
+        csv_file : Union[str, Path]
+            Path to csv file
+
+        Returns
+        -------
+        Optional[CsvIndex]
+            The stored index. None if there is no index, it has another format or it is not valid anymore
+        """
+
+        path = get_index_path(csv_file)
+        try:
+            with open(path, "rb") as file:
+                magic, size, mtime_ns, header_offset, header_length, count = \
+                    INDEX_HEADER.unpack(file.read(INDEX_HEADER.size))
+            complete = os.path.getsize(path) == INDEX_HEADER.size + count * INDEX_RECORD.size
+        except (OSError, struct.error):
+            return None
+
+        if magic != INDEX_MAGIC or not complete:
+            return None
+
+        index = cls(csv_file, size, mtime_ns, (header_offset, header_length), count)
+
+        return index if index.is_valid() else None
+
+    @classmethod
+    def load(cls, csv_file: Union[str, Path]) -> "CsvIndex":
+        """Gets the index of the csv file, building and storing it when there is no valid one. The loaded index is
+        kept by the process until the csv file changes
+
+        Parameters
+        ----------
+        csv_file : Union[str, Path]
+            Path to csv file
+
+        Returns
+        -------
+        CsvIndex
+            The index of the csv file
+        """
+
+        path = os.path.abspath(csv_file)
+
+        with _loaded_indexes_lock:
+            index = _loaded_indexes.get(path)
+            if index is not None and index.is_valid():
+                return index
+
+            index = cls.read(csv_file)
+            if index is None:
+                logging.info("Indexing csv file %s", csv_file)
+                index = cls.build(csv_file)
+                if index.save():
+                    # The records are searched in the stored index, so the process does not keep them
+                    index.records = None
+
+            _loaded_indexes[path] = index
+
+        return index
+
+    def save(self) -> bool:
+        """Stores the index next to the csv file. The file is replaced at once, so the processes reading the previous
+        index never see a partially written one
+
+        Returns
+        -------
+        bool
+            True if the index was stored, False if it could not be stored and is only kept in memory
+        """
+
+        if self.records is None:
+            return True
+
+        path = get_index_path(self.csv_file)
+        try:
+            with tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(os.path.abspath(path)), suffix=INDEX_SUFFIX,
+                                             delete=False) as file:
+                file.write(INDEX_HEADER.pack(INDEX_MAGIC, self.size, self.mtime_ns, *self.header, self.count))
+                for record in self.records:
+                    file.write(INDEX_RECORD.pack(*record))
+            os.replace(file.name, path)
+        except OSError as error:
+            logging.warning("Could not store index of csv file %s: %s", self.csv_file, error)
+            return False
+
+        return True
+
+    def is_valid(self) -> bool:
+        """Checks whether the csv file did not change since it was indexed
+
+        Returns
+        -------
+        bool
+            True if the size and modification time of the csv file match the index, False otherwise
+        """
+
+        try:
+            stat = os.stat(self.csv_file)
+        except OSError:
+            return False
+
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    def find(self, subject_id: int) -> List[Tuple[int, int]]:
+        """Finds the offsets and lengths of the rows of the subject
+
+        Parameters
+        ----------
+        subject_id : int
+            The id of the subject
+
+        Returns
+        -------
+        List[Tuple[int, int]]
+            The offsets and lengths of the rows of the subject, empty if the subject is missing from the index
+        """
+
+        if self.records is not None:
+            return search(self.records, subject_id)
+
+        with open(get_index_path(self.csv_file), "rb") as file:
+            return search(StoredRecords(file, self.count), subject_id)
+
+    def read_rows(self, subject_ids: Iterable[int]) -> bytes:
+        """Reads the header and the rows of the subjects from the csv file, ordered by the subject id
+
+        Parameters
+        ----------
+        subject_ids : Iterable[int]
+            The ids of the subjects. The ids missing from the index are skipped
+
+        Returns
+        -------
+        bytes
+            The header and the rows in the csv format
+        """
+
+        ids = sorted(set(subject_ids))
+        if self.records is not None:
+            rows = [row for subject_id in ids for row in search(self.records, subject_id)]
+        else:
+            with open(get_index_path(self.csv_file), "rb") as index_file:
+                records = StoredRecords(index_file, self.count)
+                rows = [row for subject_id in ids for row in search(records, subject_id)]
+
+        with open(self.csv_file, "rb") as file:
+            parts = []
+            for offset, length in [self.header] + rows:
+                file.seek(offset)
+                part = file.read(length)
+                parts.append(part if part.endswith(b"\n") else part + b"\n")
+
+        return b"".join(parts)
+
+
+def search(records: Sequence[Record], subject_id: int) -> List[Tuple[int, int]]:
+    """Finds the rows of the subject in the records sorted by the subject id by a binary search
+
+    Parameters
+    ----------
+    records : Sequence[Record]
+        The records sorted by the subject id and the offset
+    subject_id : int
+        The id of the subject
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+        The offsets and lengths of the rows of the subject
+    """
+
+    rows = []
+    position = bisect_left(records, (subject_id,))
+    while position < len(records):
+        record_id, offset, length = records[position]
+        if record_id != subject_id:
+            break
+        rows.append((offset, length))
+        position += 1
+
+    return rows
+
+
+def iter_rows(file) -> Iterator[Tuple[int, bytes]]:
+    """Splits the binary csv file into rows, keeping the line breaks inside quoted values in the row. The empty lines
+    are skipped
+
+    Parameters
+    ----------
+    file
+        The csv file opened in binary mode
+
+    Returns
+    -------
+    Iterator[Tuple[int, bytes]]
+        The offset of each row and the row itself
+    """
+
+    offset = 0
+    start = 0
+    row: List[bytes] = []
+    quoted = False
+
+    for line in file:
+        if not row:
+            start = offset
+        row.append(line)
+        offset += len(line)
+
+        # Quotes inside quoted values are doubled, so an odd count of quotes opens or closes a quoted value
+        if line.count(b'"') % 2:
+            quoted = not quoted
+        if quoted:
+            continue
+
+        value = b"".join(row)
+        row = []
+        if value.strip():
+            yield start, value
+
+    if row and b"".join(row).strip():
+        yield start, b"".join(row)
+
+
+def get_index_path(csv_file: Union[str, Path]) -> str:
+    """Gets the path of the index file of the csv file
+
+    Parameters
+    ----------
+    csv_file : Union[str, Path]
+        Path to csv file
+
+    Returns
+    -------
+    str
+        Path of the index file
+    """
+
+    return f"{csv_file}{INDEX_SUFFIX}"
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 PROJECT_ROOT = Path(__file__).parent.parent.parent
@@ -6,3 +7,7 @@ DEFAULT_LOCALE = LOCALE_PATH / "en_US.json"
 DEFAULT_TEMPLATE_PATH = PROJECT_ROOT / "src" / "report" / "stroke_discharge" / "main.txt"
 DEFAULT_CSV_PATH = PROJECT_ROOT / "src" / "data" / "data.csv"
 DEFAULT_STORE_PATH = PROJECT_ROOT / "medical_report.txt"
+# Per-user cache directory, $XDG_CACHE_HOME or ~/.cache, %LOCALAPPDATA% on Windows
+USER_CACHE_PATH = Path(os.environ.get("XDG_CACHE_HOME") or os.environ.get("LOCALAPPDATA")
+                       or Path.home() / ".cache") / "medicalreportsgenerator"
+DEFAULT_REPORT_CACHE_PATH = USER_CACHE_PATH / "reports.sqlite"
@@ -0,0 +1,62 @@
+from typing import Iterator, List, Sequence
+
+
+def parse_ids(value: str) -> List[int]:
+    """Parses the subject ids given as a comma separated list of ids and inclusive ranges, such as "1,4,10-20"
+
+    Parameters
+    ----------
+    value : str
+        The list of ids and ranges
+
+    Returns
+    -------
+    List[int]
+        The ids in the order in which they were given, without duplicates
+
+    Raises
+    ------
+    ValueError
+        If any of the ids or ranges is not valid
+    """
+
+    ids = {}
+
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+
+        start, separator, end = part.partition("-")
+        if separator:
+            first, last = int(start), int(end)
+            if first > last:
+                raise ValueError(f"Invalid range of ids {part}")
+            ids.update(dict.fromkeys(range(first, last + 1)))
+        else:
+            ids[int(part)] = None
+
+    if not ids:
+        raise ValueError(f"No ids given in {value!r}")
+
+    return list(ids)
+
+
+def chunk_ids(ids: Sequence[int], chunk_size: int) -> Iterator[List[int]]:
+    """Splits the ids into chunks of given size
+
+    Parameters
+    ----------
+    ids : Sequence[int]
+        The ids to be split
+    chunk_size : int
+        Maximum number of ids in a chunk
+
+    Returns
+    -------
+    Iterator[List[int]]
+        The chunks of ids
+    """
+
+    for start in range(0, len(ids), chunk_size):
+        yield list(ids[start:start + chunk_size])
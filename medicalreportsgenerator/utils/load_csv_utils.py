@@ -1,57 +1,284 @@
-import numpy as np
+import csv
+import io
+
 import pandas as pd
-from typing import Optional
+from pathlib import Path
+from typing import Optional, Iterable, Collection, Dict, Iterator, List, Union, BinaryIO
 
+from utils.csv_index import CsvIndex
 from utils.definitions import DEFAULT_CSV_PATH
 
+# Values of the boolean columns of the csv export
+TRUE_VALUES = ["t"]
+FALSE_VALUES = ["f"]
+
+DATETIME_DTYPE = "datetime64[ns]"
+
+# Number of rows converted into records at once
+RECORDS_CHUNK_SIZE = 4096
+
+# Number of rows parsed at once when the csv file is streamed
+DEFAULT_CSV_CHUNK_SIZE = 10000
+
+# Pandas mark column as float if at least one record contains NaN, therefore manual conversion to int is necessary
+CSV_DTYPES = {"post_treatment_imaging_id": 'Int64',
+              "smoking_cessation_id": 'Int64',
+              "speech_therapy_done_id": 'Int64',
+              "stroke_management_appointment_id": 'Int64',
+              "stroke_mimics_diagnosis_id": 'Int64',
+              "swallowing_assessment_by_id": 'Int64',
+              "swallowing_screening_type_id": 'Int64',
+              "aspects_score": 'Int64',
+              "prestroke_mrs": 'Int64',
+              "discharge_date": "datetime64[ns]",
+              "contact_date": "datetime64[ns]",
+              "discharge_mrs": 'Int64',
+              "discharge_nihss_score": 'Int64',
+              "door_to_needle": 'Int64',
+              "door_to_groin": 'Int64',
+              "door_to_door": 'Int64',
+              "ivt_dose": 'Int64',
+              }
 
-def load_data_from_csv_file(subject_id: Optional[int], csv_file: str = DEFAULT_CSV_PATH):
+
+def load_data_from_csv_file(subject_id: Optional[int], csv_file: Union[str, Path] = DEFAULT_CSV_PATH,
+                            columns: Optional[Collection[str]] = None, dtypes: Optional[Dict[str, str]] = None):
     """Loads data from csv file
 
+    Parameters
+    ----------
+    subject_id : Optional[int]
+        Specifies the patient for which to load the data. When None, all patients are loaded
+    csv_file : Union[str, Path]
+        Path to csv file
+    columns : Optional[Collection[str]]
+        Names of the columns to be loaded, the other columns of the file are skipped. When omitted, all columns are
+        loaded
+    dtypes : Optional[Dict[str, str]]
+        Types of the columns to be converted while parsing. When omitted, CSV_DTYPES are used
+
     Returns
     -------
     dict
         Dictionary with key value pairs of data from csv
 
     """
-    df = pd.read_csv(csv_file)
-    df = df.replace({"f": False})
-    df = df.replace({"t": True})
-
-    # Pandas mark column as float if at least one record contains NaN, therefore manual conversion to int is necessary
-    df = df.astype({"post_treatment_imaging_id": 'Int64',
-                    "smoking_cessation_id": 'Int64',
-                    "speech_therapy_done_id": 'Int64',
-                    "stroke_management_appointment_id": 'Int64',
-                    "stroke_mimics_diagnosis_id": 'Int64',
-                    "swallowing_assessment_by_id": 'Int64',
-                    "swallowing_screening_type_id": 'Int64',
-                    "aspects_score": 'Int64',
-                    "prestroke_mrs": 'Int64',
-                    "discharge_date": "datetime64[ns]",
-                    "contact_date": "datetime64[ns]",
-                    "discharge_mrs": 'Int64',
-                    "discharge_nihss_score": 'Int64',
-                    "door_to_needle": 'Int64',
-                    "door_to_groin": 'Int64',
-                    "door_to_door": 'Int64',
-                    "ivt_dose": 'Int64',
-                    })
-    df = df.replace({np.nan: None})
-    data = df.to_dict("records")
+    df = read_csv(csv_file, columns, dtypes)
 
     if subject_id is not None:
-        try:
-            return [data[int(subject_id) - 1]]
-        except IndexError:
+        # The rows are not ordered by the subject id, so the row is looked up by its id rather than its position
+        data = to_records(df[df["subject_id"] == int(subject_id)])
+        if not data:
             raise IndexError("Invalid subject id, try running with option --list to list available ids")
 
-    return data
+        return data[:1]
+
+    return to_records(df)
+
+
+def load_data_indexed_from_csv_file(subject_ids: Iterable[int], csv_file: Union[str, Path] = DEFAULT_CSV_PATH,
+                                    columns: Optional[Collection[str]] = None,
+                                    dtypes: Optional[Dict[str, str]] = None) -> list:
+    """Loads data of the given subjects from csv file, ordered by the subject id. Only the rows of the subjects are
+    read and parsed, found by the index stored next to the csv file, which is built when missing or outdated
+
+    Parameters
+    ----------
+    subject_ids : Iterable[int]
+        Ids of the subjects to be loaded. The ids missing from the file are skipped
+    csv_file : Union[str, Path]
+        Path to csv file
+    columns : Optional[Collection[str]]
+        Names of the columns to be loaded, the other columns of the file are skipped. When omitted, all columns are
+        loaded
+    dtypes : Optional[Dict[str, str]]
+        Types of the columns to be converted while parsing. When omitted, CSV_DTYPES are used
+
+    Returns
+    -------
+    list
+        List of dictionaries with key value pairs of data from csv
+
+    """
+    rows = CsvIndex.load(csv_file).read_rows(int(subject_id) for subject_id in subject_ids)
+
+    return to_records(pd.read_csv(io.BytesIO(rows), **get_read_csv_arguments(csv_file, columns, dtypes)))
+
+
+def iter_data_from_csv_file(csv_file: Union[str, Path, BinaryIO] = DEFAULT_CSV_PATH,
+                            columns: Optional[Collection[str]] = None, dtypes: Optional[Dict[str, str]] = None,
+                            chunk_size: int = DEFAULT_CSV_CHUNK_SIZE) -> Iterator[dict]:
+    """Lazily loads data from csv file in chunks of rows, so only a single chunk is held in memory at a time. The
+    values of each chunk are converted the same way as by load_data_from_csv_file
+
+    Parameters
+    ----------
+    csv_file : Union[str, Path, BinaryIO]
+        Path to csv file, or the csv file opened in binary mode, which may be a stream read only once
+    columns : Optional[Collection[str]]
+        Names of the columns to be loaded, the other columns of the file are skipped. When omitted, all columns are
+        loaded
+    dtypes : Optional[Dict[str, str]]
+        Types of the columns to be converted while parsing. When omitted, CSV_DTYPES are used
+    chunk_size : int
+        Number of rows parsed at once
+
+    Returns
+    -------
+    Iterator[dict]
+        Dictionaries with key value pairs of data from csv
+
+    """
+    with pd.read_csv(csv_file, chunksize=chunk_size, **get_read_csv_arguments(csv_file, columns, dtypes)) as reader:
+        for chunk in reader:
+            yield from to_records(chunk)
+
+
+def load_data_many_from_csv_file(subject_ids: Iterable[int], csv_file: Union[str, Path] = DEFAULT_CSV_PATH,
+                                 columns: Optional[Collection[str]] = None, dtypes: Optional[Dict[str, str]] = None,
+                                 chunk_size: Optional[int] = None):
+    """Loads data of the given subjects from csv file, ordered by the subject id the same way as the database query
+
+    Parameters
+    ----------
+    subject_ids : Iterable[int]
+        Ids of the subjects to be loaded. The ids missing from the file are skipped
+    csv_file : Union[str, Path]
+        Path to csv file
+    columns : Optional[Collection[str]]
+        Names of the columns to be loaded, the other columns of the file are skipped. When omitted, all columns are
+        loaded
+    dtypes : Optional[Dict[str, str]]
+        Types of the columns to be converted while parsing. When omitted, CSV_DTYPES are used
+    chunk_size : Optional[int]
+        Number of rows parsed at once, only the rows of the subjects are kept from each chunk. When omitted, the whole
+        file is parsed at once
+
+    Returns
+    -------
+    list
+        List of dictionaries with key value pairs of data from csv
+
+    """
+    subject_ids = list(subject_ids)
+
+    if chunk_size is None:
+        df = read_csv(csv_file, columns, dtypes)
+        return to_records(df[df["subject_id"].isin(subject_ids)].sort_values("subject_id"))
+
+    data = []
+    with pd.read_csv(csv_file, chunksize=chunk_size, **get_read_csv_arguments(csv_file, columns, dtypes)) as reader:
+        for chunk in reader:
+            data.extend(to_records(chunk[chunk["subject_id"].isin(subject_ids)]))
+
+    return sorted(data, key=lambda row: row["subject_id"])
+
+
+def read_csv(csv_file: Union[str, Path], columns: Optional[Collection[str]] = None,
+             dtypes: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+    """Reads the csv file, parsing only the given columns. The booleans, integers and dates are converted while
+    parsing, so the frame is not copied by further conversions
+
+    Parameters
+    ----------
+    csv_file : Union[str, Path]
+        Path to csv file
+    columns : Optional[Collection[str]]
+        Names of the columns to be loaded. The names missing from the file are ignored. When omitted, all columns are
+        loaded
+    dtypes : Optional[Dict[str, str]]
+        Types of the columns to be converted while parsing. When omitted, CSV_DTYPES are used
+
+    Returns
+    -------
+    pd.DataFrame
+        Data loaded from csv file
+
+    """
+    return pd.read_csv(csv_file, **get_read_csv_arguments(csv_file, columns, dtypes))
+
+
+def get_read_csv_arguments(csv_file: Union[str, Path, BinaryIO], columns: Optional[Collection[str]] = None,
+                           dtypes: Optional[Dict[str, str]] = None) -> dict:
+    """Gets the arguments of pd.read_csv selecting the columns and converting their values while parsing
+
+    Parameters
+    ----------
+    csv_file : Union[str, Path, BinaryIO]
+        Path to csv file, or the csv file opened in binary mode. Its header is read to find out which of the columns
+        it has, an opened file is then rewound to the header. A stream which cannot be rewound is left after its
+        header, the names of its columns are passed to pd.read_csv instead
+    columns : Optional[Collection[str]]
+        Names of the columns to be loaded. The names missing from the file are ignored. When omitted, all columns are
+        loaded
+    dtypes : Optional[Dict[str, str]]
+        Types of the columns to be converted while parsing. When omitted, CSV_DTYPES are used
+
+    Returns
+    -------
+    dict
+        Keyword arguments of pd.read_csv
+
+    """
+    dtypes = CSV_DTYPES if dtypes is None else dtypes
+
+    names = None
+    if isinstance(csv_file, (str, Path)):
+        header = list(pd.read_csv(csv_file, nrows=0).columns)
+    elif csv_file.seekable():
+        position = csv_file.tell()
+        header = list(pd.read_csv(csv_file, nrows=0).columns)
+        csv_file.seek(position)
+    else:
+        header = names = next(csv.reader([csv_file.readline().decode("utf-8")]), [])
+    selected = [column for column in header if columns is None or column in columns]
+
+    dtype = {column: dtypes[column] for column in selected if column in dtypes and dtypes[column] != DATETIME_DTYPE}
+    parse_dates = [column for column in selected if dtypes.get(column) == DATETIME_DTYPE]
+
+    arguments = {"usecols": selected, "dtype": dtype, "parse_dates": parse_dates,
+                 "true_values": TRUE_VALUES, "false_values": FALSE_VALUES}
+    if names is not None:
+        arguments.update(header=None, names=names)
+
+    return arguments
+
+
+def to_records(df: pd.DataFrame) -> list:
+    """Splits the loaded csv file into records, with the missing values replaced by None
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Data loaded from csv file
+
+    Returns
+    -------
+    list
+        List of dictionaries with key value pairs of data from csv
+
+    """
+    columns = list(df.columns)
+    records: List[dict] = []
+
+    # The columns are boxed into objects in chunks of rows, so only a chunk is held twice in memory
+    for start in range(0, len(df), RECORDS_CHUNK_SIZE):
+        chunk = df.iloc[start:start + RECORDS_CHUNK_SIZE]
+        values = [chunk[column].to_numpy(dtype=object, na_value=None) for column in columns]
+        records.extend(dict(zip(columns, row)) for row in zip(*values))
+
+    return records
+
 
+def load_ids_from_csv_file(csv_file: Union[str, Path] = DEFAULT_CSV_PATH, chunk_size: Optional[int] = None):
+    if chunk_size is None:
+        df = pd.read_csv(csv_file, usecols=['subject_id'])
 
-def load_ids_from_csv_file(csv_file: str = DEFAULT_CSV_PATH):
-    df = pd.read_csv(csv_file, usecols=['subject_id'])
+        return sorted(df['subject_id'].values.tolist())
 
-    ids = sorted(df['subject_id'].values.tolist())
+    ids = []
+    with pd.read_csv(csv_file, usecols=['subject_id'], chunksize=chunk_size) as reader:
+        for chunk in reader:
+            ids.extend(chunk['subject_id'].values.tolist())
 
-    return ids
+    return sorted(ids)
@@ -1,10 +1,25 @@
 import json
 import logging
+from pathlib import Path
+from typing import List
+
 from utils.definitions import LOCALE_PATH, DEFAULT_LOCALE
 
 
-def load_language(app_language: str) -> dict:
-    """Loads the language dictionary for given language
+def list_languages() -> List[str]:
+    """Lists the languages the medical records can be generated in
+
+    Returns
+    -------
+    List[str]
+        Sorted codes of the languages, such as en_US
+    """
+
+    return sorted(lang.stem for lang in LOCALE_PATH.glob("*.json"))
+
+
+def get_language_path(app_language: str) -> Path:
+    """Gets the file of the language dictionary for given language
 
     Parameters
     ----------
@@ -13,8 +28,8 @@ def load_language(app_language: str) -> dict:
 
     Returns
     -------
-    dict
-        Dictionary for the given language
+    Path
+        Path to the json file of the language, or of the default language if there is no such language
 
     """
     language_list = LOCALE_PATH.glob("*.json")
@@ -22,9 +37,26 @@ def load_language(app_language: str) -> dict:
     for lang in language_list:
         lang_code = lang.stem
         if lang_code == app_language:
-            return load_json_file(lang)
+            return lang
+
+    return DEFAULT_LOCALE
+
 
-    return load_json_file(DEFAULT_LOCALE)
+def load_language(app_language: str) -> dict:
+    """Loads the language dictionary for given language
+
+    Parameters
+    ----------
+    app_language : str
+        Language for which the dictionary should be loaded
+
+    Returns
+    -------
+    dict
+        Dictionary for the given language
+
+    """
+    return load_json_file(get_language_path(app_language))
 
 
 def load_json_file(file_name: str) -> dict:
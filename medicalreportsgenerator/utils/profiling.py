@@ -0,0 +1,379 @@
+import json
+import math
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Relative width of the buckets of the durations, the percentiles are exact up to this ratio
+BUCKET_GROWTH = 1.02
+
+# Lower bound of the durations told apart in seconds, the shorter durations fall into the first bucket
+MIN_DURATION = 1e-7
+
+# Percentiles reported for each stage
+PERCENTILES = (50, 95, 99)
+
+# Context manager used instead of the timer when the profiling is disabled
+_DISABLED = nullcontext()
+
+
+class StageStatistics:
+    """
+    A class representing the durations of a single stage.
+
+    The count, total, minimum and maximum are exact. The durations themselves are only counted in buckets growing
+    logarithmically, so the memory does not grow with the number of reports and the statistics of several processes
+    can be merged.
+
+    Methods
+    -------
+    record(seconds)
+        Adds the duration to the statistics
+    merge(other)
+        Adds the durations of other statistics of the same stage
+    percentile(percent)
+        Gets the duration below which the given percent of the durations fall
+    summary()
+        Gets the count, total, mean, minimum, maximum and percentiles of the durations
+    histogram()
+        Gets the number of the durations in each bucket
+    """
+
+    __slots__ = ("count", "total", "min", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def record(self, seconds: float):
+        """Adds the duration to the statistics
+
+        Parameters
+        ----------
+        seconds : float
+            The duration in seconds
+        """
+
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+        bucket = max(0, math.ceil(math.log(max(seconds, MIN_DURATION) / MIN_DURATION, BUCKET_GROWTH)))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+
+    def merge(self, other: "StageStatistics"):
+        """Adds the durations of other statistics of the same stage
+
+        Parameters
+        ----------
+        other : StageStatistics
+            The statistics to be added
+        """
+
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+
+    def percentile(self, percent: float) -> float:
+        """Gets the duration below which the given percent of the durations fall, as the upper bound of its bucket
+        limited by the maximum
+
+        Parameters
+        ----------
+        percent : float
+            The percent of the durations
+
+        Returns
+        -------
+        float
+            The duration in seconds, zero when there are no durations
+        """
+
+        if not self.count:
+            return 0.0
+
+        rank = max(1, math.ceil(percent / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(max(MIN_DURATION * BUCKET_GROWTH ** bucket, self.min), self.max)
+
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """Gets the count, total, mean, minimum, maximum and percentiles of the durations
+
+        Returns
+        -------
+        Dict[str, float]
+            The statistics mapped by their names, the durations are in seconds
+        """
+
+        summary = {"count": self.count,
+                   "total": self.total,
+                   "mean": self.total / self.count if self.count else 0.0,
+                   "min": self.min if self.count else 0.0,
+                   "max": self.max}
+
+        for percent in PERCENTILES:
+            summary[f"p{percent}"] = self.percentile(percent)
+
+        return summary
+
+    def histogram(self) -> List[Tuple[float, int]]:
+        """Gets the number of the durations in each bucket, only the buckets with any durations are included
+
+        Returns
+        -------
+        List[Tuple[float, int]]
+            Pairs of the upper bound of the bucket in seconds and the number of the durations, ordered by the bound
+        """
+
+        return [(MIN_DURATION * BUCKET_GROWTH ** bucket, self.buckets[bucket]) for bucket in sorted(self.buckets)]
+
+
+class StageTimer:
+    """
+    A class representing the measurement of a single run of the stage, used as a context manager.
+    """
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler: "StageProfiler", name: str):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, *_):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+
+
+class StageProfiler:
+    """
+    A class representing the timers of the stages of the generation.
+
+    When disabled, the stages are entered through a shared no-op context manager, so the instrumented code does not
+    read the clock and runs the same way whether the profiling is enabled or not. The profiler is shared by the
+    process through PROFILER.
+
+    Methods
+    -------
+    enable()
+        Starts collecting the durations
+    disable()
+        Stops collecting the durations
+    stage(name)
+        Gets the context manager measuring the duration of the stage
+    record(name, seconds)
+        Adds the duration of the stage
+    iterate(name, iterable)
+        Lazily measures the duration of getting each item of the iterable
+    drain()
+        Gets the statistics collected so far and starts over
+    merge(stages)
+        Adds the statistics collected by another profiler, such as the one of a worker process
+    summary()
+        Gets the statistics of each stage
+    format_summary()
+        Formats the statistics of each stage as a table
+    write_json(path)
+        Writes the statistics of each stage into the JSON file
+    """
+
+    def __init__(self, enabled: bool = False):
+        """
+
+        Parameters
+        ----------
+        enabled : bool
+            Boolean deciding whether to collect the durations
+        """
+
+        self.enabled = enabled
+        self.stages: Dict[str, StageStatistics] = {}
+        self.lock = threading.Lock()
+
+    def enable(self):
+        """Starts collecting the durations"""
+
+        self.enabled = True
+
+    def disable(self):
+        """Stops collecting the durations, the durations collected so far are kept"""
+
+        self.enabled = False
+
+    def stage(self, name: str):
+        """Gets the context manager measuring the duration of the stage
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage
+
+        Returns
+        -------
+        ContextManager
+            The timer of the stage, or a no-op context manager when the profiling is disabled
+        """
+
+        if not self.enabled:
+            return _DISABLED
+
+        return StageTimer(self, name)
+
+    def record(self, name: str, seconds: float):
+        """Adds the duration of the stage
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage
+        seconds : float
+            The duration in seconds
+        """
+
+        with self.lock:
+            statistics = self.stages.get(name)
+            if statistics is None:
+                statistics = self.stages[name] = StageStatistics()
+            statistics.record(seconds)
+
+    def iterate(self, name: str, iterable: Iterable) -> Iterator:
+        """Lazily measures the duration of getting each item of the iterable, such as the rows fetched from the
+        database while streaming
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage
+        iterable : Iterable
+            The measured iterable
+
+        Returns
+        -------
+        Iterator
+            The items of the iterable
+        """
+
+        if not self.enabled:
+            return iter(iterable)
+
+        return self.__iterate(name, iter(iterable))
+
+    def __iterate(self, name: str, iterator: Iterator) -> Iterator:
+        """Measures the duration of getting each item of the iterator
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage
+        iterator : Iterator
+            The measured iterator
+
+        Returns
+        -------
+        Iterator
+            The items of the iterator
+        """
+
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record(name, time.perf_counter() - start)
+
+            yield item
+
+    def drain(self) -> Dict[str, StageStatistics]:
+        """Gets the statistics collected so far and starts over
+
+        Returns
+        -------
+        Dict[str, StageStatistics]
+            The statistics mapped by the names of the stages
+        """
+
+        with self.lock:
+            stages, self.stages = self.stages, {}
+
+        return stages
+
+    def merge(self, stages: Dict[str, StageStatistics]):
+        """Adds the statistics collected by another profiler, such as the one of a worker process
+
+        Parameters
+        ----------
+        stages : Dict[str, StageStatistics]
+            The statistics mapped by the names of the stages
+        """
+
+        with self.lock:
+            for name, other in stages.items():
+                self.stages.setdefault(name, StageStatistics()).merge(other)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Gets the statistics of each stage, in the order the stages were first run
+
+        Returns
+        -------
+        Dict[str, Dict[str, float]]
+            The count, total, mean, minimum, maximum and percentiles mapped by the names of the stages
+        """
+
+        with self.lock:
+            return {name: statistics.summary() for name, statistics in self.stages.items()}
+
+    def format_summary(self) -> str:
+        """Formats the statistics of each stage as a table, the durations are in milliseconds
+
+        Returns
+        -------
+        str
+            The table of the statistics
+        """
+
+        columns = ["count", "total", "mean"] + [f"p{percent}" for percent in PERCENTILES]
+        lines = [f"{'stage':<32}" + "".join(f"{column:>12}" for column in columns)]
+
+        for name, summary in self.summary().items():
+            values = [f"{summary['count']:>12d}"]
+            values += [f"{summary[column] * 1000:>12.3f}" for column in columns[1:]]
+            lines.append(f"{name:<32}" + "".join(values))
+
+        return "\n".join(lines)
+
+    def write_json(self, path: str, metadata: Optional[dict] = None):
+        """Writes the statistics of each stage into the JSON file, the durations are in seconds
+
+        Parameters
+        ----------
+        path : str
+            Path to the JSON file
+        metadata : Optional[dict]
+            Description of the run stored along the statistics
+        """
+
+        with open(path, "w") as file:
+            json.dump({"metadata": metadata or {}, "stages": self.summary()}, file, indent=2)
+
+
+# Profiler shared by the process, enabled by the --profile option
+PROFILER = StageProfiler()
@@ -1,8 +1,46 @@
-def select_all(ordered: bool) -> str:
-    pfx = "strokehealthcaremodel"
+from typing import List, Optional
 
+# Prefix of the names of all tables and the name of the fact table
+TABLE_PREFIX = "strokehealthcaremodel_"
+FACT_TABLE = f"{TABLE_PREFIX}strokehealthcaremodel"
+
+# Lookup tables joined to the fact table by select_all, as the name of the table without the prefix, the id column of
+# the fact table and the name under which the looked up name is selected
+LOOKUP_TABLES = [
+    ("stroketypemodel", "stroke_type_id", "stroke_type"),
+    ("imagingtypemodel", "imaging_type_id", "imaging_type"),
+    ("sexmodel", "sex_id", "sex"),
+    ("admittancedepartmentmodel", "admittance_department_id", "admittance_department"),
+    ("arrivalmodemodel", "arrival_mode_id", "arrival_mode"),
+    ("hospitalizedinmodel", "hospitalized_in_id", "hospitalized_in"),
+    ("ivttreatmentmodel", "ivt_treatment_id", "ivt_treatment"),
+    ("nothrombectomyreasonmodel", "no_thrombectomy_reason_id", "no_thrombectomy_reason"),
+    ("nothrombolysisreasonmodel", "no_thrombolysis_reason_id", "no_thrombolysis_reason"),
+    ("posttreatmentimagingmodel", "post_treatment_imaging_id", "post_treatment_imaging"),
+    ("mticiscoremodel", "mtici_score_id", "tici_score"),
+    ("swallowingscreeningdonemodel", "swallowing_screening_done_id", "swallowing_screening_done"),
+    ("swallowingscreeningtypemodel", "swallowing_screening_type_id", "swallowing_screening_type"),
+    ("physiotherapydonemodel", "physiotherapy_done_id", "physiotherapy_received"),
+    ("occupationaltherapydonemodel", "occup_physiotherapy_done_id", "occup_physiotherapy_received"),
+    ("speechtherapydonemodel", "speech_therapy_done_id", "speech_therapy_received"),
+    ("afibfluttermodel", "afib_flutter_id", "afib_flutter"),
+    ("dischargedestinationmodel", "discharge_destination_id", "discharge_destination"),
+    ("modecontactmodel", "mode_contact_id", "mode_contact"),
+    ("carotidstenosislevelmodel", "carotid_stenosis_level_id", "carotid_stenosis_level"),
+    ("departmenttypemodel", "department_type_id", "department_type"),
+]
+
+
+def select_columns(columns: Optional[List[str]] = None) -> str:
+    if columns is None:
+        return "SHCM.*"
+
+    return ", ".join(f"SHCM.{column}" for column in columns)
+
+
+def select_all(ordered: bool, columns: Optional[List[str]] = None) -> str:
     query = f"""
-        SELECT SHCM.*, STM.name AS stroke_type, ITM.name AS imaging_type, SM.name AS sex, 
+        SELECT {select_columns(columns)}, STM.name AS stroke_type, ITM.name AS imaging_type, SM.name AS sex, 
         ADM.name AS admittance_department, AMM.name AS arrival_mode, HIM.name AS hospitalized_in, 
         IVTTM.name AS ivt_treatment, NTTR.name as no_thrombectomy_reason, NTLR.name AS no_thrombolysis_reason,
         PTIM.name AS post_treatment_imaging, TSM.name AS tici_score, SSDM.name AS swallowing_screening_done,
@@ -11,69 +49,69 @@ def select_all(ordered: bool) -> str:
         DDM.name AS discharge_destination, MDM.name AS mode_contact, CSLM.name AS carotid_stenosis_level, 
         DTM.name as department_type
         
-        FROM {pfx}_strokehealthcaremodel AS SHCM
+        FROM {FACT_TABLE} AS SHCM
         
-        LEFT JOIN {pfx}_stroketypemodel AS STM
+        LEFT JOIN {TABLE_PREFIX}stroketypemodel AS STM
         ON SHCM.stroke_type_id = STM.id
         
-        LEFT JOIN {pfx}_imagingtypemodel AS ITM
+        LEFT JOIN {TABLE_PREFIX}imagingtypemodel AS ITM
         ON SHCM.imaging_type_id = ITM.id
         
-        LEFT JOIN {pfx}_sexmodel AS SM
+        LEFT JOIN {TABLE_PREFIX}sexmodel AS SM
         ON SHCM.sex_id = SM.id
         
-        LEFT JOIN {pfx}_admittancedepartmentmodel AS ADM
+        LEFT JOIN {TABLE_PREFIX}admittancedepartmentmodel AS ADM
         ON SHCM.admittance_department_id = ADM.id
         
-        LEFT JOIN {pfx}_arrivalmodemodel AS AMM
+        LEFT JOIN {TABLE_PREFIX}arrivalmodemodel AS AMM
         ON SHCM.arrival_mode_id = AMM.id
         
-        LEFT JOIN {pfx}_hospitalizedinmodel AS HIM
+        LEFT JOIN {TABLE_PREFIX}hospitalizedinmodel AS HIM
         ON SHCM.hospitalized_in_id = HIM.id
         
-        LEFT JOIN {pfx}_ivttreatmentmodel AS IVTTM
+        LEFT JOIN {TABLE_PREFIX}ivttreatmentmodel AS IVTTM
         ON SHCM.ivt_treatment_id = IVTTM.id
         
-        LEFT JOIN {pfx}_nothrombectomyreasonmodel AS NTTR
+        LEFT JOIN {TABLE_PREFIX}nothrombectomyreasonmodel AS NTTR
         ON SHCM.no_thrombectomy_reason_id = NTTR.id
         
-        LEFT JOIN {pfx}_nothrombolysisreasonmodel AS NTLR
+        LEFT JOIN {TABLE_PREFIX}nothrombolysisreasonmodel AS NTLR
         ON SHCM.no_thrombolysis_reason_id = NTLR.id
         
-        LEFT JOIN {pfx}_posttreatmentimagingmodel as PTIM
+        LEFT JOIN {TABLE_PREFIX}posttreatmentimagingmodel as PTIM
         ON SHCM.post_treatment_imaging_id = PTIM.id
         
-        LEFT JOIN {pfx}_mticiscoremodel AS TSM
+        LEFT JOIN {TABLE_PREFIX}mticiscoremodel AS TSM
         ON SHCM.mtici_score_id = TSM.id
         
-        LEFT JOIN {pfx}_swallowingscreeningdonemodel AS SSDM
+        LEFT JOIN {TABLE_PREFIX}swallowingscreeningdonemodel AS SSDM
         ON SHCM.swallowing_screening_done_id = SSDM.id
         
-        LEFT JOIN {pfx}_swallowingscreeningtypemodel AS SSTM
+        LEFT JOIN {TABLE_PREFIX}swallowingscreeningtypemodel AS SSTM
         ON SHCM.swallowing_screening_type_id = SSTM.id
                 
-        LEFT JOIN {pfx}_physiotherapydonemodel AS PTDM
+        LEFT JOIN {TABLE_PREFIX}physiotherapydonemodel AS PTDM
         ON SHCM.physiotherapy_done_id = PTDM.id
                 
-        LEFT JOIN {pfx}_occupationaltherapydonemodel AS OTDM
+        LEFT JOIN {TABLE_PREFIX}occupationaltherapydonemodel AS OTDM
         ON SHCM.occup_physiotherapy_done_id = OTDM.id
         
-        LEFT JOIN {pfx}_speechtherapydonemodel AS STDM
+        LEFT JOIN {TABLE_PREFIX}speechtherapydonemodel AS STDM
         ON SHCM.speech_therapy_done_id = STDM.id
         
-        LEFT JOIN {pfx}_afibfluttermodel AS AFM
+        LEFT JOIN {TABLE_PREFIX}afibfluttermodel AS AFM
         ON SHCM.afib_flutter_id = AFM.id
         
-        LEFT JOIN {pfx}_dischargedestinationmodel AS DDM
+        LEFT JOIN {TABLE_PREFIX}dischargedestinationmodel AS DDM
         ON SHCM.discharge_destination_id = DDM.id
         
-        LEFT JOIN {pfx}_modecontactmodel AS MDM
+        LEFT JOIN {TABLE_PREFIX}modecontactmodel AS MDM
         ON SHCM.mode_contact_id = MDM.id
                 
-        LEFT JOIN {pfx}_carotidstenosislevelmodel AS CSLM
+        LEFT JOIN {TABLE_PREFIX}carotidstenosislevelmodel AS CSLM
         ON SHCM.carotid_stenosis_level_id = CSLM.id
         
-        LEFT JOIN {pfx}_departmenttypemodel AS DTM
+        LEFT JOIN {TABLE_PREFIX}departmenttypemodel AS DTM
         ON SHCM.department_type_id = DTM.id
     """
 
@@ -83,15 +121,62 @@ def select_all(ordered: bool) -> str:
     return query
 
 
-def select_by_id(subject_id: int) -> str:
-    query = select_all(False)
+def select_facts(ordered: bool, columns: Optional[List[str]] = None) -> str:
+    query = f"""
+        SELECT {select_columns(columns)}
+
+        FROM {FACT_TABLE} AS SHCM
+    """
+
+    if ordered:
+        query += "ORDER BY SHCM.subject_id"
+
+    return query
+
+
+def select_lookup_table(table: str) -> str:
+    query = f"SELECT id, name FROM {TABLE_PREFIX}{table}"
+
+    return query
+
+
+def select_by_id(joined: bool = True, columns: Optional[List[str]] = None, placeholder: str = "%s") -> str:
+    query = select_all(False, columns) if joined else select_facts(False, columns)
+
+    query += f" WHERE SHCM.subject_id = {placeholder}"
+
+    return query
+
+
+def select_by_ids(joined: bool = True, columns: Optional[List[str]] = None) -> str:
+    query = select_all(False, columns) if joined else select_facts(False, columns)
+
+    query += " WHERE SHCM.subject_id = ANY(%s) ORDER BY SHCM.subject_id"
+
+    return query
+
+
+def select_in_ids(count: int, joined: bool = True, columns: Optional[List[str]] = None) -> str:
+    query = select_all(False, columns) if joined else select_facts(False, columns)
+
+    query += f" WHERE SHCM.subject_id IN ({', '.join('?' for _ in range(count))}) ORDER BY SHCM.subject_id"
+
+    return query
+
+
+def copy_to_csv(query: str) -> str:
+    query = f"COPY ({query}) TO STDOUT WITH CSV HEADER"
+
+    return query
+
 
-    query += f" WHERE SHCM.subject_id={subject_id}"
+def select_fact_columns() -> str:
+    query = select_facts(False) + " LIMIT 0"
 
     return query
 
 
 def select_subject_ids() -> str:
-    query = "SELECT subject_id FROM strokehealthcaremodel_strokehealthcaremodel ORDER BY subject_id"
+    query = f"SELECT subject_id FROM {FACT_TABLE} ORDER BY subject_id"
 
     return query